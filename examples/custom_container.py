@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""
+    Measures how long it takes to expand custom containers, with and without a registered
+    child provider.
+
+    Without a provider the browser lists the attributes of the containers, which includes the
+    evaluation of their properties, and the nodes are shown by expanding the _nodes attribute,
+    which lists and sorts all nodes. The provider lists the nodes of a graph directly, one page
+    at a time, and skips the attributes.
+"""
+from __future__ import print_function
+
+import sys, time
+
+from qtpy import QtWidgets
+from objbrowser.treemodel import TreeModel
+from objbrowser.attribute_model import DEFAULT_ATTR_COLS
+from objbrowser.child_providers import (ChildListing, lazy_items, register_child_provider,
+                                        unregister_child_provider)
+
+N_GRAPHS = 100
+N_NODES = 10000
+N_PROPERTIES = 100
+
+
+def _make_property(nr):
+    " Creates a property that is a bit slow, like a computed statistic"
+    return property(lambda self: sum(range(1000)) + nr)
+
+
+class Graph(object):
+    """ Container with many nodes and many computed properties.
+    """
+    def __init__(self, n_nodes):
+        self._nodes = {'node_{:05d}'.format(nr): nr for nr in range(n_nodes)}
+
+    def iter_nodes(self):
+        " Yields the (name, node) tuples in order"
+        for name in sorted(self._nodes):
+            yield name, self._nodes[name]
+
+for _nr in range(N_PROPERTIES):
+    setattr(Graph, 'statistic_{}'.format(_nr), _make_property(_nr))
+
+
+def graph_children(graph):
+    """ Child provider that lists the nodes of a graph.
+    """
+    return ChildListing(lazy_items(graph.iter_nodes), n_items=len(graph._nodes),
+                        path_format="{}.node({!r})", list_attributes=False)
+
+
+def _find_child(model, parent_index, name):
+    " Returns the index of the child with the given name"
+    for row in range(model.rowCount(parent_index)):
+        index = model.index(row, 0, parent_index)
+        if index.data() == name:
+            return index
+    raise KeyError(name)
+
+
+def main():
+    _app = QtWidgets.QApplication(sys.argv)
+    graphs = [Graph(N_NODES) for _ in range(N_GRAPHS)]
+
+    for use_provider in [False, True]:
+        if use_provider:
+            register_child_provider(Graph, graph_children)
+        model = TreeModel(graphs, 'graphs', attr_cols=DEFAULT_ATTR_COLS, attr_time_budget=None)
+        list_index = model.index(0, 0)
+        model.fetchMore(list_index)
+        start_time = time.time()
+        n_rows = 0
+        for row in range(N_GRAPHS):
+            graph_index = model.index(row, 0, list_index)
+            model.fetchMore(graph_index)
+            if not use_provider:
+                # The nodes are only shown when the _nodes attribute is expanded as well.
+                graph_index = _find_child(model, graph_index, '_nodes')
+                model.fetchMore(graph_index)
+            n_rows += model.rowCount(graph_index)
+        print("child provider = {!s:5}: {:.3f} sec, {} node rows"
+              .format(use_provider, time.time() - start_time, n_rows))
+        unregister_child_provider(Graph)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
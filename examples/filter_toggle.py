@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+    Measures how long it takes to hide and show the callable attributes of a large object.
+
+    The settings are changed like the ObjectBrowser does: the proxy model hides or shows the
+    rows, using the flags that are stored in the tree items, and the tree model removes the
+    hidden attributes or lists the shown attributes when it's refreshed.
+
+    This is measured once with the models only, and once with the models shown in a tree view
+    in which the object is expanded. In the latter case, the time includes laying out all the
+    rows of the object in the view again.
+"""
+from __future__ import print_function
+
+import sys, time
+
+from qtpy import QtWidgets
+from objbrowser.treemodel import TreeModel, TreeProxyModel
+from objbrowser.attribute_model import DEFAULT_ATTR_COLS
+
+N_ATTRIBUTES = 500000
+
+
+class Large(object):
+    """ Class of which the instances get many attributes
+    """
+    pass
+
+
+def toggle_callables(model, proxy_model):
+    """ Hides and shows the callable attributes. Prints the durations.
+    """
+    for show_callables in [False, True]:
+        start_time = time.time()
+        model.setAttributeFilter(show_callables, True)
+        proxy_model.setShowCallables(show_callables)
+        QtWidgets.QApplication.processEvents()
+        n_rows = proxy_model.rowCount(proxy_model.index(0, 0))
+        toggle_time = time.time()
+
+        model.refreshTree()
+        QtWidgets.QApplication.processEvents()
+        n_items = model.rowCount(model.index(0, 0))
+        print("show callables = {!s:5}: {:.2f} sec, {} rows. Refresh: {:.2f} sec, {} items"
+              .format(show_callables, toggle_time - start_time, n_rows,
+                      time.time() - toggle_time, n_items))
+
+
+def main():
+    _app = QtWidgets.QApplication(sys.argv)
+
+    # Half of the attributes are callable.
+    obj = Large()
+    for nr in range(N_ATTRIBUTES):
+        setattr(obj, 'attr_{:07d}'.format(nr), len if nr % 2 else nr)
+
+    print("Without view")
+    model = TreeModel(obj, 'obj', attr_cols=DEFAULT_ATTR_COLS, fetch_page_size=None)
+    proxy_model = TreeProxyModel(show_callable_attributes=True, show_dunder_attributes=True)
+    proxy_model.setSourceModel(model)
+    model.fetchMore(model.index(0, 0))
+    print("{} rows".format(proxy_model.rowCount(proxy_model.index(0, 0))))
+    toggle_callables(model, proxy_model)
+
+    print("With the object expanded in a tree view")
+    model = TreeModel(obj, 'obj', attr_cols=DEFAULT_ATTR_COLS, fetch_page_size=None)
+    proxy_model = TreeProxyModel(show_callable_attributes=True, show_dunder_attributes=True)
+    proxy_model.setSourceModel(model)
+
+    tree_view = QtWidgets.QTreeView()
+    tree_view.setUniformRowHeights(True)
+    tree_view.setModel(proxy_model)
+    tree_view.show()
+    obj_index = proxy_model.index(0, 0)
+    tree_view.expand(obj_index)
+    tree_view.setCurrentIndex(proxy_model.index(1, 0, obj_index))
+    QtWidgets.QApplication.processEvents()
+    print("{} rows".format(proxy_model.rowCount(obj_index)))
+    toggle_callables(model, proxy_model)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+"""
+    Measures how long it takes to list the attributes of objects with many class attributes,
+    like the models of an ORM, with and without the 'instance state only' mode.
+"""
+from __future__ import print_function
+
+import sys, time
+
+from qtpy import QtWidgets
+from objbrowser.treemodel import TreeModel
+from objbrowser.attribute_model import DEFAULT_ATTR_COLS
+
+N_OBJECTS = 200
+N_FIELDS = 10
+N_CLASS_ATTRIBUTES = 300
+
+
+def _make_property(nr):
+    " Creates a property that is a bit slow, like a lazy-loading relation"
+    return property(lambda self: sum(range(1000)) + nr)
+
+
+def _make_method(nr):
+    " Creates a method"
+    return lambda self: nr
+
+
+class Model(object):
+    """ Class with many properties and methods, and a few fields per instance.
+    """
+    def __init__(self, nr):
+        for field_nr in range(N_FIELDS):
+            setattr(self, 'field_{}'.format(field_nr), nr * field_nr)
+
+for _nr in range(N_CLASS_ATTRIBUTES):
+    setattr(Model, 'relation_{}'.format(_nr), _make_property(_nr))
+    setattr(Model, 'method_{}'.format(_nr), _make_method(_nr))
+
+
+def main():
+    _app = QtWidgets.QApplication(sys.argv)
+    objects = [Model(nr) for nr in range(N_OBJECTS)]
+
+    for instance_state_only in [False, True]:
+        model = TreeModel(objects, 'objects', attr_cols=DEFAULT_ATTR_COLS,
+                          attr_time_budget=None, instance_state_only=instance_state_only)
+        list_index = model.index(0, 0)
+        model.fetchMore(list_index)
+        start_time = time.time()
+        n_rows = 0
+        for row in range(model.rowCount(list_index)):
+            obj_index = model.index(row, 0, list_index)
+            model.fetchMore(obj_index)
+            n_rows += model.rowCount(obj_index)
+        print("instance state only = {!s:5}: {:.3f} sec, {} rows"
+              .format(instance_state_only, time.time() - start_time, n_rows))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+"""
+    Measures the latency of TreeModel.parent() for a growing number of siblings.
+
+    Qt calls parent() for every index it resolves, e.g. while painting or selecting. The time
+    per call should not depend on the number of siblings of the parent item.
+"""
+from __future__ import print_function
+
+import sys, timeit
+
+from qtpy import QtWidgets
+from objbrowser.treemodel import TreeModel
+from objbrowser.attribute_model import DEFAULT_ATTR_COLS
+
+N_CALLS = 10000
+
+
+def measure_parent_latency(n_siblings):
+    """ Returns the average duration of a parent() call in micro seconds.
+
+        The index is of a child of the last of n_siblings dictionary entries.
+    """
+    obj = {'key_{:07d}'.format(nr): {'leaf': nr} for nr in range(n_siblings)}
+    model = TreeModel(obj, 'obj', attr_cols=DEFAULT_ATTR_COLS, fetch_page_size=None)
+    obj_index = model.index(0, 0)
+    model.fetchMore(obj_index)
+
+    last_index = model.index(n_siblings - 1, 0, obj_index)
+    model.fetchMore(last_index)
+    leaf_index = model.index(0, 0, last_index)
+    assert model.treeItem(leaf_index).obj_name == 'leaf', model.treeItem(leaf_index)
+
+    duration = timeit.timeit(lambda: model.parent(leaf_index), number=N_CALLS)
+    return 1e6 * duration / N_CALLS
+
+
+def main():
+    _app = QtWidgets.QApplication(sys.argv)
+    for n_siblings in [100, 1000, 10000, 100000]:
+        print("{:7d} siblings: {:6.2f} us per parent() call"
+              .format(n_siblings, measure_parent_latency(n_siblings)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
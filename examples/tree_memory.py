@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""
+    Measures the memory usage of a tree of 1 million TreeItems with tracemalloc.
+
+    The tree items are compared with nodes as they were stored before: with a __dict__, an
+    empty child list per node and the name and full object path stored as strings.
+"""
+from __future__ import print_function
+
+import gc, sys, time, tracemalloc
+
+from objbrowser.treeitem import TreeItem, PATH_ATTRIBUTE
+
+BRANCHING = 10
+DEPTH = 6   # 1 + 10 + ... + 10**6 = 1,111,111 nodes
+
+
+class DictTreeItem(object):
+    """ Tree node with the same attributes as the TreeItem before it used __slots__.
+    """
+    def __init__(self, obj, name, obj_path, is_attribute, parent=None):
+        self.parent_item = parent
+        self.obj = obj
+        self.obj_name = str(name)
+        self.obj_path = str(obj_path)
+        self.is_attribute = is_attribute
+        self.child_items = []
+        self.has_children = True
+        self.children_fetched = False
+        self.pending_children = None
+        self.n_pending_children = 0
+        self.fetch_job = None
+        self.n_virtual_children = 0
+        self.virtual_children = None
+        self.virtual_row = None
+
+
+def build_tree_items(names):
+    """ Builds the tree of TreeItems. Returns the root item and the number of nodes.
+    """
+    root = TreeItem(None, 'root', None, None)
+    level, n_nodes = [root], 1
+    for _depth in range(DEPTH):
+        next_level = []
+        for parent in level:
+            children = [TreeItem(None, name, PATH_ATTRIBUTE, True) for name in names]
+            parent.insert_children(0, children)
+            next_level.extend(children)
+        n_nodes += len(next_level)
+        level = next_level
+    return root, n_nodes
+
+
+def build_dict_tree_items(names):
+    """ Builds the tree of DictTreeItems. Returns the root item and the number of nodes.
+    """
+    root = DictTreeItem(None, 'root', 'root', None)
+    level, n_nodes = [root], 1
+    for _depth in range(DEPTH):
+        next_level = []
+        for parent in level:
+            for name in names:
+                child = DictTreeItem(None, name, '{}.{}'.format(parent.obj_path, name), True,
+                                     parent=parent)
+                parent.child_items.append(child)
+                next_level.append(child)
+        n_nodes += len(next_level)
+        level = next_level
+    return root, n_nodes
+
+
+def measure(build_fn, names):
+    """ Returns (number of nodes, bytes per node, seconds) of building a tree.
+    """
+    gc.collect()
+    tracemalloc.start()
+    start_time = time.time()
+    root, n_nodes = build_fn(names)
+    duration = time.time() - start_time
+    size, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del root
+    return n_nodes, size / n_nodes, duration
+
+
+def main():
+    names = ['attr_{}'.format(nr) for nr in range(BRANCHING)]
+    results = {}
+    for label, build_fn in [('dict', build_dict_tree_items), ('slots', build_tree_items)]:
+        n_nodes, bytes_per_node, duration = measure(build_fn, names)
+        results[label] = bytes_per_node
+        print("{:6s}: {:,} nodes, {:6.1f} bytes per node, built in {:.2f} sec"
+              .format(label, n_nodes, bytes_per_node, duration))
+
+    print("Memory reduction factor: {:.1f}".format(results['dict'] / results['slots']))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,6 +9,10 @@ from qtpy.QtGui import QTextOption
 
 import logging, inspect, string, pprint, six
 
+from objbrowser import inspect_cache
+from objbrowser.ndarray_children import virtual_element_summary
+from objbrowser.rendering import bounded_str, bounded_repr, bounded_pformat
+
 try:
     import numpy as np
 except ImportError:
@@ -24,6 +28,9 @@ MEDIUM_COL_WIDTH = 200
 
 _PRETTY_PRINTER = pprint.PrettyPrinter(indent=4)
 
+# Maximum number of characters of a string that is shown in full in the summary column
+MAX_SUMMARY_STR_LEN = 1000
+
 _ALL_PREDICATES = (inspect.ismodule, inspect.isclass, inspect.ismethod,
                    inspect.isfunction, inspect.isgeneratorfunction, inspect.isgenerator,
                    inspect.istraceback, inspect.isframe, inspect.iscode,
@@ -42,6 +49,7 @@ class AttributeModel(object):
     def __init__(self, name,
                  doc = "<no help available>",  
                  data_fn = None,  
+                 details_fn = None,
                  col_visible = True, 
                  width = SMALL_COL_WIDTH,
                  alignment = ALIGN_LEFT, 
@@ -55,6 +63,10 @@ class AttributeModel(object):
             :type doc: string
             :param data_fn: function that calculates the value shown in the UI
             :type  data_fn: function(TreeItem_ to string.
+            :param details_fn: function that calculates the value shown in the details pane.
+                If None, the data_fn is used. The data_fn of the table columns may render an
+                abbreviation of the object, the details_fn renders it in full.
+            :type  details_fn: function(TreeItem_ to string.
             :param col_visible: if True, the attribute is col_visible by default in the table
             :type col_visible: bool
             :param width: default width in the attribute table
@@ -71,6 +83,7 @@ class AttributeModel(object):
         self.name = name
         self.doc = doc
         self.data_fn = data_fn
+        self._details_fn = details_fn
         self.col_visible = col_visible
         self.width = width
         self.alignment = alignment
@@ -81,6 +94,13 @@ class AttributeModel(object):
         return "<AttributeModel for {!r}>".format(self.name)
         
     
+    @property
+    def details_fn(self):
+        """ The function that calculates the value shown in the details pane.
+        """
+        return self.data_fn if self._details_fn is None else self._details_fn
+    
+    
     @property
     def settings_name(self):
         """ The name where spaces are replaced by underscores 
@@ -144,7 +164,7 @@ def tio_summary(tree_item):
     """
     tio = tree_item.obj
     if isinstance(tio, six.string_types):
-        return tio
+        return bounded_str(tio, MAX_SUMMARY_STR_LEN, text_type=six.text_type)
     elif isinstance(tio, (list, tuple, set, frozenset, dict)):  
         n_items = len(tio)
         if n_items == 0:
@@ -155,12 +175,44 @@ def tio_summary(tree_item):
             return "{} of {} items".format(type(tio).__name__, n_items)
     elif _NUMPY_INSTALLED and isinstance(tio, np.ndarray):
         return "array of {}, shape: {}".format(tio.dtype, tio.shape)
+    elif _NUMPY_INSTALLED and isinstance(tio, np.generic):
+        summary = virtual_element_summary(tree_item) # Computed per page of array elements.
+        return str(tio) if summary is None else summary
     elif callable(tio) or inspect.ismodule(tio):
         return "" 
     else:
-        return str(tio)
+        return bounded_str(tio)
     
     
+def tio_unicode(tree_item):
+    """ Returns the unicode representation of the tree item object. 
+        Large objects are abbreviated, see bounded_str.
+    """
+    return bounded_str(tree_item.obj, text_type=six.text_type)
+
+
+def tio_str(tree_item):
+    """ Returns the str() of the tree item object. Large objects are abbreviated.
+    """
+    return bounded_str(tree_item.obj)
+
+if six.PY3:
+    # Use the same function so that the unicode and str columns share their cached values.
+    tio_str = tio_unicode
+
+
+def tio_repr(tree_item):
+    """ Returns the repr() of the tree item object. Large objects are abbreviated.
+    """
+    return bounded_repr(tree_item.obj)
+
+
+def tio_pretty_print(tree_item):
+    """ Returns the pretty printed tree item object. Large objects are abbreviated.
+    """
+    return bounded_pformat(tree_item.obj)
+
+
 def tio_is_attribute(tree_item):
     """ Returns 'True' if the tree item object is an attribute of the parent 
         opposed to e.g. a list element.
@@ -173,8 +225,7 @@ def tio_is_attribute(tree_item):
     
 def tio_is_callable(tree_item):
     "Returns 'True' if the tree item object is callable"
-    return str(callable(tree_item.obj)) # Python 2
-    #return str(hasattr(tree_item.obj, "__call__")) # Python 3?
+    return str(tree_item.is_callable)
 
 
 def tio_doc_str(tree_item):
@@ -216,7 +267,8 @@ ATTR_MODEL_UNICODE = AttributeModel('unicode',
     doc         = """The unicode representation of the object. In Python 2 it uses unicode()
                      In Python 3 the str() function is used.
                   """, 
-    data_fn     = lambda tree_item: six.text_type(tree_item.obj),
+    data_fn     = tio_unicode,
+    details_fn  = lambda tree_item: six.text_type(tree_item.obj),
     col_visible = True,  
     width       = MEDIUM_COL_WIDTH, 
     line_wrap   = QTextOption.WrapAtWordBoundaryOrAnywhere) 
@@ -226,14 +278,16 @@ ATTR_MODEL_STR = AttributeModel('str',
     doc         = """The string representation of the object using the str() function.
                      In Python 3 there is no difference with the 'unicode' column.
                   """,
-    data_fn     = lambda tree_item: str(tree_item.obj),
+    data_fn     = tio_str,
+    details_fn  = lambda tree_item: str(tree_item.obj),
     col_visible = False,  
     width       = MEDIUM_COL_WIDTH, 
     line_wrap   = QTextOption.WrapAtWordBoundaryOrAnywhere) 
  
 ATTR_MODEL_REPR = AttributeModel('repr', 
     doc         = "The string representation of the object using the repr() function.", 
-    data_fn     = lambda tree_item: repr(tree_item.obj),         
+    data_fn     = tio_repr,
+    details_fn  = lambda tree_item: repr(tree_item.obj),
     col_visible = True,  
     width       = MEDIUM_COL_WIDTH, 
     line_wrap   = QTextOption.WrapAtWordBoundaryOrAnywhere) 
@@ -298,7 +352,8 @@ ATTR_MODEL_PRED = AttributeModel('inspect predicates',
 
 ATTR_MODEL_PRETTY_PRINT = AttributeModel('pretty print', 
     doc         = "Pretty printed representation of the object using the pprint module.", 
-    data_fn     = lambda tree_item: _PRETTY_PRINTER.pformat(tree_item.obj),         
+    data_fn     = tio_pretty_print,
+    details_fn  = lambda tree_item: _PRETTY_PRINTER.pformat(tree_item.obj),
     col_visible = False,  
     width       = MEDIUM_COL_WIDTH) 
         
@@ -316,37 +371,37 @@ ATTR_MODEL_GET_DOC = AttributeModel('inspect.getdoc',
         
 ATTR_MODEL_GET_COMMENTS = AttributeModel('inspect.getcomments', 
     doc         = "Comments above the object's definition. Retrieved using inspect.getcomments()",
-    data_fn     = lambda tree_item: inspect.getcomments(tree_item.obj),         
+    data_fn     = lambda tree_item: inspect_cache.getcomments(tree_item.obj),         
     col_visible = False,  
     width       = MEDIUM_COL_WIDTH)
         
 ATTR_MODEL_GET_MODULE = AttributeModel('inspect.getmodule', 
     doc         = "The object's module. Retrieved using inspect.module",
-    data_fn     = safe_data_fn(inspect.getmodule),         
+    data_fn     = safe_data_fn(inspect_cache.getmodule),         
     col_visible = False,  
     width       = MEDIUM_COL_WIDTH) 
         
 ATTR_MODEL_GET_FILE = AttributeModel('inspect.getfile', 
     doc         = "The object's file. Retrieved using inspect.getfile",
-    data_fn     = safe_data_fn(inspect.getfile),         
+    data_fn     = safe_data_fn(inspect_cache.getfile),         
     col_visible = False,  
     width       = MEDIUM_COL_WIDTH)
         
 ATTR_MODEL_GET_SOURCE_FILE = AttributeModel('inspect.getsourcefile', # calls inspect.getfile()
     doc         = "The object's file. Retrieved using inspect.getsourcefile",
-    data_fn     = safe_data_fn(inspect.getsourcefile),         
+    data_fn     = safe_data_fn(inspect_cache.getsourcefile),         
     col_visible = False,  
     width       = MEDIUM_COL_WIDTH)
         
 ATTR_MODEL_GET_SOURCE_LINES = AttributeModel('inspect.getsourcelines', 
     doc         = "Uses inspect.getsourcelines() to get a list of source lines for the object", 
-    data_fn     = safe_data_fn(inspect.getsourcelines),         
+    data_fn     = safe_data_fn(inspect_cache.getsourcelines),         
     col_visible = False,  
     width       = MEDIUM_COL_WIDTH)
         
 ATTR_MODEL_GET_SOURCE = AttributeModel('inspect.getsource', 
     doc         = "The source code of an object retrieved using inspect.getsource", 
-    data_fn     = safe_data_fn(inspect.getsource),         
+    data_fn     = safe_data_fn(inspect_cache.getsource),         
     col_visible = False,  
     width       = MEDIUM_COL_WIDTH) 
         
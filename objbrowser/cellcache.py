@@ -0,0 +1,110 @@
+""" Cache for the rendered cells of the tree table.
+
+    Views call TreeModel.data() for every cell they paint, e.g. while hovering or resizing. The
+    rendered strings are therefore cached per tree item. Columns with the same data function
+    share the cached string. The least recently used items are evicted when the total length of
+    the cached strings exceeds a maximum.
+"""
+from __future__ import absolute_import
+
+import logging, types, six
+
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Default maximum of the total number of characters in the cache.
+DEFAULT_CELL_CACHE_SIZE = 4 * 1024 * 1024
+
+# Estimate of the memory overhead of a cached item, expressed in characters.
+_ITEM_OVERHEAD = 100
+
+# Objects of these types are immutable or render the same during their lifetime. Their
+# rendered cells don't need to be recomputed when the object is not replaced by another object.
+_STABLE_RENDER_TYPES = six.integer_types + six.string_types + (
+    type(None), bool, float, complex, six.text_type, six.binary_type, type,
+    types.FunctionType, types.BuiltinFunctionType, types.ModuleType)
+
+
+def renders_unchanged(old_obj, new_obj):
+    """ Returns True if the rendered cells of old_obj are still valid for new_obj.
+
+        This is the case if new_obj is old_obj and its type is immutable. Mutable objects may
+        have been changed in place, so their cells are always rendered again.
+    """
+    return new_obj is old_obj and type(new_obj) in _STABLE_RENDER_TYPES
+
+
+class CellCache(object):
+    """ Least recently used cache of the rendered cells of tree items.
+    """
+    def __init__(self, max_size=DEFAULT_CELL_CACHE_SIZE):
+        """ Constructor
+
+            :param max_size: maximum total length of the cached strings. Use None for no limit.
+        """
+        self.max_size = max_size
+        self._items = OrderedDict()  # tree_item -> {data_fn: string}
+        self._size = 0
+
+
+    def __len__(self):
+        return len(self._items)
+
+
+    @property
+    def size(self):
+        """ The (estimated) total length of the cached strings.
+        """
+        return self._size
+
+
+    def get(self, tree_item, data_fn):
+        """ Returns the cached string of data_fn(tree_item) or None if it is not in the cache.
+        """
+        cells = self._items.pop(tree_item, None)
+        if cells is None:
+            return None
+        self._items[tree_item] = cells # Move to the end; it's the most recently used now.
+        return cells.get(data_fn)
+
+
+    def put(self, tree_item, data_fn, text):
+        """ Stores the rendered text of data_fn(tree_item).
+        """
+        cells = self._items.pop(tree_item, None)
+        if cells is None:
+            cells = {}
+            self._size += _ITEM_OVERHEAD
+        self._items[tree_item] = cells
+
+        old_text = cells.get(data_fn)
+        if old_text is not None:
+            self._size -= len(old_text)
+        cells[data_fn] = text
+        self._size += len(text)
+
+        if self.max_size is not None:
+            while self._size > self.max_size and len(self._items) > 1:
+                self._discard_cells(*self._items.popitem(last=False))
+
+
+    def invalidate(self, tree_item):
+        """ Removes the cached cells of a tree item.
+        """
+        cells = self._items.pop(tree_item, None)
+        if cells is not None:
+            self._discard_cells(tree_item, cells)
+
+
+    def clear(self):
+        """ Removes all cached cells.
+        """
+        self._items.clear()
+        self._size = 0
+
+
+    def _discard_cells(self, _tree_item, cells):
+        """ Updates the size after the cells of a tree item have been removed.
+        """
+        self._size -= _ITEM_OVERHEAD + sum(len(text) for text in cells.values())
@@ -0,0 +1,181 @@
+""" Registry of the functions that list the children of objects, per type.
+
+    A child provider is a function that takes an object and returns a ChildListing with its
+    items, e.g. the key-value pairs of a dictionary. The provider of an object is found by
+    looking up its type, or the nearest base class along the MRO, in the registry. The result
+    of the lookup is cached per type, so that finding the provider takes constant time.
+
+    Third parties can register providers for their own container types with
+    register_child_provider. The items of a listing may be produced lazily (see lazy_items),
+    in which case only the pages of items that are displayed are created. A provider can also
+    indicate that the attributes of its objects don't have to be listed, which saves calling
+    dir() on every expanded container.
+
+    Objects without a provider are listed by the tree model itself. It adds the elements of
+    sequences and the rows of NumPy arrays as virtual children, and the items of objects that
+    have an items() method.
+"""
+from __future__ import absolute_import
+
+import logging, inspect, threading, weakref
+
+from collections import OrderedDict
+
+from objbrowser.treeitem import PATH_ITEM, PATH_SET_ELEMENT
+
+logger = logging.getLogger(__name__)
+
+
+class ChildListing(object):
+    """ The items of an object, as returned by a child provider.
+    """
+    __slots__ = ('items', 'n_items', 'path_format', 'list_attributes')
+
+    def __init__(self, items, n_items=None, path_format=PATH_ITEM, list_attributes=True):
+        """ Constructor
+
+            :param items: iterable of (name, child_obj) tuples. It may be iterated more than
+                once, so it can't be an iterator or generator. Use lazy_items to create the
+                items on demand.
+            :param n_items: the number of items. Can be omitted if items is a list or tuple.
+            :param path_format: format string that creates the path of an item from the path
+                of the object and the item name, e.g. PATH_ITEM.
+            :param list_attributes: if False, the attributes of the object are not listed.
+        """
+        if n_items is None:
+            n_items = len(items)
+        self.items = items
+        self.n_items = n_items
+        self.path_format = path_format
+        self.list_attributes = list_attributes
+
+
+class _LazyItems(object):
+    """ Iterable that calls a generator function each time it is iterated.
+    """
+    __slots__ = ('generator_fn', 'args')
+
+    def __init__(self, generator_fn, args):
+        self.generator_fn = generator_fn
+        self.args = args
+
+    def __iter__(self):
+        return iter(self.generator_fn(*self.args))
+
+
+def lazy_items(generator_fn, *args):
+    """ Returns an iterable over the (name, child_obj) tuples of generator_fn(*args).
+
+        The generator function is called anew each time the items are iterated, and the
+        tree model only iterates as far as the pages it is fetching.
+    """
+    return _LazyItems(generator_fn, args)
+
+
+# The registered providers per type. The lookups along the MRO are cached.
+_PROVIDERS = {}
+_PROVIDER_CACHE = weakref.WeakKeyDictionary()
+_PROVIDERS_LOCK = threading.Lock()
+
+
+def register_child_provider(cls, provider):
+    """ Registers the function that lists the items of objects of type cls and its subclasses.
+
+        :param provider: function that takes the object and returns a ChildListing. It is
+            called from a worker thread if the model fetches its children asynchronously.
+    """
+    with _PROVIDERS_LOCK:
+        _PROVIDERS[cls] = provider
+        _PROVIDER_CACHE.clear()
+
+
+def unregister_child_provider(cls):
+    """ Removes the provider of a type. Does nothing if the type has no provider.
+    """
+    with _PROVIDERS_LOCK:
+        _PROVIDERS.pop(cls, None)
+        _PROVIDER_CACHE.clear()
+
+
+def child_provider(cls):
+    """ Returns the provider of the type, or of its nearest base class that has a provider.
+        Returns None if there is none.
+    """
+    try:
+        with _PROVIDERS_LOCK:
+            return _PROVIDER_CACHE[cls]
+    except KeyError:
+        pass
+    except TypeError:
+        # Type doesn't support weak references
+        return _lookup_provider(cls)
+
+    provider = _lookup_provider(cls)
+    with _PROVIDERS_LOCK:
+        _PROVIDER_CACHE[cls] = provider
+    return provider
+
+
+def _lookup_provider(cls):
+    """ Searches the registry for the provider of the type along its MRO.
+    """
+    try:
+        mro = inspect.getmro(cls)
+    except Exception as ex:
+        logger.debug("Unable to get the MRO of {}: {}".format(cls, ex))
+        mro = (cls, )
+
+    with _PROVIDERS_LOCK:
+        for base in mro:
+            provider = _PROVIDERS.get(base)
+            if provider is not None:
+                return provider
+    return None
+
+
+def mapping_items(obj, sort_keys=True):
+    """ Returns the list of (key, value) tuples of obj.items(), sorted by key if possible.
+    """
+    try:
+        items = list(obj.items())
+    except Exception as ex:
+        # Can happen if the items method expects an argument, for instance the
+        # types.DictType.items method expects a dictionary.
+        logger.warn("No items expanded. Objects items() call failed: {}".format(ex))
+        return []
+
+    if sort_keys:
+        try:
+            items = sorted(items)
+        except Exception as ex:
+            logger.debug("Unable to sort dictionary keys: {}".format(ex))
+    return items
+
+
+def _dict_children(obj):
+    """ Lists the items of a dictionary, sorted by key.
+    """
+    return ChildListing(mapping_items(obj))
+
+
+def _ordered_dict_children(obj):
+    """ Lists the items of an OrderedDict in their order.
+    """
+    return ChildListing(mapping_items(obj, sort_keys=False))
+
+
+def _set_children(obj):
+    """ Lists the elements of a set, sorted if possible.
+    """
+    try:
+        elements = sorted(obj)
+    except Exception as ex:
+        logger.debug("Unable to sort set elements: {}".format(ex))
+        elements = list(obj)
+    return ChildListing([('pop()', elem) for elem in elements], path_format=PATH_SET_ELEMENT)
+
+
+register_child_provider(dict, _dict_children)
+register_child_provider(OrderedDict, _ordered_dict_children)
+register_child_provider(set, _set_children)
+register_child_provider(frozenset, _set_children)
@@ -0,0 +1,257 @@
+""" Cached versions of the inspect functions that look up source code, files and modules.
+
+    The inspect functions resolve the file and read and parse the source every time they are
+    called. Here the results are memoized in memory, per code object, class or module. The keys
+    are weak references so that the results are removed when the objects are garbage collected.
+    Exceptions are memoized as well and raised again. The results that depend on the contents
+    of the source file are stored with the modification time and size of the file, and are
+    looked up again when these have changed, like linecache.checkcache does.
+
+    Optionally the results of getsource, getsourcelines and getcomments are also stored in an
+    on-disk cache, keyed by the path and modification time of the source file. This keeps the
+    lookups fast in later sessions. Call enable_disk_cache to use it.
+"""
+from __future__ import absolute_import
+
+import inspect, json, logging, os, sqlite3, threading, weakref
+
+logger = logging.getLogger(__name__)
+
+# Directory of the on-disk cache if enable_disk_cache is called without argument.
+DEFAULT_DISK_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'objbrowser')
+
+DISK_CACHE_FILE_NAME = 'inspect_cache.sqlite'
+
+_MEMO = weakref.WeakKeyDictionary()  # key object -> {function name: (file_stat, result)}
+_MEMO_LOCK = threading.Lock()
+
+_DISK_CACHE = None
+
+_MISSING = object()
+
+
+class _CachedError(object):
+    """ Memoized exception. A new exception of the same type is raised for each lookup,
+        so that no tracebacks (and the frames they refer to) are kept alive by the cache.
+    """
+    def __init__(self, exception):
+        self.exc_type = type(exception)
+        self.args = exception.args
+
+    def raise_error(self):
+        try:
+            error = self.exc_type(*self.args)
+        except Exception: # The exception class requires other arguments.
+            error = RuntimeError(*self.args)
+        raise error
+
+
+
+class _DiskCache(object):
+    """ SQLite database with the source code lookup results, keyed by file.
+        A result is only valid if the modification time and size of the file are unchanged.
+    """
+    def __init__(self, file_name):
+        """ Constructor
+
+            :param file_name: file name of the SQLite database. Is created if it doesn't exist.
+        """
+        self.file_name = file_name
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(file_name, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS results (file TEXT, mtime REAL, size INTEGER, "
+                "function TEXT, key TEXT, value TEXT, PRIMARY KEY (file, function, key))")
+
+
+    def get(self, file_stat, function, key):
+        """ Returns the stored result or _MISSING if it's not present or outdated.
+
+            :param file_stat: (path, mtime, size) tuple of the source file.
+        """
+        path, mtime, size = file_stat
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT mtime, size, value FROM results WHERE file=? AND function=? AND key=?",
+                (path, function, key)).fetchone()
+        if row is None or row[0] != mtime or row[1] != size:
+            return _MISSING
+        return json.loads(row[2])
+
+
+    def put(self, file_stat, function, key, value):
+        """ Stores a result, which must be serializable to JSON.
+        """
+        path, mtime, size = file_stat
+        try:
+            with self._lock, self._connection:
+                self._connection.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                                         (path, mtime, size, function, key, json.dumps(value)))
+        except sqlite3.Error as ex:
+            logger.warning("Unable to store in {}: {}".format(self.file_name, ex))
+
+
+    def close(self):
+        """ Closes the database connection.
+        """
+        with self._lock:
+            self._connection.close()
+
+
+
+def enable_disk_cache(directory=None):
+    """ Stores the source code lookups in an on-disk cache in the directory.
+        If directory is None, DEFAULT_DISK_CACHE_DIR is used.
+    """
+    global _DISK_CACHE
+    directory = DEFAULT_DISK_CACHE_DIR if directory is None else directory
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    disable_disk_cache()
+    _DISK_CACHE = _DiskCache(os.path.join(directory, DISK_CACHE_FILE_NAME))
+    logger.debug("Using on-disk inspect cache: {}".format(_DISK_CACHE.file_name))
+
+
+def disable_disk_cache():
+    """ Stops using the on-disk cache.
+    """
+    global _DISK_CACHE
+    if _DISK_CACHE is not None:
+        _DISK_CACHE.close()
+        _DISK_CACHE = None
+
+
+def clear_memo():
+    """ Removes all results from the in-memory cache.
+    """
+    with _MEMO_LOCK:
+        _MEMO.clear()
+
+
+def _memo_key(obj):
+    """ Returns the object that determines the result of the lookups: the module, class or
+        code object. Returns None if the results for obj shouldn't be cached.
+    """
+    if inspect.ismethod(obj):
+        obj = obj.__func__
+    if inspect.isfunction(obj):
+        try:
+            obj = inspect.unwrap(obj) # The inspect functions unwrap decorated functions.
+        except (AttributeError, ValueError): # No unwrap in Python 2, or a cycle.
+            pass
+        return getattr(obj, '__code__', None)
+    if inspect.ismodule(obj) or inspect.isclass(obj) or inspect.iscode(obj):
+        return obj
+    return None
+
+
+def _disk_key(key_obj):
+    """ Returns a string that identifies the key object within its source file.
+    """
+    if inspect.iscode(key_obj):
+        return "code:{}:{}".format(key_obj.co_name, key_obj.co_firstlineno)
+    elif inspect.isclass(key_obj):
+        return "class:{}".format(getattr(key_obj, '__qualname__', key_obj.__name__))
+    else:
+        return "module"
+
+
+def _source_file_stat(obj):
+    """ Returns the (path, mtime, size) tuple of the source file of obj, or None if unknown.
+    """
+    try:
+        path = getsourcefile(obj)
+        if path is None:
+            return None
+        stat = os.stat(path)
+    except Exception:
+        return None
+    return os.path.abspath(path), stat.st_mtime, stat.st_size
+
+
+def _lookup(function, obj, to_json=None, from_json=None):
+    """ Returns function(obj). Uses the memoized result if available.
+
+        If to_json and from_json are given, the result depends on the contents of the source
+        file. The memoized result is then only used if the modification time and size of the
+        file are unchanged. If the on-disk cache is enabled, the result is looked up in (and
+        stored to) the on-disk cache as well.
+    """
+    key_obj = _memo_key(obj)
+    if key_obj is None:
+        return function(obj)
+
+    name = function.__name__
+    try:
+        with _MEMO_LOCK:
+            results = _MEMO.get(key_obj)
+    except TypeError:
+        return function(obj) # Doesn't support weak references
+
+    file_stat = _source_file_stat(obj) if to_json is not None else None
+    entry = results.get(name) if results is not None else None
+    if entry is not None and entry[0] == file_stat:
+        result = entry[1]
+    else:
+        result = _MISSING
+        disk_cache = _DISK_CACHE if to_json is not None else None
+        if disk_cache is not None and file_stat is not None:
+            value = disk_cache.get(file_stat, name, _disk_key(key_obj))
+            if value is not _MISSING:
+                result = from_json(value)
+
+        if result is _MISSING:
+            try:
+                result = function(obj)
+            except Exception as ex:
+                result = _CachedError(ex)
+            else:
+                if disk_cache is not None and file_stat is not None:
+                    disk_cache.put(file_stat, name, _disk_key(key_obj), to_json(result))
+
+        with _MEMO_LOCK:
+            _MEMO.setdefault(key_obj, {})[name] = (file_stat, result)
+
+    if isinstance(result, _CachedError):
+        result.raise_error()
+    return result
+
+
+def getsource(obj):
+    """ Cached version of inspect.getsource
+    """
+    return _lookup(inspect.getsource, obj, to_json=lambda source: source,
+                   from_json=lambda source: source)
+
+
+def getsourcelines(obj):
+    """ Cached version of inspect.getsourcelines
+    """
+    lines, line_nr = _lookup(inspect.getsourcelines, obj, to_json=list, from_json=tuple)
+    return list(lines), line_nr  # Copy the list so that the cached result can't be changed.
+
+
+def getcomments(obj):
+    """ Cached version of inspect.getcomments
+    """
+    return _lookup(inspect.getcomments, obj, to_json=lambda comments: [comments],
+                   from_json=lambda value: value[0])
+
+
+def getfile(obj):
+    """ Cached version of inspect.getfile
+    """
+    return _lookup(inspect.getfile, obj)
+
+
+def getsourcefile(obj):
+    """ Cached version of inspect.getsourcefile
+    """
+    return _lookup(inspect.getsourcefile, obj)
+
+
+def getmodule(obj):
+    """ Cached version of inspect.getmodule
+    """
+    return _lookup(inspect.getmodule, obj)
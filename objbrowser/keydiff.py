@@ -0,0 +1,114 @@
+""" Computes the differences between two lists of keys in (near) linear time.
+
+    Used to update the children of a tree node after a refresh. The keys identify the children,
+    e.g. (obj_name, is_attribute) tuples. The result has the same format as the opcodes of
+    difflib.SequenceMatcher, but SequenceMatcher is quadratic in the worst case, which is too
+    slow for nodes with hundreds of thousands of children.
+
+    Keys may occur more than once (e.g. the 'pop()' elements of sets). The n-th occurrence of a
+    key in the old list is matched with the n-th occurrence in the new list.
+"""
+from __future__ import absolute_import
+
+import logging
+
+from bisect import bisect_left
+
+logger = logging.getLogger(__name__)
+
+
+def _numbered(keys):
+    """ Returns a list of (key, occurrence_nr) tuples, which are unique.
+    """
+    counts = {}
+    result = []
+    for key in keys:
+        count = counts.get(key, 0)
+        counts[key] = count + 1
+        result.append((key, count))
+    return result
+
+
+def _increasing_subsequence(values):
+    """ Returns the positions of a longest strictly increasing subsequence of values.
+        Runs in O(n log n) time.
+    """
+    tail_values = []    # Smallest last value of the increasing subsequences of each length
+    tail_positions = [] # Position of that value
+    predecessors = [None] * len(values)
+
+    for pos, value in enumerate(values):
+        length = bisect_left(tail_values, value)
+        predecessors[pos] = tail_positions[length - 1] if length > 0 else None
+        if length == len(tail_values):
+            tail_values.append(value)
+            tail_positions.append(pos)
+        else:
+            tail_values[length] = value
+            tail_positions[length] = pos
+
+    result = []
+    pos = tail_positions[-1] if tail_positions else None
+    while pos is not None:
+        result.append(pos)
+        pos = predecessors[pos]
+    result.reverse()
+    return result
+
+
+def diff_keys(old_keys, new_keys):
+    """ Returns a list of (tag, i1, i2, j1, j2) opcodes that describe how to turn old_keys into
+        new_keys. The tag is 'equal', 'delete' or 'insert' (see difflib.SequenceMatcher).
+
+        The keys that are kept form a longest common subsequence, so there is a minimal number
+        of deleted and inserted keys. Contiguous ranges are reported as a single opcode.
+    """
+    n_old, n_new = len(old_keys), len(new_keys)
+    opcodes = []
+
+    # Fast paths for unchanged lists and for lists that only grew or shrunk at the end.
+    n_common = min(n_old, n_new)
+    if old_keys[:n_common] == new_keys[:n_common]:
+        if n_common > 0:
+            opcodes.append(('equal', 0, n_common, 0, n_common))
+        if n_old > n_common:
+            opcodes.append(('delete', n_common, n_old, n_common, n_common))
+        if n_new > n_common:
+            opcodes.append(('insert', n_common, n_common, n_common, n_new))
+        return opcodes
+
+    if len(set(old_keys)) != n_old or len(set(new_keys)) != n_new:
+        old_keys, new_keys = _numbered(old_keys), _numbered(new_keys)
+
+    new_positions = {key: pos for pos, key in enumerate(new_keys)}
+    matches = [(old_pos, new_positions[key]) for old_pos, key in enumerate(old_keys)
+               if key in new_positions]
+
+    # If keys have been moved, only the longest increasing run of matches can be kept.
+    new_matches = [new_match for _old_match, new_match in matches]
+    if any(prev > cur for prev, cur in zip(new_matches, new_matches[1:])):
+        matches = [matches[idx] for idx in _increasing_subsequence(new_matches)]
+
+    old_pos = new_pos = 0
+    equal_start = None # (old, new) start position of the current run of equal keys
+    for old_match, new_match in matches:
+        if old_match != old_pos or new_match != new_pos:
+            if equal_start is not None:
+                opcodes.append(('equal', equal_start[0], old_pos, equal_start[1], new_pos))
+            if old_pos < old_match:
+                opcodes.append(('delete', old_pos, old_match, new_pos, new_pos))
+            if new_pos < new_match:
+                opcodes.append(('insert', old_match, old_match, new_pos, new_match))
+            equal_start = (old_match, new_match)
+        elif equal_start is None:
+            equal_start = (old_match, new_match)
+        old_pos, new_pos = old_match + 1, new_match + 1
+
+    if equal_start is not None:
+        opcodes.append(('equal', equal_start[0], old_pos, equal_start[1], new_pos))
+    if old_pos < n_old:
+        opcodes.append(('delete', old_pos, n_old, new_pos, new_pos))
+    if new_pos < n_new:
+        opcodes.append(('insert', n_old, n_old, new_pos, n_new))
+
+    return opcodes
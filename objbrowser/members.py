@@ -0,0 +1,502 @@
+""" Functions for listing the members (attributes) of an object.
+
+    The inspect.getmembers function evaluates all attributes in one go. A single slow property
+    therefore blocks the complete listing, and a single property that raises an exception other
+    than AttributeError makes it fail. Here the attributes are evaluated one at a time. Attributes
+    that may execute arbitrary code (e.g. properties) are evaluated in a worker thread with a time
+    budget, or are not evaluated at all so that they can be evaluated later.
+
+    Listing and classifying the attribute names of an object is done per type. The sorted names
+    of the class attributes and their classification are cached in a dictionary with weak
+    references to the types, so that the entries disappear when the classes are unloaded. Only the
+    instance attributes and values still have to be retrieved per object.
+
+    Alternatively only the state that is stored in the instance can be listed, see
+    get_instance_state. This doesn't call dir() or getattr() and never executes descriptors.
+"""
+from __future__ import absolute_import
+
+import logging, threading, types, weakref
+
+from itertools import repeat
+from operator import itemgetter
+from six.moves import filter, filterfalse, map
+
+from objbrowser.workers import WorkerPool, run_in_thread
+
+logger = logging.getLogger(__name__)
+
+# Default maximum number of seconds the evaluation of a single attribute may take.
+DEFAULT_ATTR_TIME_BUDGET = 0.5
+
+# Worker threads that evaluate the attributes that have a time budget.
+_EVAL_POOL = WorkerPool(max_threads=8, name='evaluate')
+
+# Descriptor types of which the __get__ method doesn't execute arbitrary Python code.
+_SIMPLE_DESCRIPTOR_TYPES = (types.FunctionType, types.BuiltinFunctionType,
+                            types.MethodType, types.GetSetDescriptorType,
+                            types.MemberDescriptorType, staticmethod, classmethod,
+                            type(str.join), type(dict.__dict__['fromkeys']),
+                            type(object.__init__), type(object().__str__))
+
+
+# Classification flags of class attributes
+ATTR_DUNDER = 1           # The name starts and ends with two underscores
+ATTR_CALLABLE = 2         # The class attribute is callable
+ATTR_METHOD = 4           # The class attribute is a function or method (descriptor)
+ATTR_DESCRIPTOR = 8       # The class attribute has a __get__ method
+ATTR_DATA_DESCRIPTOR = 16 # The class attribute has a __set__ or __delete__ method as well
+ATTR_COMPUTED = 32        # Getting the attribute may execute arbitrary Python code
+
+# Py_TPFLAGS_HEAPTYPE bit of type.__flags__. Only the attributes of heap types (classes that are
+# defined in Python) can be changed. The dictionaries of builtin and extension types are fixed.
+_HEAP_TYPE_FLAG = 1 << 9
+
+
+class UnevaluatedValue(object):
+    """ Placeholder for the value of an attribute that has not been evaluated (yet).
+        The str() and repr() of the placeholder are shown in the table.
+    """
+    def __init__(self, text):
+        self.text = text
+
+    def __repr__(self):
+        return self.text
+
+    def __str__(self):
+        return self.text
+
+
+# The attribute is being evaluated in the background.
+PENDING_VALUE = UnevaluatedValue("\u2026 evaluating")
+
+# The evaluation took longer than the time budget. It can be evaluated again on demand.
+TIMED_OUT_VALUE = UnevaluatedValue("\u23f1 timed out")
+
+
+class NotEvaluatedValue(UnevaluatedValue):
+    """ Placeholder for a computed attribute that is only evaluated when it is needed.
+        The text contains the type of the descriptor, e.g. '<property, not evaluated>'.
+    """
+    def __init__(self, descriptor_type_name):
+        super(NotEvaluatedValue, self).__init__(
+            "<{}, not evaluated>".format(descriptor_type_name))
+
+
+_NOT_EVALUATED_VALUES = {} # descriptor type name -> NotEvaluatedValue
+
+# Marks the attributes that are skipped by _get_plain_attributes.
+_SKIPPED = object()
+
+
+def is_unevaluated(obj):
+    """ Returns True if obj is a placeholder for a value that has not been evaluated.
+    """
+    return isinstance(obj, UnevaluatedValue)
+
+
+def is_not_evaluated(obj):
+    """ Returns True if obj is a placeholder for a computed attribute that is evaluated lazily.
+    """
+    return isinstance(obj, NotEvaluatedValue)
+
+
+def not_evaluated_value(descriptor_type_name):
+    """ Returns the NotEvaluatedValue placeholder for attributes of a descriptor type.
+    """
+    value = _NOT_EVALUATED_VALUES.get(descriptor_type_name)
+    if value is None:
+        value = _NOT_EVALUATED_VALUES.setdefault(descriptor_type_name,
+                                                 NotEvaluatedValue(descriptor_type_name))
+    return value
+
+
+def classify_class_attribute(attr_name, class_attr):
+    """ Returns the classification flags (ATTR_*) of a class attribute.
+    """
+    flags = 0
+    if attr_name.startswith('__') and attr_name.endswith('__'):
+        flags |= ATTR_DUNDER
+    if callable(class_attr):
+        flags |= ATTR_CALLABLE
+    if isinstance(class_attr, (types.FunctionType, types.BuiltinFunctionType, types.MethodType,
+                               type(str.join), type(object().__str__))):
+        flags |= ATTR_METHOD
+
+    attr_type = type(class_attr)
+    if hasattr(attr_type, '__get__'):
+        flags |= ATTR_DESCRIPTOR
+        if hasattr(attr_type, '__set__') or hasattr(attr_type, '__delete__'):
+            flags |= ATTR_DATA_DESCRIPTOR
+        if not isinstance(class_attr, _SIMPLE_DESCRIPTOR_TYPES):
+            flags |= ATTR_COMPUTED
+    return flags
+
+
+class TypeMembers(object):
+    """ The attribute names of a type and the classification of its class attributes.
+    """
+    def __init__(self, cls):
+        """ Constructor
+
+            :param cls: the type (class) of the objects.
+        """
+        self.stamp = self.type_stamp(cls)
+        self.flags = {}
+        self.descriptor_type_names = {}
+        for klass in reversed(cls.__mro__):
+            for attr_name, class_attr in getattr(klass, '__dict__', {}).items():
+                self.flags[attr_name] = classify_class_attribute(attr_name, class_attr)
+                self.descriptor_type_names[attr_name] = type(class_attr).__name__
+
+        # Same names as dir(cls) returns, which is not always the case for the flags keys.
+        # For instance, dir() doesn't list the __mro__ attribute of classes.
+        self.names = sorted(dir(cls))
+        self.name_set = frozenset(self.names)
+
+        self.computed_names = frozenset(name for name, flags in self.flags.items()
+                                        if flags & ATTR_COMPUTED)
+        self._method_names = frozenset(name for name, flags in self.flags.items()
+                                       if flags & ATTR_METHOD)
+        self.non_data_computed_names = frozenset(
+            name for name in self.computed_names if not self.flags[name] & ATTR_DATA_DESCRIPTOR)
+        self.descriptor_type_names = {name: self.descriptor_type_names[name]
+                                      for name in self.computed_names}
+
+
+    @staticmethod
+    def type_stamp(cls):
+        """ Returns a value that changes when attributes are added to, removed from or replaced
+            in the class or one of its base classes. It consists of the names and the identities
+            of the values in the class dictionaries. Builtin and extension types are skipped
+            since their attributes can't be changed.
+        """
+        return tuple([(tuple(klass.__dict__), tuple(map(id, klass.__dict__.values())))
+                      for klass in cls.__mro__
+                      if getattr(klass, '__flags__', _HEAP_TYPE_FLAG) & _HEAP_TYPE_FLAG])
+
+
+    def attribute_names(self, obj):
+        """ Returns the sorted attribute names of an instance of the type. Equals sorted(dir(obj))
+            for objects that don't override __dir__.
+        """
+        inst_dict = _instance_dict(obj)
+        if not inst_dict:
+            return self.names
+
+        extra_names = [name for name in inst_dict if name not in self.name_set]
+        if not extra_names:
+            return self.names
+        else:
+            return sorted(self.names + extra_names)
+
+
+    def computed_attribute_names(self, obj):
+        """ Returns the set of attribute names of an instance that are computed, i.e. that may
+            execute arbitrary code when they are retrieved.
+        """
+        if not self.non_data_computed_names:
+            return self.computed_names
+
+        # Instance attributes take precedence over non-data descriptors.
+        shadowed = self.non_data_computed_names.intersection(_instance_dict(obj))
+        return self.computed_names - shadowed if shadowed else self.computed_names
+
+
+    def method_names(self, obj):
+        """ Returns the set of attribute names of an instance that are methods of the class,
+            which are callable when retrieved from the instance.
+        """
+        inst_dict = _instance_dict(obj)
+        if not inst_dict:
+            return self._method_names
+        return self._method_names.difference(inst_dict)
+
+
+    def is_computed(self, obj, attr_name):
+        """ Returns True if getting the attribute of an instance may execute arbitrary code.
+        """
+        return attr_name in self.computed_attribute_names(obj)
+
+
+# Cache with the TypeMembers per type.
+_TYPE_MEMBERS_CACHE = weakref.WeakKeyDictionary()
+_TYPE_MEMBERS_LOCK = threading.Lock()
+
+
+def _instance_dict(obj):
+    """ Returns the __dict__ of an object, or an empty dict if it has none.
+    """
+    try:
+        inst_dict = object.__getattribute__(obj, '__dict__')
+    except (AttributeError, TypeError):
+        return {}
+    return inst_dict if isinstance(inst_dict, dict) else {}
+
+
+def _has_default_dir(obj):
+    """ Returns True if dir(obj) is determined by its type and instance dictionary only.
+
+        This is not the case for classes and modules, objects of which the type overrides
+        __dir__, and proxy objects that lie about their __class__.
+    """
+    cls = type(obj)
+    if issubclass(cls, (type, types.ModuleType)):
+        return False
+    if getattr(cls, '__dir__', None) is not object.__dir__:
+        return False
+    try:
+        return object.__getattribute__(obj, '__class__') is cls
+    except Exception:
+        return False
+
+
+def type_members(cls):
+    """ Returns the (cached) TypeMembers of a type.
+
+        The cache entry is updated if attributes have been added to, or removed from, the class.
+    """
+    try:
+        with _TYPE_MEMBERS_LOCK:
+            members = _TYPE_MEMBERS_CACHE.get(cls)
+    except TypeError:
+        # Type doesn't support weak references
+        return TypeMembers(cls)
+
+    if members is None or members.stamp != TypeMembers.type_stamp(cls):
+        members = TypeMembers(cls)
+        with _TYPE_MEMBERS_LOCK:
+            _TYPE_MEMBERS_CACHE[cls] = members
+    return members
+
+
+def clear_type_members_cache():
+    """ Removes all types from the cache.
+    """
+    with _TYPE_MEMBERS_LOCK:
+        _TYPE_MEMBERS_CACHE.clear()
+
+
+def is_computed_attribute(obj, attr_name):
+    """ Returns True if getting the attribute may execute arbitrary Python code.
+
+        This is the case for properties and other descriptors that are implemented in Python.
+        Plain instance and class attributes, methods and descriptors of builtin types are
+        considered to be fast. Attributes of classes and modules are never computed.
+    """
+    if isinstance(obj, (type, types.ModuleType)):
+        return False
+    return type_members(type(obj)).is_computed(obj, attr_name)
+
+
+def _get_attribute(obj, attr_name):
+    """ Returns getattr(obj, attr_name), or the exception if that fails.
+    """
+    try:
+        return getattr(obj, attr_name)
+    except Exception as ex:
+        return ex
+
+
+def evaluate_attribute(obj, attr_name, time_budget=None):
+    """ Returns the value of an attribute. If an exception occurs it is returned as the value.
+
+        If time_budget is not None, the attribute is evaluated in a worker thread. If this takes
+        longer than time_budget seconds, TIMED_OUT_VALUE is returned. The evaluation can't be
+        interrupted; it continues in the background but its result is discarded. Its thread is
+        no longer counted as a worker of the pool, so that attributes that hang don't block the
+        evaluation of other attributes.
+    """
+    if time_budget is None:
+        return _get_attribute(obj, attr_name)
+
+    job = _EVAL_POOL.submit(_get_attribute, (obj, attr_name))
+    if job.wait(time_budget):
+        return job.result
+    else:
+        logger.debug("Evaluation of {!r} timed out after {} sec".format(attr_name, time_budget))
+        job.cancel()
+        _EVAL_POOL.abandon(job)
+        return TIMED_OUT_VALUE
+
+
+def submit_evaluation(obj, attr_name, on_done):
+    """ Evaluates an attribute in a thread of its own without time budget, because the
+        evaluation may never finish. Calls on_done(job) in that thread when done. The value is
+        stored in job.result. Returns the Job.
+    """
+    return run_in_thread(_get_attribute, (obj, attr_name), on_done=on_done, name='evaluate')
+
+
+def get_members(obj, time_budget=None, defer_computed=False,
+                include_dunder=True, include_callables=True, lazy_computed=False):
+    """ Returns a list of (attr_name, attr_value) tuples, sorted by name, like inspect.getmembers.
+
+        The attributes are evaluated one at a time. Computed attributes (see
+        is_computed_attribute) are evaluated with the time budget. If defer_computed is True,
+        they are not evaluated at all and get PENDING_VALUE as value. If lazy_computed is True,
+        they are not evaluated either but get a NotEvaluatedValue, which names the type of the
+        descriptor. These are meant to be evaluated when they are needed.
+
+        Attributes that raise an AttributeError are skipped. Other exceptions are used as value.
+
+        If include_dunder is False, attributes with a __dunder__ name are skipped without being
+        evaluated. If include_callables is False, attributes with a callable value are skipped.
+        Methods of the class are skipped without being evaluated. Deferred and lazy computed
+        attributes are always included, as their value is unknown.
+    """
+    method_names = ()
+    computed_names = frozenset()
+    descriptor_type_names = {}
+    if _has_default_dir(obj):
+        cls_members = type_members(type(obj))
+        attr_names = cls_members.attribute_names(obj)
+        computed_names = cls_members.computed_attribute_names(obj)
+        descriptor_type_names = cls_members.descriptor_type_names
+        if not include_callables:
+            method_names = cls_members.method_names(obj)
+    else:
+        try:
+            attr_names = sorted(dir(obj))
+        except Exception as ex:
+            logger.warning("Unable to list attributes: {}".format(ex))
+            attr_names = []
+        # Same as is_computed_attribute, but the type members are looked up only once.
+        if not isinstance(obj, (type, types.ModuleType)):
+            cls_members = type_members(type(obj))
+            computed_names = cls_members.computed_attribute_names(obj)
+            descriptor_type_names = cls_members.descriptor_type_names
+
+    if not include_dunder:
+        attr_names = [name for name in attr_names
+                      if not (name.startswith('__') and name.endswith('__'))]
+
+    excluded_names = computed_names.union(method_names) if method_names else computed_names
+    if excluded_names:
+        members = _get_plain_attributes(
+            obj, list(filterfalse(excluded_names.__contains__, attr_names)))
+    else:
+        members = _get_plain_attributes(obj, attr_names)
+
+    if computed_names:
+        for attr_name in filter(computed_names.__contains__, attr_names):
+            if lazy_computed:
+                attr_value = not_evaluated_value(
+                    descriptor_type_names.get(attr_name, 'descriptor'))
+            elif defer_computed:
+                attr_value = PENDING_VALUE
+            else:
+                attr_value = evaluate_attribute(obj, attr_name, time_budget)
+                if isinstance(attr_value, AttributeError):
+                    continue
+            members.append((attr_name, attr_value))
+        members.sort(key=itemgetter(0))
+
+    if not include_callables:
+        members = [member for member in members if not callable(member[1])]
+    return members
+
+
+def _get_plain_attributes(obj, attr_names):
+    """ Returns a list of (attr_name, attr_value) tuples with the attributes of obj that are not
+        computed. Attributes that raise an AttributeError are skipped. Other exceptions are used
+        as value.
+
+        The attributes are retrieved with map, which is considerably faster than calling getattr
+        in a loop. If an exception occurs, map continues with the next attribute.
+    """
+    values = []
+    names_iter = iter(attr_names)
+    n_skipped = 0
+    while True:
+        try:
+            values.extend(map(getattr, repeat(obj), names_iter))
+            break
+        except AttributeError:
+            values.append(_SKIPPED)
+            n_skipped += 1
+        except Exception as ex:
+            values.append(ex)
+
+    if n_skipped:
+        return [(name, value) for name, value in zip(attr_names, values) if value is not _SKIPPED]
+    else:
+        return list(zip(attr_names, values))
+
+
+def _slot_names(cls):
+    """ Returns a list of (defining class, slot name) tuples of the __slots__ of a type and its
+        base classes. Private slot names are mangled, like the names of their descriptors.
+    """
+    result = []
+    for klass in cls.__mro__:
+        slots = getattr(klass, '__dict__', {}).get('__slots__', ())
+        if isinstance(slots, str):
+            slots = (slots, )
+        for slot_name in slots:
+            if slot_name in ('__dict__', '__weakref__'):
+                continue
+            if slot_name.startswith('__') and not slot_name.endswith('__'):
+                slot_name = '_{}{}'.format(klass.__name__.lstrip('_'), slot_name)
+            result.append((klass, slot_name))
+    return result
+
+
+def _namedtuple_fields(obj):
+    """ Returns the field names of a namedtuple, or an empty tuple for other objects.
+    """
+    if not isinstance(obj, tuple):
+        return ()
+    try:
+        fields = type.__getattribute__(type(obj), '_fields')
+    except AttributeError:
+        return ()
+    if not isinstance(fields, tuple) or not all(isinstance(name, str) for name in fields):
+        return ()
+    return fields
+
+
+def get_instance_state(obj, include_dunder=True, include_callables=True):
+    """ Returns a list of (attr_name, attr_value) tuples, sorted by name, with the attributes
+        that are stored in the object itself: the contents of its __dict__ (vars(obj)), its
+        __slots__, and the fields of namedtuples. The fields of dataclasses and attrs classes
+        are stored in the __dict__ or __slots__, so these are included as well.
+
+        Contrary to get_members, no methods, properties or other class attributes are listed,
+        and the values are read from the storage directly so that no descriptor is executed.
+        For classes, the attributes that are defined in the class body are returned.
+
+        If include_dunder is False, attributes with a __dunder__ name are skipped. If
+        include_callables is False, attributes with a callable value are skipped.
+    """
+    if isinstance(obj, type):
+        state = dict(type.__getattribute__(obj, '__dict__'))
+    else:
+        state = dict(_instance_dict(obj))
+
+    cls = type(obj)
+    for klass, slot_name in _slot_names(cls):
+        descriptor = klass.__dict__.get(slot_name)
+        if isinstance(descriptor, types.MemberDescriptorType):
+            try:
+                state[slot_name] = descriptor.__get__(obj, cls)
+            except AttributeError:
+                pass # The slot has not been assigned (or has been deleted).
+
+    # The fields of namedtuples are stored as tuple elements.
+    for idx, field_name in enumerate(_namedtuple_fields(obj)):
+        if idx < tuple.__len__(obj):
+            state.setdefault(field_name, tuple.__getitem__(obj, idx))
+
+    members = []
+    for attr_name, attr_value in state.items():
+        if not isinstance(attr_name, str):
+            continue
+        if not include_dunder and attr_name.startswith('__') and attr_name.endswith('__'):
+            continue
+        if not include_callables and callable(attr_value):
+            continue
+        members.append((attr_name, attr_value))
+
+    members.sort(key=lambda member: member[0])
+    return members
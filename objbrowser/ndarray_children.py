@@ -0,0 +1,106 @@
+""" Functions for browsing the contents of NumPy arrays.
+
+    The leading axis of an array is shown as virtual child rows, which are only created when they
+    are displayed. Large arrays are first split into blocks of ARRAY_BLOCK_SIZE rows. The fields
+    of structured arrays are shown as named children.
+
+    The summaries of array elements are computed per page of elements with one vectorized call.
+"""
+from __future__ import absolute_import
+
+import logging
+
+try:
+    import numpy as np
+except ImportError:
+    _NUMPY_INSTALLED = False
+else:
+    _NUMPY_INSTALLED = True
+
+logger = logging.getLogger(__name__)
+
+# Arrays with more rows than this are first split into blocks of rows.
+ARRAY_BLOCK_SIZE = 1000
+
+# Number of element summaries that are computed at once.
+SUMMARY_PAGE_SIZE = 256
+
+
+def is_ndarray(obj):
+    """ Returns True if obj is a NumPy array (and NumPy is installed).
+    """
+    return _NUMPY_INSTALLED and isinstance(obj, np.ndarray)
+
+
+def array_length(arr):
+    """ Returns the length of the leading axis or None for zero-dimensional arrays.
+    """
+    return arr.shape[0] if arr.ndim > 0 else None
+
+
+def array_block_count(arr):
+    """ Returns the number of blocks the array is split into. Returns 0 if the array is small
+        enough to show its rows directly.
+    """
+    n_rows = array_length(arr)
+    if n_rows is None or n_rows <= ARRAY_BLOCK_SIZE:
+        return 0
+    else:
+        return (n_rows + ARRAY_BLOCK_SIZE - 1) // ARRAY_BLOCK_SIZE
+
+
+def array_block_bounds(arr, block_nr):
+    """ Returns the (start, stop) row numbers of a block.
+    """
+    start = block_nr * ARRAY_BLOCK_SIZE
+    stop = min(start + ARRAY_BLOCK_SIZE, arr.shape[0])
+    return start, stop
+
+
+def structured_field_names(arr):
+    """ Returns the field names of a structured array. Returns an empty tuple otherwise.
+    """
+    return arr.dtype.names or ()
+
+
+def element_summaries(arr, start, stop):
+    """ Returns a list with the summaries of the elements arr[start:stop] of a 1D array.
+
+        The summaries are computed with a single vectorized call. Falls back on calling str() on
+        the individual elements if the array can't be converted (e.g. structured arrays).
+    """
+    page = arr[start:stop]
+    try:
+        return page.astype(str).tolist()
+    except Exception as ex:
+        logger.debug("Unable to convert array page to strings: {}".format(ex))
+        return [str(elem) for elem in page]
+
+
+def virtual_element_summary(tree_item):
+    """ Returns the summary of a tree item that holds an element of a 1D array.
+
+        The summaries are computed per page of SUMMARY_PAGE_SIZE elements and stored in the
+        cache of the virtual children of the parent item. Returns None if the tree item does not
+        hold an element of a 1D array.
+    """
+    parent_item = tree_item.parent_item
+    row = tree_item.virtual_row
+    if row is None or parent_item is None:
+        return None
+
+    arr = parent_item.obj
+    if not is_ndarray(arr) or arr.ndim != 1 or array_block_count(arr) > 0:
+        return None
+
+    cache = parent_item.virtual_children.cache
+    page_nr = row // SUMMARY_PAGE_SIZE
+    key = ('summaries', page_nr)
+    summaries = cache.get(key)
+    if summaries is None:
+        start = page_nr * SUMMARY_PAGE_SIZE
+        stop = min(start + SUMMARY_PAGE_SIZE, arr.shape[0])
+        summaries = element_summaries(arr, start, stop)
+        cache[key] = summaries
+
+    return summaries[row % SUMMARY_PAGE_SIZE]
@@ -15,18 +15,31 @@ import logging, traceback, hashlib, sys
 
 
 from qtpy import QtCore, QtGui, QtWidgets
-from qtpy.QtCore import Slot
+from qtpy.QtCore import Signal, Slot
 
 from objbrowser.app import get_qapp, get_qsettings, start_qt_event_loop
 from objbrowser.version import PROGRAM_NAME, PROGRAM_VERSION, PROGRAM_URL, DEBUGGING
 from objbrowser.version import PYTHON_VERSION, QT_API_NAME, QT_API, QTPY_VERSION
 from objbrowser.utils import setting_str_to_bool
-from objbrowser.treemodel import TreeProxyModel, TreeModel
+from objbrowser.treemodel import (TreeProxyModel, TreeModel, DEFAULT_FETCH_PAGE_SIZE,
+                                  DEFAULT_COLLAPSED_NODE_BUDGET)
+from objbrowser.members import is_unevaluated, DEFAULT_ATTR_TIME_BUDGET
+from objbrowser.refreshscheduler import get_refresh_scheduler
+from objbrowser.workers import WorkerPool
 from objbrowser.toggle_column_mixin import ToggleColumnTreeView
 from objbrowser.attribute_model import DEFAULT_ATTR_COLS, DEFAULT_ATTR_DETAILS
 
 logger = logging.getLogger(__name__)
 
+# Number of milliseconds the selection must be unchanged before the details are computed.
+DETAILS_DEBOUNCE_MS = 150
+
+# Number of milliseconds after which the progress indicator of the details pane is shown.
+DETAILS_PROGRESS_DELAY_MS = 300
+
+# Worker threads that compute the contents of the details panes.
+_DETAILS_POOL = WorkerPool(max_threads=4, name='details')
+
 
 # The main window inherits from a Qt class, therefore it has many 
 # ancestors public methods and attributes.
@@ -36,11 +49,24 @@ logger = logging.getLogger(__name__)
 # from one stack frame higher; you can't know if the ObjectBrowser.__init__ was
 # called directly, via the browse() wrapper or via a descendants' constructor.
 
+def _compute_details(details_fn, tree_item):
+    """ Computes the contents of the details pane. Is executed in a worker thread.
+        Returns a (text, stack_trace) tuple. The stack_trace is None if no exception occurred.
+    """
+    try:
+        return details_fn(tree_item), None
+    except Exception as ex:
+        return str(ex), traceback.format_exc()
+
+
 class ObjectBrowser(QtWidgets.QMainWindow):
     """ Object browser main application window.
     """
     _q_app = None   # Reference to the global application.
     _browsers = []  # Keep lists of browser windows.
+
+    # Emitted from a worker thread when the contents of the details pane have been computed.
+    _detailsJobDone = Signal(object)
     
     def __init__(self, obj,
                  name = '',
@@ -50,6 +76,13 @@ class ObjectBrowser(QtWidgets.QMainWindow):
                  show_dunder_attributes = None,  # None uses value from QSettings
                  auto_refresh=None,  # None uses value from QSettings
                  refresh_rate=None,  # None uses value from QSettings
+                 fetch_page_size = DEFAULT_FETCH_PAGE_SIZE,
+                 async_fetch = True,
+                 attr_time_budget = DEFAULT_ATTR_TIME_BUDGET,
+                 instance_state_only = False,
+                 lazy_properties = False,
+                 weak_refs = False,
+                 collapsed_node_budget = DEFAULT_COLLAPSED_NODE_BUDGET,
                  reset = False):
         """ Constructor
         
@@ -66,6 +99,33 @@ class ObjectBrowser(QtWidgets.QMainWindow):
                 they are hidden.
             :param auto_refresh: If True, the contents refershes itsef every <refresh_rate> seconds.
             :param refresh_rate: number of seconds between automatic refreshes. Default = 2 .
+            :param fetch_page_size: maximum number of children that are added at once when a node
+                is expanded. The remaining children can be fetched by scrolling to the end or by
+                activating (e.g. double-clicking) the '... N more' row. Use None for no limit.
+            :param async_fetch: if True, the children of a node are fetched in a worker thread
+                so that the GUI stays responsive. A pending fetch can be cancelled by pressing
+                Esc or by collapsing the node. The auto-refresh is then done in the background
+                as well, see TreeModel.startRefresh.
+            :param attr_time_budget: maximum number of seconds that evaluating a single computed
+                attribute (e.g. a property) may take. Attributes that take longer are shown as
+                'timed out' and can be evaluated by activating (e.g. double-clicking) their row.
+                Use None for no limit.
+            :param instance_state_only: if True, only the attributes that are stored in the
+                objects themselves (their __dict__, __slots__ and namedtuple fields) are listed.
+                Methods, properties and other class attributes are not listed. This makes
+                expanding objects with many class attributes much faster. Can be changed in the
+                View menu.
+            :param lazy_properties: if True, properties and other computed attributes are not
+                evaluated when a node is expanded. They are evaluated in the background when
+                their rows are displayed, and again at each refresh.
+            :param weak_refs: if True, the browser doesn't keep the objects in the tree alive,
+                except for the inspected object and a limited number of objects that don't
+                support weak references. Objects that have been garbage collected are shown as
+                '<collected>' and are removed at the next refresh.
+            :param collapsed_node_budget: maximum number of nodes in collapsed subtrees that are
+                kept in memory. If exceeded, the children of the least recently collapsed nodes
+                are removed. They are fetched again when the node is expanded. Use None to keep
+                all nodes.
             :param reset: If true the persistent settings, such as column widths, are reset. 
         """
         super(ObjectBrowser, self).__init__()
@@ -83,7 +143,18 @@ class ObjectBrowser(QtWidgets.QMainWindow):
                                     show_callable_attributes= show_callable_attributes,
                                     show_dunder_attributes = show_dunder_attributes)
 
-        self._tree_model = TreeModel(obj, name, attr_cols = self._attr_cols)
+        self._background_refresh = async_fetch
+        self._tree_model = TreeModel(obj, name, attr_cols = self._attr_cols,
+                                     fetch_page_size = fetch_page_size,
+                                     async_fetch = async_fetch,
+                                     attr_time_budget = attr_time_budget,
+                                     show_callable_attributes = show_callable_attributes,
+                                     show_dunder_attributes = show_dunder_attributes,
+                                     instance_state_only = instance_state_only,
+                                     lazy_properties = lazy_properties,
+                                     weak_refs = weak_refs,
+                                     collapsed_node_budget = collapsed_node_budget)
+        self._tree_model.refreshFinished.connect(self._on_refresh_finished)
             
         self._proxy_tree_model = TreeProxyModel(
             show_callable_attributes= show_callable_attributes,
@@ -103,14 +174,12 @@ class ObjectBrowser(QtWidgets.QMainWindow):
         self._readViewSettings(reset = reset)
 
         assert self._refresh_rate > 0, "refresh_rate must be > 0. Got: {}".format(self._refresh_rate)
-        self._refresh_timer = QtCore.QTimer(self)
-        self._refresh_timer.setInterval(round(self._refresh_rate * 1000))
-        self._refresh_timer.timeout.connect(self.refresh)
         
         # Update views with model
         self.toggle_dunder_attribute_action.setChecked(show_dunder_attributes)
         self.toggle_callable_action.setChecked(show_callable_attributes)
         self.toggle_auto_refresh_action.setChecked(self._auto_refresh)
+        self.toggle_instance_state_action.setChecked(instance_state_only)
      
         # Select first row so that a hidden root node will not be selected.
         first_row_index = self._proxy_tree_model.firstItemIndex()
@@ -123,7 +192,53 @@ class ObjectBrowser(QtWidgets.QMainWindow):
         """ Refreshes object brawser contents
         """
         logger.debug("Refreshing")
-        self._tree_model.refreshTree()
+        self._tree_model.refreshTree(is_expanded=self._is_expanded)
+
+
+    def auto_refresh(self, children_memo=None):
+        """ Refreshes the object browser contents. Called by the refresh scheduler.
+
+            In case of a background refresh, the job of its first phase is returned, which the
+            scheduler executes (see TreeModel.prepareRefresh). Otherwise returns None.
+
+            :param children_memo: member listings that are shared with other browser windows
+                that are refreshed in the same pass (see TreeModel.refreshTree).
+        """
+        logger.debug("Auto-refreshing")
+        if self._background_refresh:
+            return self._tree_model.prepareRefresh(is_expanded=self._is_expanded,
+                                                   children_memo=children_memo)
+        else:
+            self._tree_model.refreshTree(is_expanded=self._is_expanded,
+                                         children_memo=children_memo)
+            return None
+
+
+    @Slot(float)
+    def _on_refresh_finished(self, duration):
+        """ Reports the duration of a background refresh to the refresh scheduler.
+        """
+        get_refresh_scheduler().refresh_finished(self, duration)
+
+
+    def is_refreshing(self):
+        """ Returns True if a background refresh is still in progress.
+        """
+        return self._tree_model.isRefreshing()
+
+
+    def root_object(self):
+        """ Returns the object that is inspected.
+        """
+        return self._tree_model.inspectedItem.obj
+
+
+    def _is_expanded(self, source_index):
+        """ Returns True if the node at the index of the tree model is expanded in the tree view.
+            Nodes that are hidden by the proxy model are considered collapsed.
+        """
+        proxy_index = self._proxy_tree_model.mapFromSource(source_index)
+        return proxy_index.isValid() and self.obj_tree.isExpanded(proxy_index)
         
         
     def _add_instance(self):
@@ -166,14 +281,21 @@ class ObjectBrowser(QtWidgets.QMainWindow):
             QtWidgets.QAction("Show callable attributes", self, checkable=True,
                           shortcut = QtGui.QKeySequence("Alt+C"),
                           statusTip = "Shows/hides attributes that are callable (functions, methods, etc)")
-        self.toggle_callable_action.toggled.connect(self._proxy_tree_model.setShowCallables)
+        self.toggle_callable_action.toggled.connect(self._set_show_callables)
                               
         # Show/hide dunder attributes
         self.toggle_dunder_attribute_action = \
             QtWidgets.QAction("Show __dunder__ attributes", self, checkable=True,
                           shortcut = QtGui.QKeySequence("Alt+S"),
                           statusTip = "Shows or hides __dunder__ attributes")
-        self.toggle_dunder_attribute_action.toggled.connect(self._proxy_tree_model.setShowDunderAttributes)
+        self.toggle_dunder_attribute_action.toggled.connect(self._set_show_dunder_attributes)
+
+        # List only the instance state or all members
+        self.toggle_instance_state_action = \
+            QtWidgets.QAction("Instance state only", self, checkable=True,
+                          shortcut = QtGui.QKeySequence("Alt+I"),
+                          statusTip = "Only lists the attributes stored in the objects themselves")
+        self.toggle_instance_state_action.toggled.connect(self._set_instance_state_only)
 
         # Toggle auto-refresh on/off
         self.toggle_auto_refresh_action = \
@@ -187,6 +309,11 @@ class ObjectBrowser(QtWidgets.QMainWindow):
         self.refresh_action_f5 = QtWidgets.QAction(self, text="&Refresh2", shortcut="F5")
         self.refresh_action_f5.triggered.connect(self.refresh)
         self.addAction(self.refresh_action_f5) 
+
+        # Cancels fetching the children of nodes that are still loading.
+        self.cancel_fetch_action = QtWidgets.QAction(self, text="Cancel loading", shortcut="Esc")
+        self.cancel_fetch_action.triggered.connect(self.cancel_fetches)
+        self.addAction(self.cancel_fetch_action)
         
         # My test action.
         self.my_test_action = \
@@ -214,6 +341,7 @@ class ObjectBrowser(QtWidgets.QMainWindow):
         view_menu.addSeparator()
         view_menu.addAction(self.toggle_callable_action)
         view_menu.addAction(self.toggle_dunder_attribute_action)
+        view_menu.addAction(self.toggle_instance_state_action)
         
         self.menuBar().addSeparator()
         help_menu = self.menuBar().addMenu("&Help")
@@ -284,10 +412,45 @@ class ObjectBrowser(QtWidgets.QMainWindow):
         font.setFixedPitch(True)
         #font.setPointSize(14)
 
+        editor_widget = QtWidgets.QWidget()
+        editor_layout = QtWidgets.QVBoxLayout()
+        editor_layout.setContentsMargins(0, 0, 0, 0) # left top right bottom
+        editor_widget.setLayout(editor_layout)
+        group_layout.addWidget(editor_widget)
+
         self.editor = QtWidgets.QPlainTextEdit()
         self.editor.setReadOnly(True)
         self.editor.setFont(font)
-        group_layout.addWidget(self.editor)
+        editor_layout.addWidget(self.editor)
+
+        # Progress indicator, shown when computing the details takes long.
+        self.details_progress_widget = QtWidgets.QWidget()
+        progress_layout = QtWidgets.QHBoxLayout()
+        progress_layout.setContentsMargins(0, 0, 0, 0) # left top right bottom
+        self.details_progress_widget.setLayout(progress_layout)
+        self.details_progress_bar = QtWidgets.QProgressBar()
+        self.details_progress_bar.setRange(0, 0) # Busy indicator
+        self.details_progress_bar.setFormat('')
+        progress_layout.addWidget(self.details_progress_bar)
+        self.details_cancel_button = QtWidgets.QPushButton("Cancel")
+        progress_layout.addWidget(self.details_cancel_button)
+        self.details_progress_widget.hide()
+        editor_layout.addWidget(self.details_progress_widget)
+
+        # The details are computed in a worker thread. The selected item is only sent to the 
+        # worker after the selection has been unchanged for DETAILS_DEBOUNCE_MS milliseconds.
+        self._details_job = None
+        self._details_item = None
+        self._details_timer = QtCore.QTimer(self)
+        self._details_timer.setSingleShot(True)
+        self._details_timer.setInterval(DETAILS_DEBOUNCE_MS)
+        self._details_timer.timeout.connect(self._start_details_job)
+        self._details_progress_timer = QtCore.QTimer(self)
+        self._details_progress_timer.setSingleShot(True)
+        self._details_progress_timer.setInterval(DETAILS_PROGRESS_DELAY_MS)
+        self._details_progress_timer.timeout.connect(self.details_progress_widget.show)
+        self._detailsJobDone.connect(self._on_details_job_done)
+        self.details_cancel_button.clicked.connect(self.cancel_details)
         
         # Splitter parameters
         self.central_splitter.setCollapsible(0, False)
@@ -301,6 +464,9 @@ class ObjectBrowser(QtWidgets.QMainWindow):
         # See http://permalink.gmane.org/gmane.comp.lib.qt.pyside.devel/222
         selection_model = self.obj_tree.selectionModel() 
         selection_model.currentChanged.connect(self._update_details)
+        self.obj_tree.activated.connect(self._activate_item)
+        self.obj_tree.collapsed.connect(self._collapse_item)
+        self.obj_tree.expanded.connect(self._expand_item)
 
     # End of setup_methods
     
@@ -465,9 +631,10 @@ class ObjectBrowser(QtWidgets.QMainWindow):
     @Slot(QtCore.QModelIndex, QtCore.QModelIndex)
     def _update_details(self, current_index, _previous_index):
         """ Shows the object details in the editor given an index.
+            The details are computed when the selection hasn't changed for a short while.
         """
         tree_item = self._proxy_tree_model.treeItem(current_index)
-        self._update_details_for_item(tree_item)
+        self._update_details_for_item(tree_item, debounce=True)
 
         
     def _change_details_field(self, _button_id=None):
@@ -479,34 +646,181 @@ class ObjectBrowser(QtWidgets.QMainWindow):
         self._update_details_for_item(tree_item)
         
             
-    def _update_details_for_item(self, tree_item):
+    def _update_details_for_item(self, tree_item, debounce=False):
         """ Shows the object details in the editor given an tree_item
+
+            The details are computed in a worker thread. The results of previous requests that
+            are still running are discarded.
+
+            :param debounce: if True, the computation is started after DETAILS_DEBOUNCE_MS
+                milliseconds, unless another item is selected in the mean time.
         """
-        self.editor.setStyleSheet("color: black;")
-        try:
-            #obj = tree_item.obj
-            button_id = self.button_group.checkedId()
-            assert button_id >= 0, "No radio button selected. Please report this bug."
-            attr_details = self._attr_details[button_id]
-            data = attr_details.data_fn(tree_item)
-            self.editor.setPlainText(data)
-            self.editor.setWordWrapMode(attr_details.line_wrap)
-            
-        except Exception as ex:
-            self.editor.setStyleSheet("color: red;")
-            stack_trace = traceback.format_exc()
-            self.editor.setPlainText("{}\n\n{}".format(ex, stack_trace))
-            self.editor.setWordWrapMode(QtWidgets.QTextOption.WrapAtWordBoundaryOrAnywhere)
+        self._cancel_details_job()
+        self._details_item = tree_item
+        if tree_item.is_placeholder:
+            self._details_timer.stop()
+            self._details_item = None
+            self._set_details_text('')
+        elif debounce:
+            self._details_timer.start()
+        else:
+            self._details_timer.stop()
+            self._start_details_job()
+
+
+    def _start_details_job(self):
+        """ Starts computing the details of the selected item in a worker thread.
+        """
+        tree_item, self._details_item = self._details_item, None
+        if tree_item is None:
+            return
+
+        button_id = self.button_group.checkedId()
+        assert button_id >= 0, "No radio button selected. Please report this bug."
+        attr_details = self._attr_details[button_id]
+
+        self._details_job = _DETAILS_POOL.submit(
+            _compute_details, (attr_details.details_fn, tree_item), 
+            on_done=self._detailsJobDone.emit)
+        self._details_job.data = attr_details
+        self._details_progress_timer.start()
+
+
+    @Slot(object)
+    def _on_details_job_done(self, job):
+        """ Shows the details when they have been computed. Results of stale jobs are discarded.
+        """
+        if job is not self._details_job:
+            logger.debug("Discarding stale details job: {}".format(job))
+            return
+
+        self._hide_details_progress()
+        self._details_job = None
+        attr_details = job.data
+        data, stack_trace = job.result
+        if stack_trace is None:
+            self._set_details_text(data, line_wrap=attr_details.line_wrap)
+        else:
+            self._set_details_text("{}\n\n{}".format(data, stack_trace), is_error=True,
+                                   line_wrap=QtGui.QTextOption.WrapAtWordBoundaryOrAnywhere)
+
+
+    def _set_details_text(self, text, is_error=False, line_wrap=None):
+        """ Sets the text of the details editor.
+        """
+        self.editor.setStyleSheet("color: red;" if is_error else "color: black;")
+        self.editor.setPlainText(text)
+        if line_wrap is not None:
+            self.editor.setWordWrapMode(line_wrap)
+
+
+    def _hide_details_progress(self):
+        """ Hides the progress indicator of the details pane.
+        """
+        self._details_progress_timer.stop()
+        self.details_progress_widget.hide()
+
+
+    def _cancel_details_job(self):
+        """ Cancels computing the details. Its result will not be shown.
+        """
+        if self._details_job is not None:
+            self._details_job.cancel()
+            self._details_job = None
+        self._hide_details_progress()
+
+
+    def cancel_details(self):
+        """ Cancels computing the contents of the details pane.
+        """
+        self._details_timer.stop()
+        self._details_item = None
+        if self._details_job is not None:
+            self._cancel_details_job()
+            self._set_details_text("<cancelled>", is_error=True)
+
+    @Slot(QtCore.QModelIndex)
+    def _activate_item(self, proxy_index):
+        """ Fetches the next page of children when a '... N more' placeholder row is activated.
+            Evaluates the attribute again if it has timed out.
+        """
+        source_index = self._proxy_tree_model.mapToSource(proxy_index)
+        tree_item = self._tree_model.treeItem(source_index)
+        if tree_item.is_placeholder:
+            self._tree_model.fetchMore(source_index.parent())
+        elif is_unevaluated(tree_item.obj):
+            self._tree_model.evaluateItem(source_index)
+
+
+    @Slot(QtCore.QModelIndex)
+    def _collapse_item(self, proxy_index):
+        """ Cancels fetching the children of a node when it is collapsed.
+            The children may be removed later if there are many collapsed nodes.
+        """
+        source_index = self._proxy_tree_model.mapToSource(proxy_index)
+        self._tree_model.cancelFetch(source_index)
+        self._tree_model.itemCollapsed(source_index)
+
+
+    @Slot(bool)
+    def _set_show_callables(self, show_callables):
+        """ Shows or hides the attributes that are callable.
+            Hidden attributes are not fetched by the tree model.
+        """
+        self._tree_model.setAttributeFilter(show_callables,
+                                            self._proxy_tree_model.getShowDunderAttributes(),
+                                            is_expanded=self._is_expanded)
+        self._proxy_tree_model.setShowCallables(show_callables)
+
+
+    @Slot(bool)
+    def _set_show_dunder_attributes(self, show_dunder_attributes):
+        """ Shows or hides the __dunder__ attributes.
+            Hidden attributes are not fetched by the tree model.
+        """
+        self._tree_model.setAttributeFilter(self._proxy_tree_model.getShowCallables(),
+                                            show_dunder_attributes,
+                                            is_expanded=self._is_expanded)
+        self._proxy_tree_model.setShowDunderAttributes(show_dunder_attributes)
+
+
+    @Slot(bool)
+    def _set_instance_state_only(self, instance_state_only):
+        """ Lists only the attributes that are stored in the objects, or all members.
+        """
+        self._tree_model.setInstanceStateOnly(instance_state_only, is_expanded=self._is_expanded)
+
+
+    @Slot(QtCore.QModelIndex)
+    def _expand_item(self, proxy_index):
+        """ Brings the children of a node up to date if they were not refreshed while the node
+            was collapsed.
+        """
+        source_index = self._proxy_tree_model.mapToSource(proxy_index)
+        self._tree_model.itemExpanded(source_index)
+        self._tree_model.refreshStaleSubtree(source_index, is_expanded=self._is_expanded)
+
+
+    def cancel_fetches(self):
+        """ Cancels fetching the children of all nodes that are still loading.
+        """
+        n_cancelled = self._tree_model.cancelAllFetches()
+        logger.debug("Cancelled {} pending fetches".format(n_cancelled))
+
 
     def toggle_auto_refresh(self, checked):
         """ Toggles auto-refresh on/off.
+
+            The windows are refreshed by a scheduler that is shared by all windows. It doesn't
+            refresh windows that are hidden or minimized, and refreshes less often when 
+            refreshing takes too much time.
         """
         if checked:
             logger.info("Auto-refresh on. Rate {:g} seconds".format(self._refresh_rate))
-            self._refresh_timer.start()
+            get_refresh_scheduler().subscribe(self, self._refresh_rate)
         else:
             logger.info("Auto-refresh off")
-            self._refresh_timer.stop()
+            get_refresh_scheduler().unsubscribe(self)
         self._auto_refresh = checked        
 
 
@@ -530,15 +844,29 @@ class ObjectBrowser(QtWidgets.QMainWindow):
         """ Cleans up resources when this window is closed.
             Disconnects all signals for this window.
         """
-        self._refresh_timer.stop()
-        self._refresh_timer.timeout.disconnect(self.refresh)
-        self.toggle_callable_action.toggled.disconnect(self._proxy_tree_model.setShowCallables)
-        self.toggle_dunder_attribute_action.toggled.disconnect(self._proxy_tree_model.setShowDunderAttributes)
+        get_refresh_scheduler().unsubscribe(self)
+        self._details_timer.stop()
+        self._details_timer.timeout.disconnect(self._start_details_job)
+        self._cancel_details_job()
+        self._details_progress_timer.timeout.disconnect(self.details_progress_widget.show)
+        self._detailsJobDone.disconnect(self._on_details_job_done)
+        self.details_cancel_button.clicked.disconnect(self.cancel_details)
+        self._tree_model.cancelAllFetches()
+        self._tree_model.cancelEvaluations()
+        self._tree_model.cancelRefresh()
+        self._tree_model.refreshFinished.disconnect(self._on_refresh_finished)
+        self.cancel_fetch_action.triggered.disconnect(self.cancel_fetches)
+        self.toggle_callable_action.toggled.disconnect(self._set_show_callables)
+        self.toggle_dunder_attribute_action.toggled.disconnect(self._set_show_dunder_attributes)
+        self.toggle_instance_state_action.toggled.disconnect(self._set_instance_state_only)
         self.toggle_auto_refresh_action.toggled.disconnect(self.toggle_auto_refresh)
         self.refresh_action_f5.triggered.disconnect(self.refresh)
         self.button_group.buttonClicked[int].disconnect(self._change_details_field)
         selection_model = self.obj_tree.selectionModel() 
         selection_model.currentChanged.disconnect(self._update_details)
+        self.obj_tree.activated.disconnect(self._activate_item)
+        self.obj_tree.collapsed.disconnect(self._collapse_item)
+        self.obj_tree.expanded.disconnect(self._expand_item)
         
         
     def closeEvent(self, event):
@@ -0,0 +1,226 @@
+""" References from the tree items to the browsed objects that don't keep the objects alive.
+
+    Normally a tree item holds a strong reference to its object, so that a browser window that
+    is left open keeps every object that has been expanded alive. In the weak reference mode
+    (see TreeModel) the tree items hold weak references instead. Objects that don't support
+    weak references (e.g. lists, dicts and tuples) are kept alive by a StrongRefCache, which
+    holds a limited number of them. The least recently used objects are dropped first.
+
+    Numbers and None are always referenced strongly, they don't keep other objects alive. Bound
+    methods are created anew for every attribute lookup, so a weak reference to them would die
+    immediately. Instead the object they are bound to is referenced (weakly if possible), and
+    the method is bound again when it is dereferenced.
+
+    A reference returns COLLECTED_VALUE when its object is gone.
+"""
+from __future__ import absolute_import
+
+import logging, threading, types, weakref, six
+
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Default maximum number of objects that are kept alive by the StrongRefCache of a model.
+DEFAULT_STRONG_REF_CACHE_SIZE = 10000
+
+# Objects of these types are referenced strongly.
+_ATOMIC_TYPES = six.integer_types + (bool, float, complex)
+
+# Bound methods, which are created anew by each attribute lookup.
+_BOUND_METHOD_TYPES = (types.MethodType, types.BuiltinMethodType, type([].__add__))
+
+
+class CollectedValue(object):
+    """ Placeholder for an object that has been garbage collected.
+    """
+    def __repr__(self):
+        return "<collected>"
+
+    def __str__(self):
+        return "<collected>"
+
+
+# The object of a weak reference has been garbage collected.
+COLLECTED_VALUE = CollectedValue()
+
+
+def is_collected(obj):
+    """ Returns True if obj is the placeholder of an object that has been garbage collected.
+    """
+    return obj is COLLECTED_VALUE
+
+
+class _StrongRef(object):
+    """ Strong reference with the same interface as a weak reference.
+    """
+    __slots__ = ('obj', )
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __call__(self):
+        return self.obj
+
+
+class _CachedRef(object):
+    """ Reference to an object in a StrongRefCache. Returns COLLECTED_VALUE once the object
+        has been dropped from the cache.
+    """
+    __slots__ = ('cache', 'obj_id', 'token', 'released')
+
+    def __init__(self, cache, obj_id, token):
+        self.cache = cache
+        self.obj_id = obj_id
+        self.token = token      # Identifies the cache entry, the id may be reused later.
+        self.released = False
+
+    def __call__(self):
+        return self.cache.get(self)
+
+
+class _MethodRef(object):
+    """ Reference to a bound method. References the object that the method is bound to, and
+        binds the method again when called. Returns None if the object is gone.
+    """
+    __slots__ = ('self_ref', 'func', 'name')
+
+    def __init__(self, self_ref, func, name):
+        self.self_ref = self_ref
+        self.func = func        # The function of a Python method, None for builtin methods.
+        self.name = name
+
+    def __call__(self):
+        bound_to = dereference(self.self_ref)
+        if bound_to is COLLECTED_VALUE:
+            return None
+        if self.func is not None:
+            return types.MethodType(self.func, bound_to)
+        try:
+            return getattr(bound_to, self.name)
+        except Exception as ex:
+            logger.debug("Unable to bind method {!r} again: {}".format(self.name, ex))
+            return None
+
+
+class _CacheEntry(object):
+    """ An object in the StrongRefCache and the number of references to it.
+    """
+    __slots__ = ('obj', 'token', 'n_refs')
+
+    def __init__(self, obj):
+        self.obj = obj
+        self.token = object()
+        self.n_refs = 0
+
+
+class StrongRefCache(object):
+    """ Keeps a limited number of objects alive. The least recently used objects are dropped
+        first. Is thread safe, the tree items of a fetch job are created in a worker thread.
+
+        An object is stored once, no matter how many references to it are made, so that e.g.
+        the items of a list and of its bound methods take up only one place in the cache. The
+        object is dropped when all its references have been released.
+    """
+    def __init__(self, max_size=DEFAULT_STRONG_REF_CACHE_SIZE):
+        """ Constructor
+
+            :param max_size: maximum number of objects that are kept alive.
+        """
+        assert max_size > 0, "max_size must be > 0. Got: {}".format(max_size)
+        self.max_size = max_size
+        self._entries = OrderedDict()  # id(obj) -> _CacheEntry
+        self._lock = threading.Lock()
+
+
+    def __len__(self):
+        return len(self._entries)
+
+
+    def add(self, obj):
+        """ Keeps the object alive for now. Returns a _CachedRef to the object.
+        """
+        obj_id = id(obj)
+        with self._lock:
+            entry = self._entries.pop(obj_id, None)
+            if entry is None or entry.obj is not obj:
+                entry = _CacheEntry(obj)
+            entry.n_refs += 1
+            self._entries[obj_id] = entry # At the end; it's the most recently used now.
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return _CachedRef(self, obj_id, entry.token)
+
+
+    def get(self, ref):
+        """ Returns the object of the reference or COLLECTED_VALUE if it has been dropped.
+        """
+        with self._lock:
+            entry = self._entries.get(ref.obj_id)
+            if entry is None or entry.token is not ref.token:
+                return COLLECTED_VALUE
+            self._entries.pop(ref.obj_id)
+            self._entries[ref.obj_id] = entry # Move to the end; it's the most recently used now.
+            return entry.obj
+
+
+    def discard(self, ref):
+        """ Releases the reference. Drops its object if it has no other references. Does
+            nothing if the reference was already released.
+        """
+        with self._lock:
+            if ref.released:
+                return
+            ref.released = True
+            entry = self._entries.get(ref.obj_id)
+            if entry is not None and entry.token is ref.token:
+                entry.n_refs -= 1
+                if entry.n_refs <= 0:
+                    del self._entries[ref.obj_id]
+
+
+    def clear(self):
+        """ Drops all objects.
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+
+def make_ref(obj, strong_refs):
+    """ Returns a reference to obj, which returns obj when called, or COLLECTED_VALUE if the
+        object has been garbage collected.
+
+        :param strong_refs: the StrongRefCache that keeps the objects alive that don't support
+            weak references.
+    """
+    if obj is None or type(obj) in _ATOMIC_TYPES or obj is COLLECTED_VALUE:
+        return _StrongRef(obj)
+    if type(obj) in _BOUND_METHOD_TYPES:
+        bound_to = getattr(obj, '__self__', None)
+        if bound_to is None or isinstance(bound_to, types.ModuleType):
+            # Builtin functions, these don't keep other objects alive.
+            return _StrongRef(obj)
+        return _MethodRef(make_ref(bound_to, strong_refs), getattr(obj, '__func__', None),
+                          getattr(obj, '__name__', None))
+    try:
+        return weakref.ref(obj)
+    except TypeError:
+        return strong_refs.add(obj)
+
+
+def dereference(ref):
+    """ Returns the object of a reference that was made by make_ref.
+    """
+    obj = ref()
+    return COLLECTED_VALUE if obj is None and type(ref) is not _StrongRef else obj
+
+
+def release_ref(ref):
+    """ Drops the object of a reference from its StrongRefCache, if it is held there and has
+        no other references.
+    """
+    if type(ref) is _MethodRef:
+        ref = ref.self_ref
+    if type(ref) is _CachedRef:
+        ref.cache.discard(ref)
@@ -0,0 +1,230 @@
+""" Central scheduler for the auto-refresh of all object browser windows.
+
+    Instead of a timer per window, a single timer checks which windows are due for a refresh.
+    Windows that are hidden or minimized are skipped until they are visible again. Windows
+    that inspect the same root object are refreshed together, in the same pass, so that they
+    can share the listing of the object members (see TreeModel.refreshTree). The first phases
+    of their background refreshes are executed one after another by a single worker job, so
+    that each object is listed only once.
+
+    The duration of each pass is measured, including the time that background refreshes spend
+    in the worker thread and in the GUI thread. If refreshing takes more than a fraction
+    (cpu_budget) of the refresh interval, the interval of the windows involved is increased
+    until the budget is met again.
+"""
+from __future__ import absolute_import
+
+import logging, time
+
+from qtpy import QtCore
+
+from objbrowser.workers import WorkerPool
+
+logger = logging.getLogger(__name__)
+
+# Number of milliseconds between checking which windows must be refreshed.
+SCHEDULER_TICK_MS = 100
+
+# Maximum fraction of the time that may be spent on refreshing.
+DEFAULT_CPU_BUDGET = 0.2
+
+# Weight of the last measured duration in the moving average of the refresh duration.
+_DURATION_SMOOTHING = 0.5
+
+_SCHEDULER = None
+
+# Executes the first phases of the background refreshes, one root object group at a time.
+_REFRESH_POOL = WorkerPool(max_threads=1, name='refresh')
+
+
+class _Subscription(object):
+    """ Refresh bookkeeping of a single browser window.
+    """
+    def __init__(self, browser, refresh_rate):
+        self.browser = browser
+        self.refresh_rate = refresh_rate  # Requested number of seconds between refreshes.
+        self.interval = refresh_rate      # Actual interval, may be longer due to the budget.
+        self.duration = 0.0               # Moving average of the refresh duration (seconds).
+        self.next_due = time.time() + refresh_rate
+        self.group = None                 # The _GroupRefresh in progress, if any.
+
+
+class _GroupRefresh(object):
+    """ Bookkeeping of the refresh of a group of windows that inspect the same object.
+    """
+    def __init__(self, subscriptions):
+        self.subscriptions = subscriptions
+        self.pending = set()  # Subscriptions of which the background refresh is in progress.
+        self.duration = 0.0   # Total number of seconds spent on the refreshes so far.
+
+
+
+class RefreshScheduler(QtCore.QObject):
+    """ Periodically refreshes the browser windows that have auto-refresh enabled.
+
+        The browsers must have a root_object() method, which returns the inspected object, an
+        auto_refresh(children_memo) method, which refreshes the window, and an is_refreshing()
+        method. Windows of which a background refresh is still in progress are skipped.
+
+        The auto_refresh method either refreshes the window and returns None, or prepares a
+        background refresh and returns the Job of its first phase (see
+        TreeModel.prepareRefresh). The scheduler then executes the job in a worker thread and
+        the browser must call refresh_finished(browser, duration) when the refresh is done.
+    """
+    def __init__(self, cpu_budget=DEFAULT_CPU_BUDGET, parent=None):
+        """ Constructor
+
+            :param cpu_budget: maximum fraction of the time that is spent on refreshing. If the
+                refreshes take longer, the refresh intervals are increased.
+            :param parent: the parent QObject
+        """
+        super(RefreshScheduler, self).__init__(parent)
+        assert 0 < cpu_budget <= 1, "cpu_budget must be in (0, 1]. Got: {}".format(cpu_budget)
+        self.cpu_budget = cpu_budget
+        self._subscriptions = []
+        self._timer = QtCore.QTimer(self)
+        self._timer.setInterval(SCHEDULER_TICK_MS)
+        self._timer.timeout.connect(self._on_tick)
+
+
+    def subscribe(self, browser, refresh_rate):
+        """ Refreshes the browser every refresh_rate seconds (or less often if the CPU budget is
+            exceeded). If the browser was already subscribed, its refresh rate is updated.
+        """
+        assert refresh_rate > 0, "refresh_rate must be > 0. Got: {}".format(refresh_rate)
+        self.unsubscribe(browser)
+        self._subscriptions.append(_Subscription(browser, refresh_rate))
+        if not self._timer.isActive():
+            self._timer.start()
+
+
+    def unsubscribe(self, browser):
+        """ Stops refreshing the browser. Does nothing if the browser wasn't subscribed.
+        """
+        for sub in self._subscriptions:
+            if sub.browser is browser and sub.group is not None:
+                self._remove_pending(sub)
+        self._subscriptions = [sub for sub in self._subscriptions if sub.browser is not browser]
+        if not self._subscriptions:
+            self._timer.stop()
+
+
+    def is_subscribed(self, browser):
+        """ Returns True if the browser is refreshed by the scheduler.
+        """
+        return any(sub.browser is browser for sub in self._subscriptions)
+
+
+    def refresh_interval(self, browser):
+        """ Returns the current number of seconds between the refreshes of the browser, which
+            may be longer than its refresh rate. Returns None if the browser isn't subscribed.
+        """
+        for sub in self._subscriptions:
+            if sub.browser is browser:
+                return sub.interval
+        return None
+
+
+    @staticmethod
+    def _can_refresh(browser):
+        """ Returns True if the browser window is shown, not minimized and not still refreshing.
+        """
+        return (browser.isVisible() and not browser.isMinimized() and 
+                not browser.is_refreshing())
+
+
+    def _on_tick(self):
+        """ Refreshes the visible windows that are due, grouped by their root object.
+        """
+        now = time.time()
+        groups = {} # id(root object) -> list of subscriptions
+        for sub in self._subscriptions:
+            if now >= sub.next_due and self._can_refresh(sub.browser):
+                groups.setdefault(id(sub.browser.root_object()), []).append(sub)
+
+        for group in groups.values():
+            # Also refresh the other visible windows on the same object, even if not yet due.
+            for sub in self._subscriptions:
+                if (sub not in group and self._can_refresh(sub.browser) and
+                        sub.browser.root_object() is group[0].browser.root_object()):
+                    group.append(sub)
+            self._refresh_group(group)
+
+
+    def refresh_finished(self, browser, duration):
+        """ Should be called when a background refresh, of which the job was returned by
+            auto_refresh, is done or cancelled.
+
+            :param duration: number of seconds spent on the refresh in the worker thread and in
+                the GUI thread.
+        """
+        for sub in self._subscriptions:
+            if sub.browser is browser and sub.group is not None:
+                sub.group.duration += duration
+                self._remove_pending(sub)
+
+
+    def _refresh_group(self, subscriptions):
+        """ Refreshes the windows of a group in one pass, sharing the member listings.
+        """
+        group = _GroupRefresh(subscriptions)
+        children_memo = {}
+        jobs = []
+        for sub in subscriptions:
+            sub.next_due = float('inf') # Until the refresh of the whole group is done.
+            start_time = time.time()
+            job = sub.browser.auto_refresh(children_memo=children_memo)
+            group.duration += time.time() - start_time
+            if job is not None:
+                sub.group = group
+                group.pending.add(sub)
+                jobs.append(job)
+
+        if jobs:
+            _REFRESH_POOL.submit(_run_jobs, (jobs, ))
+        else:
+            self._group_finished(group)
+
+
+    def _remove_pending(self, sub):
+        """ Removes a subscription from the pending refreshes of its group. Finishes the group
+            if it was the last one.
+        """
+        group, sub.group = sub.group, None
+        group.pending.discard(sub)
+        if not group.pending:
+            self._group_finished(group)
+
+
+    def _group_finished(self, group):
+        """ Schedules the next refresh of the windows of a group, backing off if the refresh
+            took more than the CPU budget.
+        """
+        end_time = time.time()
+        for sub in group.subscriptions:
+            sub.duration = (_DURATION_SMOOTHING * group.duration +
+                            (1 - _DURATION_SMOOTHING) * sub.duration)
+            sub.interval = max(sub.refresh_rate, sub.duration / self.cpu_budget)
+            sub.next_due = end_time + sub.interval
+            if sub.interval > sub.refresh_rate:
+                logger.debug("Refresh took {:.3f} sec. Backing off to {:.1f} sec intervals"
+                             .format(group.duration, sub.interval))
+
+
+
+def _run_jobs(jobs):
+    """ Executes the jobs one after another. Is executed in a worker thread.
+    """
+    for job in jobs:
+        job.run()
+
+
+
+def get_refresh_scheduler():
+    """ Returns the refresh scheduler that is shared by all browser windows.
+        It is created on the first call, which must be after the QApplication is created.
+    """
+    global _SCHEDULER
+    if _SCHEDULER is None:
+        _SCHEDULER = RefreshScheduler()
+    return _SCHEDULER
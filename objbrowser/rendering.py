@@ -0,0 +1,311 @@
+""" Functions that render objects as text for the table cells, with a bounded cost.
+
+    A table cell shows about a hundred characters, but repr() and str() render the complete
+    object. For large containers and NumPy arrays this can take seconds and create strings of
+    several megabytes that are then cut off. The functions in this module stop rendering when
+    the text exceeds a maximum length, similar to the reprlib module from the standard library.
+
+    Containers are rendered element by element, up to a maximum number of elements per
+    container. Subclasses of the builtin containers that don't override __repr__ are rendered
+    like their base class. Other mappings, sets and sequences, e.g. OrderedDict, Counter and
+    UserList, are rendered as their type name followed by their elements. Of NumPy arrays only
+    the first and last elements are rendered. Other objects are rendered with their own
+    __repr__ or __str__ method and then truncated.
+"""
+from __future__ import absolute_import
+
+import logging, pprint, types, array, six
+
+from collections import deque, defaultdict
+from itertools import islice
+from six.moves import reprlib
+
+try:
+    from collections.abc import Mapping, MappingView, Sequence, Set
+except ImportError:
+    from collections import Mapping, MappingView, Sequence, Set
+
+from objbrowser.ndarray_children import is_ndarray
+
+try:
+    import numpy as np
+except ImportError:
+    pass
+
+logger = logging.getLogger(__name__)
+
+# Default maximum number of characters of the text in a table cell.
+MAX_CELL_LEN = 250
+
+# Objects that contain more elements, at all depths together, are not pretty printed in the
+# table, see bounded_pformat.
+PFORMAT_MAX_ITEMS = 100
+
+# Number of elements at the beginning and end of each dimension rendered for large arrays.
+ARRAY_EDGE_ITEMS = 3
+
+# Maximum length of the repr that is part of the fingerprint of a value.
+FINGERPRINT_REPR_LEN = MAX_CELL_LEN
+
+ELLIPSIS = '...'
+
+# Bound methods are created anew by each attribute lookup, so their identity isn't stable.
+_BOUND_METHOD_TYPES = (types.MethodType, types.BuiltinMethodType, type([].__add__))
+
+# Sequences of which the repr doesn't list their elements, or that are rendered as text.
+_NON_CONTAINER_SEQUENCES = six.string_types + (six.text_type, six.binary_type, bytearray,
+                                               memoryview, type(six.moves.range(0)))
+
+_TEXT_TYPES = six.string_types + (six.text_type, six.binary_type, bytearray)
+
+_PRETTY_PRINTER = pprint.PrettyPrinter(indent=4)
+
+
+def cut_off(text, max_len):
+    """ Returns the text, or its first max_len characters followed by an ellipsis if it is
+        longer than max_len.
+    """
+    if max_len is not None and len(text) > max_len:
+        return text[:max_len] + ELLIPSIS
+    else:
+        return text
+
+
+class BoundedRepr(reprlib.Repr):
+    """ Like reprlib.Repr but with limits derived from the maximum length of the text.
+
+        Contrary to reprlib.Repr, the elements of dictionaries and sets are not sorted, which
+        would take O(n log n) time. They are rendered in iteration order, like repr() does.
+    """
+    def __init__(self, max_len=MAX_CELL_LEN):
+        """ Constructor
+
+            :param max_len: maximum length of the text. Also determines the maximum number of
+                elements that are rendered per container.
+        """
+        reprlib.Repr.__init__(self)
+        max_items = max(4, max_len // 4)
+        self.maxlevel = 4
+        self.maxtuple = self.maxlist = self.maxarray = self.maxdeque = max_items
+        self.maxset = self.maxfrozenset = max_items
+        self.maxdict = max(2, max_items // 2)
+        self.maxstring = max_len
+        self.maxlong = max_len
+        self.maxother = max_len
+
+        # Builtin containers and their render methods. Used for subclasses.
+        self._container_methods = [
+            (list, self.repr_list), (tuple, self.repr_tuple), (dict, self.repr_dict),
+            (set, self.repr_set), (frozenset, self.repr_frozenset), (deque, self.repr_deque),
+            (array.array, self.repr_array)]
+
+
+    def repr1(self, x, level):
+        """ Renders an object, dispatching on its type.
+        """
+        if is_ndarray(x):
+            return self.repr_ndarray(x, level)
+
+        for container_type, repr_method in self._container_methods:
+            if isinstance(x, container_type) and type(x).__repr__ is container_type.__repr__:
+                return repr_method(x, level)
+
+        if isinstance(x, MappingView):
+            return self.repr_mapping_view(x, level)
+        if isinstance(x, Mapping):
+            return self.repr_mapping(x, level)
+        if isinstance(x, Set):
+            return self.repr_abstract_set(x, level)
+        if isinstance(x, Sequence) and not isinstance(x, _NON_CONTAINER_SEQUENCES):
+            return self.repr_sequence(x, level)
+
+        return reprlib.Repr.repr1(self, x, level)
+
+
+    def repr_mapping(self, x, level):
+        """ Renders a mapping as its type name followed by the items, e.g. OrderedDict({1: 2}).
+            The default factory of a defaultdict is rendered as well.
+        """
+        type_name = type(x).__name__
+        if isinstance(x, defaultdict):
+            return '{}({}, {})'.format(type_name, self.repr1(x.default_factory, level - 1),
+                                       self.repr_dict(x, level))
+        if len(x) == 0:
+            return '{}()'.format(type_name)
+        return '{}({})'.format(type_name, self.repr_dict(x, level))
+
+
+    def repr_abstract_set(self, x, level):
+        """ Renders a set as its type name followed by the elements, e.g. MySet({1, 2}).
+        """
+        type_name = type(x).__name__
+        if len(x) == 0:
+            return '{}()'.format(type_name)
+        return '{}({})'.format(type_name,
+                               self._repr_iterable(x, level, '{', '}', self.maxset))
+
+
+    def repr_sequence(self, x, level):
+        """ Renders a sequence as its type name followed by the elements, e.g. UserList([1, 2]).
+            Named tuples are rendered with their field names.
+        """
+        type_name = type(x).__name__
+        fields = getattr(x, '_fields', None)
+        if isinstance(x, tuple) and isinstance(fields, tuple):
+            if level <= 0:
+                return '{}({})'.format(type_name, self.fillvalue)
+            pieces = ['{}={}'.format(field, self.repr1(value, level - 1))
+                      for field, value in islice(zip(fields, x), self.maxtuple)]
+            if len(x) > self.maxtuple:
+                pieces.append(self.fillvalue)
+            return '{}({})'.format(type_name, ', '.join(pieces))
+        return '{}({})'.format(type_name, self._repr_iterable(x, level, '[', ']', self.maxlist))
+
+
+    def repr_mapping_view(self, x, level):
+        """ Renders the keys, values or items view of a mapping, e.g. dict_keys([1, 2]).
+        """
+        return '{}({})'.format(type(x).__name__,
+                               self._repr_iterable(x, level, '[', ']', self.maxlist))
+
+
+    def repr_dict(self, x, level):
+        """ Renders a dictionary without sorting the keys.
+        """
+        n = len(x)
+        if n == 0:
+            return '{}'
+        if level <= 0:
+            return '{' + self.fillvalue + '}'
+        pieces = []
+        for key, value in islice(six.iteritems(x), self.maxdict):
+            pieces.append('{}: {}'.format(self.repr1(key, level - 1),
+                                          self.repr1(value, level - 1)))
+        if n > self.maxdict:
+            pieces.append(self.fillvalue)
+        return '{' + ', '.join(pieces) + '}'
+
+
+    def repr_set(self, x, level):
+        """ Renders a set without sorting the elements.
+        """
+        if not x:
+            return 'set()'
+        return self._repr_iterable(x, level, '{', '}', self.maxset)
+
+
+    def repr_frozenset(self, x, level):
+        """ Renders a frozenset without sorting the elements.
+        """
+        if not x:
+            return 'frozenset()'
+        return self._repr_iterable(x, level, 'frozenset({', '})', self.maxfrozenset)
+
+
+    def repr_bytes(self, x, _level):
+        """ Renders bytes. Only the first maxstring bytes are rendered.
+        """
+        if len(x) > self.maxstring:
+            return repr(x[:self.maxstring]) + self.fillvalue
+        else:
+            return repr(x)
+
+
+    def repr_ndarray(self, arr, _level):
+        """ Renders a NumPy array. Only the edges of large arrays are rendered.
+        """
+        text = np.array2string(arr, separator=', ', prefix='array(',
+                               threshold=self.maxarray, edgeitems=ARRAY_EDGE_ITEMS)
+        if arr.dtype.type in (np.float64, np.int_, np.bool_, np.complex128):
+            return 'array({})'.format(text)
+        else:
+            return 'array({}, dtype={})'.format(text, arr.dtype)
+
+
+
+def bounded_repr(obj, max_len=MAX_CELL_LEN):
+    """ Returns repr(obj), or an abbreviation of it, with at most max_len (+ ellipsis) characters.
+    """
+    return cut_off(BoundedRepr(max_len).repr(obj), max_len)
+
+
+def bounded_str(obj, max_len=MAX_CELL_LEN, text_type=str):
+    """ Returns str(obj), or an abbreviation of it, with at most max_len (+ ellipsis) characters.
+
+        :param text_type: the function that converts the object to text, e.g. six.text_type.
+    """
+    if isinstance(obj, six.string_types + (six.text_type, )):
+        return cut_off(text_type(obj[:max_len + 1]), max_len)
+    elif isinstance(obj, six.binary_type):
+        return bounded_repr(obj, max_len) # In Python 3 str(bytes) equals repr(bytes)
+    elif is_ndarray(obj):
+        return cut_off(np.array2string(obj, threshold=max(4, max_len // 4),
+                                       edgeitems=ARRAY_EDGE_ITEMS), max_len)
+    elif type(obj).__str__ is object.__str__:
+        # str() calls repr(), which is the case for the builtin containers.
+        return bounded_repr(obj, max_len)
+    else:
+        return cut_off(text_type(obj), max_len)
+
+
+def bounded_pformat(obj, max_len=MAX_CELL_LEN):
+    """ Returns the pretty printed representation of the object, or the bounded repr if the
+        object is an array, or if pretty printing it is expensive (see _exceeds_pformat_budget).
+    """
+    if is_ndarray(obj) or _exceeds_pformat_budget(obj, max_len):
+        return bounded_repr(obj, max_len)
+
+    return cut_off(_PRETTY_PRINTER.pformat(obj), max_len)
+
+
+def _exceeds_pformat_budget(obj, max_len):
+    """ Returns True if the object and the containers in it have more than PFORMAT_MAX_ITEMS
+        elements in total, or if it contains a string that is longer than max_len.
+
+        The elements are visited until the budget is exceeded, so that this is cheap for large
+        objects as well. Returns True if the elements can't be visited.
+    """
+    n_items = 0
+    stack = [obj]
+    try:
+        while stack:
+            obj = stack.pop()
+            if isinstance(obj, _TEXT_TYPES):
+                if len(obj) > max_len:
+                    return True
+            elif is_ndarray(obj):
+                n_items += obj.size
+            elif isinstance(obj, (Mapping, Set, Sequence, MappingView)) and \
+                    not isinstance(obj, _NON_CONTAINER_SEQUENCES):
+                n_items += len(obj)
+                if n_items > PFORMAT_MAX_ITEMS:
+                    return True
+                if isinstance(obj, Mapping):
+                    for key, value in obj.items():
+                        stack.append(key)
+                        stack.append(value)
+                else:
+                    stack.extend(obj)
+            if n_items > PFORMAT_MAX_ITEMS:
+                return True
+    except Exception as ex:
+        logger.debug("Unable to determine the size of {}: {}".format(type(obj), ex))
+        return True
+    return False
+
+
+def value_fingerprint(obj):
+    """ Returns a cheap fingerprint of the object that changes if its rendered cells change.
+
+        The fingerprint consists of the identity, type and length of the object, and the hash
+        of its bounded repr. Changes beyond the first FINGERPRINT_REPR_LEN characters of the repr
+        that don't change the length are therefore not detected. Bound methods are identified
+        by their name and the object they are bound to.
+    """
+    if type(obj) in _BOUND_METHOD_TYPES:
+        return (type(obj), id(getattr(obj, '__self__', None)), getattr(obj, '__name__', None))
+    try:
+        length = len(obj)
+    except Exception:
+        length = None
+    return (id(obj), type(obj), length, hash(bounded_repr(obj, FINGERPRINT_REPR_LEN)))
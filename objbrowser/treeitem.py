@@ -8,93 +8,594 @@
 import logging
 logger = logging.getLogger(__name__)
 
+from collections import OrderedDict
+
 from objbrowser.utils import cut_off_str
+from objbrowser.objrefs import make_ref, dereference, release_ref
 
 # Maximum number of characters used in the __str__ method to represent the underlying object
 MAX_OBJ_STR_LEN = 50
 
 
+# Formats of the object path of a child, given the path of the parent and the child's name
+PATH_ATTRIBUTE = '{}.{}'      # obj.attr
+PATH_ITEM = '{}[{!r}]'        # obj['key']
+PATH_INDEX = '{}[{}]'         # obj[3]
+PATH_SET_ELEMENT = '{}.pop()' # obj.pop()
+PATH_SLICE = '{}{}'           # obj[1000:2000], the name includes the brackets
+
+# Bits of TreeItem.flags. They are determined when the object or name of the item is set, so
+# that filtering and styling the rows doesn't have to inspect the objects.
+ITEM_ATTRIBUTE = 1  # The object is an attribute of the parent object.
+ITEM_DUNDER = 2     # The object is an attribute with a __dunder__ name.
+ITEM_CALLABLE = 4   # The object is callable.
+
+
 def name_is_dunder(method_name):
     "Returns true if the method name starts and ends with two underscores"
     return method_name.startswith('__') and method_name.endswith('__') 
 
 
 
+# Other bits of TreeItem._bits. The bits from _ROW_SHIFT onwards hold the row number.
+_CLASSIFICATION_MASK = ITEM_ATTRIBUTE | ITEM_DUNDER | ITEM_CALLABLE
+_ATTRIBUTE_UNKNOWN = 8    # is_attribute is None (the root items).
+_HAS_CHILDREN = 16
+_CHILDREN_FETCHED = 32
+_CHILDREN_STALE = 64
+_HAS_ROW = 128            # The item has a row number (it's part of a tree).
+_VIRTUAL_ROW = 256        # The row number is the row of a virtual child.
+_PATH_FORMAT_SHIFT = 9    # Three bits with the position of the path format in _PATH_FORMATS.
+_PATH_FORMAT_MASK = 7 << _PATH_FORMAT_SHIFT
+_ROW_SHIFT = 12
+_STATE_MASK = (1 << _ROW_SHIFT) - 1
+
+# The path formats that are stored as a number in the bits. Other formats are stored in the
+# _ItemState, which is marked by _CUSTOM_PATH_FORMAT.
+_PATH_FORMATS = (None, PATH_ATTRIBUTE, PATH_ITEM, PATH_INDEX, PATH_SET_ELEMENT, PATH_SLICE)
+_PATH_FORMAT_NUMBERS = {path_format: nr for nr, path_format in enumerate(_PATH_FORMATS)}
+_CUSTOM_PATH_FORMAT = 7
+
+
+class _ItemState(object):
+    """ The attributes that most tree items don't need: the children and their fetch state,
+        the fingerprint of the rendered cells and the cached object path. Is only allocated
+        when one of them is set.
+    """
+    __slots__ = ('child_items', 'pending_children', 'n_pending_children', 'fetch_job',
+                 'n_virtual_children', 'virtual_children', 'fingerprint', 'obj_path',
+                 'path_format')
+
+    def __init__(self):
+        self.child_items = None
+        self.pending_children = None
+        self.n_pending_children = 0
+        self.fetch_job = None
+        self.n_virtual_children = 0
+        self.virtual_children = None
+        self.fingerprint = None
+        self.obj_path = None
+        self.path_format = None
+
+
+def _state_property(attr_name, default, doc):
+    """ Returns a property that stores its value in the _ItemState of the item. The state
+        is not allocated if the default is assigned.
+    """
+    def get_value(self):
+        state = self._state
+        return default if state is None else getattr(state, attr_name)
+
+    def set_value(self, value):
+        state = self._state
+        if state is None:
+            if value is default:
+                return
+            state = self._state = _ItemState()
+        setattr(state, attr_name, value)
+
+    return property(get_value, set_value, doc=doc)
+
+
+def _bit_property(bit, doc):
+    """ Returns a property that stores a boolean in a bit of TreeItem._bits.
+    """
+    def get_value(self):
+        return bool(self._bits & bit)
+
+    def set_value(self, value):
+        if value:
+            self._bits |= bit
+        else:
+            self._bits &= ~bit
+
+    return property(get_value, set_value, doc=doc)
+
+
+
 class TreeItem(object):
     """ Tree node class that can be used to build trees of objects.
+
+        Trees can have millions of nodes, so the nodes are kept small. Only the parent, object
+        and name have their own slot. The booleans, the classification flags, the path format
+        and the row number are packed into a single integer. The children, their fetch state,
+        the fingerprint and the cached object path are stored in an _ItemState that is only
+        allocated for items that have children or that have been rendered. The model reads the
+        packed bits directly where it is called for every row, e.g. in hasChildren.
+        The name is converted to a string when needed.
+        The object path is not stored but built from the path of the parent and the path_format
+        when requested. Set cache_obj_path to True to store it once it has been built.
+
+        Each child stores its position in the child list of its parent, so that row() is O(1).
+        The positions are updated when children are inserted or removed.
+
+        The classification of the item (attribute, dunder, callable) is stored as a bit field in
+        flags. Use set_obj and set_name to change the object or name so that it's kept up to date.
     """
-    def __init__(self, obj, name, obj_path, is_attribute, parent=None):
+    __slots__ = ('parent_item', 'obj', 'name', '_bits', '_state')
+
+    is_placeholder = False
+    cache_obj_path = False
+
+    def __init__(self, obj, name, path_format, is_attribute, parent=None):
+        """ Constructor
+
+            :param obj: the underlying Python object
+            :param name: the name (e.g. the dictionary key) of the object. Is converted to
+                a string when it is displayed.
+            :param path_format: format of the object path given the path of the parent and the
+                name (one of the PATH_* constants). If None, the path is the name.
+            :param is_attribute: True if the object is an attribute of the parent object.
+        """
         self.parent_item = parent
         self.obj = obj
-        self.obj_name = str(name)
-        self.obj_path = str(obj_path)
-        self.is_attribute = is_attribute
-        self.child_items = []
-        self.has_children = True
-        self.children_fetched = False
+        self.name = name
+        self._state = None
+        path_format_nr = _PATH_FORMAT_NUMBERS.get(path_format, _CUSTOM_PATH_FORMAT)
+        bits = _HAS_CHILDREN | (path_format_nr << _PATH_FORMAT_SHIFT)
+        if is_attribute is None:
+            bits |= _ATTRIBUTE_UNKNOWN
+        elif is_attribute:
+            bits |= ITEM_ATTRIBUTE
+            if name_is_dunder(self.obj_name):
+                bits |= ITEM_DUNDER
+        if callable(obj):
+            bits |= ITEM_CALLABLE
+        self._bits = bits
+        if path_format_nr == _CUSTOM_PATH_FORMAT:
+            self.path_format = path_format
 
 
     def __str__(self):
-        n_children = len(self.child_items)
+        n_children = self.child_count()
         if n_children == 0:
             return "<TreeItem(0x{:x}): {} = {}>" \
                 .format(id(self.obj), self.obj_path, cut_off_str(self.obj, MAX_OBJ_STR_LEN))
         else:
             return "<TreeItem(0x{:x}): {} ({:d} children)>" \
-                .format(id(self.obj), self.obj_path, len(self.child_items))
+                .format(id(self.obj), self.obj_path, n_children)
 
 
     def __repr__(self):
-        n_children = len(self.child_items)
+        n_children = self.child_count()
         return "<TreeItem(0x{:x}): {} ({:d} children)>" \
             .format(id(self.obj), self.obj_path, n_children)
+
+    has_children = _bit_property(_HAS_CHILDREN, "False if the item can't have children.")
+    children_fetched = _bit_property(_CHILDREN_FETCHED, "True if the children have been fetched.")
+    children_stale = _bit_property(
+        _CHILDREN_STALE, "True if the children were skipped by the last refresh.")
+
+    pending_children = _state_property(
+        'pending_children', None, "Iterator over children that are not yet fetched.")
+    n_pending_children = _state_property(
+        'n_pending_children', 0, "Number of children that are not yet fetched.")
+    fetch_job = _state_property(
+        'fetch_job', None, "Job that fetches the children in a worker thread.")
+    # Virtual children precede the child_items. They are created on demand.
+    n_virtual_children = _state_property(
+        'n_virtual_children', 0, "Number of virtual children that have been added as rows.")
+    virtual_children = _state_property(
+        'virtual_children', None, "VirtualChildren object")
+    fingerprint = _state_property(
+        'fingerprint', None, "Fingerprint of obj when its cells were rendered.")
+
+    @property
+    def is_attribute(self):
+        " True if the object is an attribute of the parent object. None for the root items."
+        bits = self._bits
+        return None if bits & _ATTRIBUTE_UNKNOWN else bool(bits & ITEM_ATTRIBUTE)
+
+    @property
+    def flags(self):
+        " The ITEM_* classification bits."
+        return self._bits & _CLASSIFICATION_MASK
+
+    @property
+    def path_format(self):
+        " Format of the object path given the path of the parent and the name."
+        nr = (self._bits & _PATH_FORMAT_MASK) >> _PATH_FORMAT_SHIFT
+        return self._state.path_format if nr == _CUSTOM_PATH_FORMAT else _PATH_FORMATS[nr]
+
+    @path_format.setter
+    def path_format(self, path_format):
+        nr = _PATH_FORMAT_NUMBERS.get(path_format, _CUSTOM_PATH_FORMAT)
+        if nr == _CUSTOM_PATH_FORMAT:
+            if self._state is None:
+                self._state = _ItemState()
+            self._state.path_format = path_format
+        self._bits = (self._bits & ~_PATH_FORMAT_MASK) | (nr << _PATH_FORMAT_SHIFT)
+
+    @property
+    def virtual_row(self):
+        " Row number if this item is a virtual child."
+        bits = self._bits
+        return bits >> _ROW_SHIFT if bits & _VIRTUAL_ROW else None
+
+    @virtual_row.setter
+    def virtual_row(self, row):
+        self._set_row(row, _VIRTUAL_ROW)
+
+    @property
+    def child_row(self):
+        " Position in the child_items of the parent."
+        bits = self._bits
+        return bits >> _ROW_SHIFT if bits & (_HAS_ROW | _VIRTUAL_ROW) == _HAS_ROW else None
+
+    @child_row.setter
+    def child_row(self, pos):
+        self._set_row(pos, 0)
+
+    def _set_row(self, row, virtual_bit):
+        " Stores the row number, or removes it if row is None."
+        bits = self._bits & _STATE_MASK & ~_VIRTUAL_ROW
+        if row is None:
+            self._bits = bits & ~_HAS_ROW
+        else:
+            self._bits = bits | _HAS_ROW | virtual_bit | (row << _ROW_SHIFT)
+
+    @property
+    def obj_name(self):
+        " The name as a string"
+        name = self.name
+        return name if type(name) is str else str(name)
+
+    @property
+    def obj_path(self):
+        " The path of the object, e.g. obj.attr[3]. Is built from the path of the parent."
+        state = self._state
+        if state is not None and state.obj_path is not None:
+            return state.obj_path
+
+        parent_path = self.parent_item.obj_path if self.parent_item is not None else ''
+        path_format = self.path_format
+        if path_format is None or not parent_path:
+            obj_path = self.obj_name
+        else:
+            obj_path = path_format.format(parent_path, self.name)
+
+        if self.cache_obj_path:
+            if state is None:
+                state = self._state = _ItemState()
+            state.obj_path = obj_path
+        return obj_path
+
+    def set_name(self, name, path_format):
+        " Sets the name and path format and invalidates the cached paths of the subtree."
+        self.name = name
+        self.path_format = path_format
+        self.clear_obj_path_cache()
+        self.classify()
+
+    def set_obj(self, obj):
+        " Sets the underlying object and updates the flags."
+        self.obj = obj
+        self.classify()
+
+    def release(self):
+        " Stops keeping the object alive when the item is discarded. See WeakTreeItem."
+        pass
+
+    def classify(self):
+        " Determines the flags from the object, name and is_attribute."
+        bits = self._bits & ~(ITEM_DUNDER | ITEM_CALLABLE)
+        if bits & ITEM_ATTRIBUTE and name_is_dunder(self.obj_name):
+            bits |= ITEM_DUNDER
+        if callable(self.obj):
+            bits |= ITEM_CALLABLE
+        self._bits = bits
+
+    def clear_obj_path_cache(self):
+        " Removes the cached object paths of this item and its descendants."
+        if not self.cache_obj_path:
+            return
+        if self._state is not None:
+            self._state.obj_path = None
+        for _row, child_item in self.created_virtual_children():
+            child_item.clear_obj_path_cache()
+        for child_item in self.child_items:
+            child_item.clear_obj_path_cache()
+
+    @property
+    def child_items(self):
+        " The list of non-virtual children. An empty tuple if no children have been added."
+        state = self._state
+        if state is None or state.child_items is None:
+            return ()
+        return state.child_items
             
     @property
     def is_dunder_attribute(self):
         " Return true if the items is an attribute and its name begins and end with 2 underscores" 
-        return self.is_attribute and name_is_dunder(self.obj_name)
+        return bool(self._bits & ITEM_DUNDER)
 
     @property
     def is_callable_attribute(self):
         " Return true if the items is an attribute and it is callable."
-        return self.is_attribute and self.is_callable
+        return self._bits & (ITEM_ATTRIBUTE | ITEM_CALLABLE) == ITEM_ATTRIBUTE | ITEM_CALLABLE
 
     @property
     def is_callable(self):
         " Return true if the underlying object is callable "
-        return callable(self.obj)
+        return bool(self._bits & ITEM_CALLABLE)
+
+    def _child_list(self):
+        " Returns the list of non-virtual children. Creates it if needed."
+        state = self._state
+        if state is None:
+            state = self._state = _ItemState()
+        if state.child_items is None:
+            state.child_items = []
+        return state.child_items
     
     def append_child(self, item):
+        child_items = self._child_list()
         item.parent_item = self
-        self.child_items.append(item)
+        item.child_row = len(child_items)
+        child_items.append(item)
 
     def insert_children(self, idx, items):
-        self.child_items[idx:idx] = items
+        child_items = self._child_list()
+        child_items[idx:idx] = items
+        for item in items:
+            item.parent_item = self
+        self._renumber_children(idx)
+
+    def remove_children(self, first, stop):
+        " Removes the non-virtual children child_items[first:stop]"
+        child_items = self.child_items
+        if child_items:
+            for item in child_items[first:stop]:
+                item.child_row = None
+            del child_items[first:stop]
+            if child_items:
+                self._renumber_children(first)
+            else:
+                self._state.child_items = None
+
+    def replace_children(self, first, stop, items):
+        " Replaces the non-virtual children child_items[first:stop] by the items."
+        for item in self.child_items[first:stop]:
+            item.child_row = None
+        child_items = self._child_list()
+        child_items[first:stop] = items
         for item in items:
             item.parent_item = self
+        if child_items:
+            self._renumber_children(first)
+        else:
+            self._state.child_items = None
+
+    def _renumber_children(self, first):
+        " Updates the child_row of the children from position first onwards."
+        child_items = self._state.child_items
+        for pos in range(first, len(child_items)):
+            item = child_items[pos]
+            item._bits = ((item._bits & _STATE_MASK & ~_VIRTUAL_ROW) | _HAS_ROW |
+                          (pos << _ROW_SHIFT))
+
+    def contains_child(self, item):
+        " Returns True if the item is one of the non-virtual children. O(1)"
+        pos = item.child_row
+        child_items = self.child_items
+        return pos is not None and pos < len(child_items) and child_items[pos] is item
+
+    def set_virtual_children(self, n_children, child_fn, discard_fn=None):
+        """ Sets the number of virtual children and the function that creates them on demand.
+            The rows of the children are added by increasing n_virtual_children.
+        """
+        if self.virtual_children is None:
+            self.virtual_children = VirtualChildren(self, child_fn, discard_fn=discard_fn)
+        self.virtual_children.child_fn = child_fn
+        self.virtual_children.n_children = n_children
+
+    def remove_virtual_children(self, first):
+        " Removes the rows of the virtual children with row numbers >= first."
+        items = self.virtual_children.items
+        for row in [row for row in items if row >= first]:
+            del items[row]
+        self.n_virtual_children = first
+
+    def pending_virtual_child_count(self):
+        " Returns the number of virtual children that have not been added as rows yet."
+        virtual_children = self.virtual_children
+        if virtual_children is None:
+            return 0
+        return virtual_children.n_children - self.n_virtual_children
+
+    def has_pending_children(self):
+        " Returns True if there are children that have not been added as rows yet."
+        return self.pending_children is not None or self.pending_virtual_child_count() > 0
+
+    def created_virtual_children(self):
+        " Returns a sorted list of (row, item) tuples of the virtual children that were created."
+        if self.virtual_children is None:
+            return []
+        else:
+            return sorted(self.virtual_children.items.items())
 
     def child(self, row):
-        return self.child_items[row]
+        n_virtual_children = self.n_virtual_children
+        if row < n_virtual_children:
+            return self.virtual_children.child(row)
+        else:
+            return self.child_items[row - n_virtual_children]
 
     def child_count(self):
-        return len(self.child_items)
+        return self.n_virtual_children + len(self.child_items)
 
     def parent(self):
         return self.parent_item
 
     def row(self):
-        if self.parent_item:
-            return self.parent_item.child_items.index(self)
+        bits = self._bits
+        if bits & _VIRTUAL_ROW:
+            return bits >> _ROW_SHIFT
+        elif self.parent_item:
+            return self.parent_item.n_virtual_children + (bits >> _ROW_SHIFT)
         else:
             return 0
 
+    def child_items_fetched(self):
+        " Returns the list of non-virtual children, excluding a trailing placeholder."
+        if self.child_items and self.child_items[-1].is_placeholder:
+            return self.child_items[:-1]
+        else:
+            return self.child_items
+
+    def fetched_child_count(self):
+        " Returns the number of non-virtual children, excluding a trailing placeholder."
+        if self.child_items and self.child_items[-1].is_placeholder:
+            return len(self.child_items) - 1
+        else:
+            return len(self.child_items)
+
+    def placeholder_child(self):
+        " Returns the trailing placeholder child or None if there is no placeholder"
+        if self.child_items and self.child_items[-1].is_placeholder:
+            return self.child_items[-1]
+        else:
+            return None
+
     def pretty_print(self, indent=0):
         if 0:
             print(indent * "    " + str(self))
         else:
             logger.debug(indent * "    " + str(self))
+        for _row, child_item in self.created_virtual_children():
+            child_item.pretty_print(indent + 1)
         for child_item in self.child_items:
             child_item.pretty_print(indent + 1)
-            
-        
-        
+
+
+
+class WeakTreeItem(TreeItem):
+    """ Tree item that doesn't keep its object alive. It holds a weak reference if the object
+        supports it. Otherwise the object is kept alive by a StrongRefCache, which is shared by
+        the items of a model. See the objrefs module.
+
+        The obj attribute is COLLECTED_VALUE once the object is gone.
+    """
+    __slots__ = ('_ref', 'strong_refs')
+
+    def __init__(self, obj, name, path_format, is_attribute, parent=None, strong_refs=None):
+        """ Constructor
+
+            :param strong_refs: the StrongRefCache that keeps the objects alive that don't
+                support weak references.
+            See TreeItem for the other parameters.
+        """
+        self.strong_refs = strong_refs
+        self._ref = None
+        super(WeakTreeItem, self).__init__(obj, name, path_format, is_attribute, parent=parent)
+
+    @property
+    def obj(self):
+        " The underlying object, or COLLECTED_VALUE if it has been garbage collected."
+        return dereference(self._ref)
+
+    @obj.setter
+    def obj(self, obj):
+        if self._ref is not None:
+            release_ref(self._ref)
+        self._ref = make_ref(obj, self.strong_refs)
+
+    def release(self):
+        " Stops keeping the object alive if it is held by the StrongRefCache."
+        release_ref(self._ref)
+
+
+
+class VirtualChildren(object):
+    """ The virtual children of a TreeItem, e.g. the elements of a sequence.
+
+        The children are created on demand by the child_fn(parent_item, row) function. The model
+        uses this object as the internal pointer of the indices of the virtual rows. This way no
+        TreeItem has to be created for rows that are laid out but never displayed.
+
+        At most max_items children are kept. If more are created, the least recently used ones
+        are discarded, except the children of which the children have been fetched (or are being
+        fetched). The discarded children are passed to discard_fn and are created again when
+        they are requested.
+
+        The cache can hold data that is computed for several children at once. It is cleared
+        when the parent item is refreshed.
+    """
+    max_items = 10000
+
+    def __init__(self, parent_item, child_fn, n_children=0, discard_fn=None):
+        self.parent_item = parent_item
+        self.child_fn = child_fn
+        self.n_children = n_children  # Including the children that aren't added as rows yet.
+        self.discard_fn = discard_fn
+        self.items = OrderedDict()    # Created children by row, least recently used first.
+        self.cache = {}
+
+    def child(self, row):
+        items = self.items
+        item = items.pop(row, None)
+        if item is None:
+            item = self.child_fn(self.parent_item, row)
+            item.parent_item = self.parent_item
+            item.virtual_row = row
+            items[row] = item
+            if len(items) > self.max_items:
+                self._discard_least_recently_used()
+        else:
+            items[row] = item
+        return item
+
+    def _discard_least_recently_used(self):
+        " Discards the least recently used children until a quarter of max_items is free."
+        items = self.items
+        n_discard = len(items) - (self.max_items - self.max_items // 4)
+        discarded = []
+        for row, item in list(items.items())[:-1]:
+            if len(discarded) >= n_discard:
+                break
+            if not item.children_fetched and item.fetch_job is None:
+                discarded.append(items.pop(row))
+        if self.discard_fn is not None:
+            self.discard_fn(discarded)
+
+
+
+class PlaceholderTreeItem(TreeItem):
+    """ Tree item that is displayed in place of children that have not been fetched (yet).
+
+        The item doesn't represent a Python object. The text is shown in the first column.
+    """
+    __slots__ = ()
+
+    is_placeholder = True
+
+    def __init__(self, text, parent=None):
+        super(PlaceholderTreeItem, self).__init__(None, text, None, None, parent=parent)
+        self.has_children = False
+        self.children_fetched = True
+
+    def __str__(self):
+        return "<PlaceholderTreeItem: {}>".format(self.obj_name)
+
+    def __repr__(self):
+        return "<PlaceholderTreeItem: {}>".format(self.obj_name)
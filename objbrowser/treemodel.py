@@ -8,18 +8,53 @@
 
 
 from __future__ import absolute_import
-import logging, inspect
-from difflib import SequenceMatcher
-from collections import OrderedDict
-from six import unichr
+import logging, array, time
+from collections import OrderedDict, deque
+from itertools import islice
+from six import unichr, string_types
+
+try:
+    from collections.abc import Sequence
+except ImportError:
+    from collections import Sequence
 
 from qtpy import QtCore, QtGui, QtWidgets
 from qtpy.QtCore import Qt
-from objbrowser.treeitem import TreeItem
+from objbrowser.treeitem import (TreeItem, WeakTreeItem, PlaceholderTreeItem, VirtualChildren,
+                                 PATH_ATTRIBUTE, PATH_ITEM, PATH_INDEX, PATH_SLICE,
+                                 ITEM_ATTRIBUTE, ITEM_DUNDER, ITEM_CALLABLE,
+                                 _HAS_CHILDREN, _CHILDREN_FETCHED)
+from objbrowser.objrefs import StrongRefCache, is_collected, DEFAULT_STRONG_REF_CACHE_SIZE
 from objbrowser.utils import cut_off_str
+from objbrowser.rendering import value_fingerprint
+from objbrowser.workers import WorkerPool, Job
+from objbrowser.keydiff import diff_keys
+from objbrowser.cellcache import CellCache, renders_unchanged, DEFAULT_CELL_CACHE_SIZE
+from objbrowser.members import (get_members, get_instance_state, evaluate_attribute,
+                                submit_evaluation, is_unevaluated, is_not_evaluated,
+                                PENDING_VALUE, DEFAULT_ATTR_TIME_BUDGET)
+from objbrowser.child_providers import child_provider, mapping_items
+from objbrowser.ndarray_children import (is_ndarray, array_length, array_block_count,
+                                         array_block_bounds, structured_field_names)
 
 logger = logging.getLogger(__name__)
 
+# Number of children that are added at once when a node is expanded. Use None to add all at once.
+DEFAULT_FETCH_PAGE_SIZE = 1000
+
+# Worker threads that fetch the children of nodes when asynchronous fetching is enabled.
+_FETCH_POOL = WorkerPool(max_threads=4, name='fetch')
+
+# Maximum number of seconds that a background refresh may block the event loop at once.
+REFRESH_SLICE_DURATION = 0.02
+
+# Default number of nodes in collapsed subtrees that the ObjectBrowser keeps in memory.
+DEFAULT_COLLAPSED_NODE_BUDGET = 500000
+
+# If the children of a node change in more ranges than this during a refresh, the rows are
+# updated with a single layout change instead of inserting and removing each range.
+MAX_REFRESH_ROW_RANGES = 32
+
 
 
     
@@ -36,9 +71,34 @@ logger = logging.getLogger(__name__)
 class TreeModel(QtCore.QAbstractItemModel):
     """ Model that provides an interface to an objectree that is build of TreeItems. 
     """
+    # Emitted from a worker thread when a fetch job is done. Handled in the GUI thread.
+    _fetchJobDone = QtCore.Signal(object)
+
+    # Emitted from a worker thread when an attribute has been evaluated: (tree_item, value).
+    _attributeEvaluated = QtCore.Signal(object, object)
+
+    # Emitted from a worker thread when the first phase of a background refresh is done.
+    _refreshPrefetched = QtCore.Signal(object)
+
+    # Emitted when a background refresh is done or cancelled, with the number of seconds that
+    # was spent on it in the worker thread and in the GUI thread.
+    refreshFinished = QtCore.Signal(float)
+
     def __init__(self, obj, 
                  obj_name = '',
                  attr_cols = None, 
+                 fetch_page_size = DEFAULT_FETCH_PAGE_SIZE,
+                 async_fetch = False,
+                 attr_time_budget = DEFAULT_ATTR_TIME_BUDGET,
+                 cell_cache_size = DEFAULT_CELL_CACHE_SIZE,
+                 fingerprint_fn = value_fingerprint,
+                 show_callable_attributes = True,
+                 show_dunder_attributes = True,
+                 instance_state_only = False,
+                 lazy_properties = False,
+                 weak_refs = False,
+                 strong_ref_cache_size = DEFAULT_STRONG_REF_CACHE_SIZE,
+                 collapsed_node_budget = None,
                  parent = None):
         """ Constructor
         
@@ -46,10 +106,88 @@ class TreeModel(QtCore.QAbstractItemModel):
             :param obj_name: name of the object as it will appear in the root node
                              If empty, no root node will be drawn. 
             :param attr_cols: list of AttributeColumn definitions
+            :param fetch_page_size: maximum number of children that are added to a node at once.
+                If a node has more children, a '... N more' placeholder row is added, which can
+                be used to fetch the next page. If None, all children are added at once.
+            :param async_fetch: if True, the children of a node are fetched in a worker thread.
+                Meanwhile a 'loading' placeholder row is shown. Pending fetches can be cancelled
+                with cancelFetch. The children of the root item are always fetched synchronously.
+            :param attr_time_budget: maximum number of seconds that the evaluation of a computed
+                attribute (e.g. a property) may take. If exceeded, the attribute gets a 'timed out'
+                value and can be evaluated again with evaluateItem. If async_fetch is True, 
+                computed attributes are evaluated after their rows have been added, so they don't
+                delay the other rows. If None, there is no time limit.
+            :param cell_cache_size: maximum total number of characters of the rendered cells
+                that are cached. When a node is refreshed, only the cells of the changed nodes
+                are rendered again. If None, the size of the cache is not limited.
+            :param fingerprint_fn: function that returns a fingerprint of an object, which must
+                change when the cells of the object change. The fingerprint is taken when the
+                cells of a node are rendered. When the tree is refreshed the dataChanged signal is
+                only emitted for the nodes with a different fingerprint.
+            :param show_callable_attributes: if False, attributes with a callable value are not
+                fetched. See setAttributeFilter.
+            :param show_dunder_attributes: if False, attributes with a __dunder__ name are not
+                fetched. See setAttributeFilter.
+            :param instance_state_only: if True, only the attributes that are stored in the
+                objects themselves are listed (see members.get_instance_state). Methods,
+                properties and other class attributes are then not listed and no descriptor is
+                executed, which is much faster for objects with many class attributes.
+            :param lazy_properties: if True, computed attributes (e.g. properties) are not
+                evaluated when the children of a node are fetched. They are shown as
+                '<property, not evaluated>' rows and are evaluated in the background when their
+                row is displayed. The value is kept until the next refresh, which evaluates the
+                attribute again. Rows that were never displayed are not evaluated at all.
+            :param weak_refs: if True, the tree items don't keep their objects alive (see the
+                objrefs module). Objects that have been garbage collected are shown as
+                '<collected>' and are removed by the next refresh. The inspected object itself
+                is always kept alive.
+            :param strong_ref_cache_size: maximum number of objects that don't support weak
+                references (e.g. lists and dicts) that are kept alive if weak_refs is True.
+            :param collapsed_node_budget: maximum number of nodes in the subtrees of collapsed
+                nodes that are kept. If exceeded, the children of the least recently collapsed
+                nodes are removed. They are fetched again when the node is expanded. The view
+                must report collapsed and expanded nodes with itemCollapsed and itemExpanded.
+                If None, the children are kept until the model is deleted.
             :param parent: the parent widget
         """
         super(TreeModel, self).__init__(parent)
         self._attr_cols = attr_cols
+        assert fetch_page_size is None or fetch_page_size > 0, \
+            "fetch_page_size must be > 0. Got: {}".format(fetch_page_size)
+        self._fetch_page_size = fetch_page_size
+        self._async_fetch = False # Enabled after the root has been populated.
+        self._fetching_items = set() # Items with a pending fetch job.
+        self._fetchJobDone.connect(self._onFetchJobDone)
+        self._attr_time_budget = attr_time_budget
+        self._evaluation_jobs = []
+        self._attributeEvaluated.connect(self._onAttributeEvaluated)
+        self._cell_cache = CellCache(cell_cache_size)
+        self._fingerprint_fn = fingerprint_fn
+        self._show_callables = show_callable_attributes
+        self._show_dunder_attributes = show_dunder_attributes
+        self._instance_state_only = instance_state_only
+        self._lazy_properties = lazy_properties
+        self._strong_refs = StrongRefCache(strong_ref_cache_size) if weak_refs else None
+        assert collapsed_node_budget is None or collapsed_node_budget >= 0, \
+            "collapsed_node_budget must be >= 0. Got: {}".format(collapsed_node_budget)
+        self._collapsed_node_budget = collapsed_node_budget
+        self._collapsed_items = OrderedDict() # Collapsed items -> number of descendants.
+        self._n_collapsed_nodes = 0
+        self._lazy_items = [] # Displayed items of which the attribute must be evaluated.
+        self._lazy_eval_timer = QtCore.QTimer(self)
+        self._lazy_eval_timer.setSingleShot(True)
+        self._lazy_eval_timer.setInterval(0)
+        self._lazy_eval_timer.timeout.connect(self._evaluateLazyItems)
+        self._children_memo = None # Shared member listings during refreshTree, see there.
+        self._refresh_job = None # Job of the first phase of a background refresh.
+        self._refresh_queue = [] # Items that remain to be refreshed by a background refresh.
+        self._refresh_state = None # (is_expanded, children_memo) of the background refresh.
+        self._refresh_duration = 0.0 # Seconds spent on the background refresh so far.
+        self._refreshPrefetched.connect(self._onRefreshPrefetched)
+        self._refresh_slice_timer = QtCore.QTimer(self)
+        self._refresh_slice_timer.setSingleShot(True)
+        self._refresh_slice_timer.setInterval(0)
+        self._refresh_slice_timer.timeout.connect(self._applyRefreshSlice)
 
         self.regular_font = QtGui.QFont()  # Font for members (non-functions)
         self.dunder_attribute_font = QtGui.QFont()  # Font for __dunder_attributes__
@@ -58,6 +196,7 @@ class TreeModel(QtCore.QAbstractItemModel):
         self.regular_color = QtGui.QBrush(QtGui.QColor('black'))    
         #self.callable_color = QtGui.QBrush(QtGui.QColor('brown'))  # for functions, methods, etc.
         self.callable_color = QtGui.QBrush(QtGui.QColor('mediumblue'))  # for functions, methods, etc.
+        self.placeholder_color = QtGui.QBrush(QtGui.QColor('gray'))
 
         # The following members will be initialized by populateTree
         # The rootItem is always invisible. If the obj_name is the empty string, the inspectedItem 
@@ -68,6 +207,7 @@ class TreeModel(QtCore.QAbstractItemModel):
         self._inspected_item = None
         self._root_item = None
         self.populateTree(obj, obj_name)
+        self._async_fetch = async_fetch
 
     
     @property
@@ -78,6 +218,13 @@ class TreeModel(QtCore.QAbstractItemModel):
         return self._inspected_node_is_visible
     
     
+    @property
+    def fetchPageSize(self):
+        """ The maximum number of children that is added to a node at once (None = unlimited).
+        """
+        return self._fetch_page_size
+
+
     @property
     def rootItem(self):
         """ The root TreeItem.
@@ -119,33 +266,36 @@ class TreeModel(QtCore.QAbstractItemModel):
             return None
 
         col = index.column()
-        tree_item = index.internalPointer()
-        obj = tree_item.obj
+        tree_item = self.treeItem(index)
+
+        if tree_item.is_placeholder:
+            return self._placeholderData(tree_item, col, role)
 
         if role == Qt.DisplayRole:
-            try:
-                attr = self._attr_cols[col].data_fn(tree_item)
-                # Replace carriage returns and line feeds with unicode glyphs 
-                # so that all table rows fit on one line. 
-                #return attr.replace('\n', unichr(0x240A)).replace('\r', unichr(0x240D))
-                return (attr.replace('\r\n', unichr(0x21B5))
-                            .replace('\n', unichr(0x21B5))
-                            .replace('\r', unichr(0x21B5)))
-            except Exception as ex:
-                #logger.exception(ex)
-                return "**ERROR**: {}".format(ex) 
+            if is_not_evaluated(tree_item.obj):
+                self._scheduleLazyEvaluation(tree_item)
+            data_fn = self._attr_cols[col].data_fn
+            text = self._cell_cache.get(tree_item, data_fn)
+            if text is None:
+                if tree_item.fingerprint is None:
+                    tree_item.fingerprint = self._fingerprint(tree_item.obj)
+                text = self._renderCell(tree_item, data_fn)
+                self._cell_cache.put(tree_item, data_fn, text)
+            return text
             
         elif role == Qt.TextAlignmentRole:
             return self._attr_cols[col].alignment
             
         elif role == Qt.ForegroundRole:
-            if tree_item.is_callable:
+            if is_unevaluated(tree_item.obj) or is_collected(tree_item.obj):
+                return self.placeholder_color
+            elif tree_item._bits & ITEM_CALLABLE:
                 return self.callable_color
             else:
                 return self.regular_color
             
         elif role == Qt.FontRole:
-            if tree_item.is_attribute:
+            if tree_item._bits & ITEM_ATTRIBUTE:
                 return self.dunder_attribute_font
             else:
                 return self.regular_font
@@ -153,6 +303,106 @@ class TreeModel(QtCore.QAbstractItemModel):
             return None
 
 
+    @staticmethod
+    def _renderCell(tree_item, data_fn):
+        """ Returns the text of a table cell, which is rendered by data_fn(tree_item).
+        """
+        try:
+            attr = data_fn(tree_item)
+            # Replace carriage returns and line feeds with unicode glyphs 
+            # so that all table rows fit on one line. 
+            #return attr.replace('\n', unichr(0x240A)).replace('\r', unichr(0x240D))
+            return (attr.replace('\r\n', unichr(0x21B5))
+                        .replace('\n', unichr(0x21B5))
+                        .replace('\r', unichr(0x21B5)))
+        except Exception as ex:
+            #logger.exception(ex)
+            return "**ERROR**: {}".format(ex) 
+
+
+    def _setItemObject(self, tree_item, obj):
+        """ Sets the underlying object of a tree item. Its cached cells are removed unless
+            the object is the same, immutable, object.
+        """
+        if not renders_unchanged(tree_item.obj, obj):
+            self._cell_cache.invalidate(tree_item)
+            tree_item.fingerprint = None
+        tree_item.set_obj(obj)
+
+
+    def _fingerprint(self, obj):
+        """ Returns the fingerprint of an object. If it can't be determined, a new object is
+            returned, which differs from any other fingerprint.
+        """
+        try:
+            return self._fingerprint_fn(obj)
+        except Exception as ex:
+            logger.debug("Unable to determine fingerprint: {}".format(ex))
+            return object()
+
+
+    def _refreshItemObject(self, tree_item, obj):
+        """ Sets the underlying object of a tree item while refreshing the tree.
+
+            Returns True if the row must be repainted. This is the case if the cells of the
+            item have been rendered before and the fingerprint of the object has changed since.
+        """
+        old_fingerprint = tree_item.fingerprint
+        tree_item.set_obj(obj)
+        if old_fingerprint is None:
+            self._cell_cache.invalidate(tree_item) # Not rendered since it was last changed.
+            return False
+
+        if self._memoizedFingerprint(obj, self._children_memo) == old_fingerprint:
+            return False
+
+        self._cell_cache.invalidate(tree_item)
+        tree_item.fingerprint = None
+        return True
+
+
+    def _discardCachedCells(self, tree_items):
+        """ Removes the cached cells of tree items (and their descendants) that are removed.
+            The collapsed nodes among them no longer count towards the collapsed_node_budget.
+            Also stops keeping their objects alive in the weak reference mode.
+        """
+        collapsed_items = self._collapsed_items
+        release = self._strong_refs is not None
+        stack = list(tree_items)
+        while stack:
+            tree_item = stack.pop()
+            self._cell_cache.invalidate(tree_item)
+            if tree_item in collapsed_items:
+                self._n_collapsed_nodes -= collapsed_items.pop(tree_item)
+            if release:
+                tree_item.release()
+            stack.extend(child for _row, child in tree_item.created_virtual_children())
+            stack.extend(tree_item.child_items)
+
+
+    def _createItem(self, obj, name, path_format, is_attribute):
+        """ Creates a TreeItem, or a WeakTreeItem in the weak reference mode.
+        """
+        if self._strong_refs is None:
+            return TreeItem(obj, name, path_format, is_attribute)
+        else:
+            return WeakTreeItem(obj, name, path_format, is_attribute,
+                                strong_refs=self._strong_refs)
+
+
+    def _placeholderData(self, tree_item, col, role):
+        """ Returns the data of a placeholder item. Its text is only shown in the first column.
+        """
+        if role == Qt.DisplayRole:
+            return tree_item.obj_name if col == 0 else None
+        elif role == Qt.ForegroundRole:
+            return self.placeholder_color
+        elif role == Qt.FontRole:
+            return self.dunder_attribute_font
+        else:
+            return None
+
+
     def flags(self, index):
         if not index.isValid():
             return Qt.NoItemFlags
@@ -167,10 +417,18 @@ class TreeModel(QtCore.QAbstractItemModel):
             return None
 
     def treeItem(self, index):
+        """ Returns the TreeItem of an index. Creates it if it is a virtual child.
+
+            The internal pointer of a virtual row is the VirtualChildren object of its parent.
+        """
         if not index.isValid():
             return self.rootItem
+
+        pointer = index.internalPointer()
+        if type(pointer) is VirtualChildren:
+            return pointer.child(index.row())
         else:
-            return index.internalPointer() 
+            return pointer
             
 
     def index(self, row, column, parent=None):
@@ -180,33 +438,71 @@ class TreeModel(QtCore.QAbstractItemModel):
             parent = QtCore.QModelIndex()
 
         parentItem = self.treeItem(parent)
+        n_virtual_children = parentItem.n_virtual_children
+        child_items = parentItem.child_items
             
-        if not self.hasIndex(row, column, parent):
+        # Same as self.hasIndex but without calling rowCount and columnCount via Qt.
+        if (row < 0 or column < 0 or column >= len(self._attr_cols) or 
+                row >= n_virtual_children + len(child_items) or parent.column() > 0):
             logger.debug("hasIndex is False: ({}, {}) {!r}".format(row, column, parentItem))
             #logger.warn("Parent index model: {!r} != {!r}".format(parent.model(), self))
 
             return QtCore.QModelIndex()
 
-        childItem = parentItem.child(row)
-        #logger.debug("  {}".format(childItem.obj_path))
-        if childItem:
-            return self.createIndex(row, column, childItem)
-        else:
-            logger.warn("no childItem")
-            return QtCore.QModelIndex()
+        if row < n_virtual_children:
+            # Don't create the virtual child until its data is requested.
+            return self.createIndex(row, column, parentItem.virtual_children)
+
+        return self.createIndex(row, column, child_items[row - n_virtual_children])
 
 
     def parent(self, index):
         if not index.isValid():
             return QtCore.QModelIndex()
 
-        child_item = index.internalPointer()
-        parent_item = child_item.parent()
+        pointer = index.internalPointer()
+        if type(pointer) is VirtualChildren:
+            parent_item = pointer.parent_item
+        else:
+            parent_item = pointer.parent()
 
         if parent_item is None or parent_item == self.rootItem:
             return QtCore.QModelIndex()
 
-        return self.createIndex(parent_item.row(), 0, parent_item)
+        return self._createItemIndex(parent_item)
+
+
+    def _createItemIndex(self, tree_item, column=0):
+        """ Creates the index of a tree item, which must not be the root item.
+        """
+        if tree_item.virtual_row is not None:
+            return self.createIndex(tree_item.virtual_row, column,
+                                    tree_item.parent_item.virtual_children)
+        else:
+            return self.createIndex(tree_item.row(), column, tree_item)
+
+
+    def itemIndex(self, tree_item):
+        """ Returns the index of a tree item.
+            Returns None if the item is no longer part of the tree (e.g. removed by a refresh).
+        """
+        item = tree_item
+        while item is not self._root_item:
+            parent_item = item.parent_item
+            if parent_item is None:
+                return None
+            if item.virtual_row is not None:
+                if (parent_item.virtual_children is None or 
+                        parent_item.virtual_children.items.get(item.virtual_row) is not item):
+                    return None
+            elif not parent_item.contains_child(item):
+                return None
+            item = parent_item
+
+        if tree_item is self._root_item:
+            return self.rootIndex()
+        else:
+            return self._createItemIndex(tree_item)
     
 
     def rowCount(self, parent=None):
@@ -219,20 +515,41 @@ class TreeModel(QtCore.QAbstractItemModel):
             return self.treeItem(parent).child_count()
 
 
+    def _createdItem(self, index):
+        """ Returns the TreeItem of an index, or None if it is a virtual child that has not been
+            created yet.
+        """
+        if not index.isValid():
+            return self._root_item
+
+        pointer = index.internalPointer()
+        if type(pointer) is VirtualChildren:
+            return pointer.items.get(index.row())
+        else:
+            return pointer
+
+
     def hasChildren(self, parent=None):
         parent = QtCore.QModelIndex() if parent is None else parent
         if parent.column() > 0:
             return 0
+        tree_item = self._createdItem(parent)
+        if tree_item is None:
+            return True # New tree items always have children, don't create it yet.
         else:
-            return self.treeItem(parent).has_children
+            return bool(tree_item._bits & _HAS_CHILDREN) and not is_collected(tree_item.obj)
     
 
     def canFetchMore(self, parent=None):
         parent = QtCore.QModelIndex() if parent is None else parent
         if parent.column() > 0:
             return 0
+        tree_item = self._createdItem(parent)
+        if tree_item is None:
+            return True # The children of new tree items are not yet fetched.
         else:
-            result = not self.treeItem(parent).children_fetched 
+            result = ((not tree_item._bits & _CHILDREN_FETCHED and tree_item.fetch_job is None) or 
+                      tree_item.has_pending_children())
             # logger.debug("canFetchMore: {} = {}".format(parent, result))
             return result  
 
@@ -240,75 +557,528 @@ class TreeModel(QtCore.QAbstractItemModel):
     def fetchMore(self, parent=None):
         """ Fetches the children given the model index of a parent node.
             Adds the children to the parent.
+
+            At most fetchPageSize children are added at once, the virtual children (e.g. the
+            elements of a sequence) first. If there are more, a placeholder row is appended, and
+            the next call to fetchMore will add the next page.
+
+            If asynchronous fetching is enabled, the children are fetched in a worker thread and
+            added when the fetch job is done.
         """
         parent = QtCore.QModelIndex() if parent is None else parent
         if parent.column() > 0:
             return
         
         parent_item = self.treeItem(parent)
-        if parent_item.children_fetched:
-            return
-                
-        tree_items = self._fetchObjectChildren(parent_item.obj, parent_item.obj_path)
-        
-        self.beginInsertRows(parent, 0, len(tree_items) - 1)
-        for tree_item in tree_items:
-            parent_item.append_child(tree_item)
-            
-        parent_item.children_fetched = True                
+        if not parent_item.children_fetched:
+            if parent_item.fetch_job is not None:
+                return # Still fetching
+            elif self._async_fetch:
+                self._startFetchJob(parent, parent_item)
+                return
+            else:
+                children_data = self._fetchChildrenData(*self._fetchArgs(parent_item))
+                self._addFetchedChildren(parent, parent_item, children_data)
+
+        if parent_item.has_pending_children():
+            self._fetchNextPage(parent, parent_item)
+
+
+    def _fetchArgs(self, parent_item):
+        """ Returns the arguments of _fetchChildrenData for a parent item.
+        """
+        owner_item = parent_item.parent_item
+        owner_obj = owner_item.obj if owner_item is not None else None
+        return parent_item.obj, owner_obj, parent_item.obj_name
+
+
+    def _fetchChildrenData(self, obj, owner_obj=None, attr_name=None):
+        """ Fetches the children of a Python object. Can be called in a worker thread.
+
+            If obj is an unevaluated attribute value, the attribute of the owner_obj is evaluated
+            first (without time budget, since the user explicitly asked for its contents).
+
+            Returns: (obj, n_elements, child_fn, n_children, children_iter) tuple. See 
+                _virtualChildren and _fetchObjectChildren.
+        """
+        if is_unevaluated(obj):
+            obj = evaluate_attribute(owner_obj, attr_name)
+        n_elements, child_fn = self._virtualChildren(obj)
+        n_children, children_iter = self._fetchObjectChildren(obj)
+        return obj, n_elements, child_fn, n_children, children_iter
+
+
+    def _addFetchedChildren(self, parent, parent_item, children_data):
+        """ Marks the virtual and other children as pending. Their rows are added by
+            _fetchNextPage.
+            :param children_data: the result of _fetchChildrenData
+        """
+        obj, n_elements, child_fn, n_children, children_iter = children_data
+        if obj is not parent_item.obj:
+            self._setItemObject(parent_item, obj) # The attribute has been evaluated.
+            self._emitRowChanged(parent)
+
+        if n_elements:
+            parent_item.set_virtual_children(n_elements, child_fn, self._discardCachedCells)
+
+        parent_item.children_fetched = True
+        parent_item.pending_children = children_iter
+        parent_item.n_pending_children = n_children
+
+
+    def _startFetchJob(self, parent, parent_item):
+        """ Starts fetching the children of the parent_item in a worker thread.
+            Adds a 'loading' placeholder row that is removed when the job is done or cancelled.
+        """
+        logger.debug("Start fetching children of: {}".format(parent_item.obj_path))
+        self.beginInsertRows(parent, 0, 0)
+        parent_item.append_child(PlaceholderTreeItem("\u2026 loading"))
         self.endInsertRows()
-        
 
-    def _fetchObjectChildren(self, obj, obj_path):
+        job = _FETCH_POOL.submit(self._fetchChildrenData,
+                                 self._fetchArgs(parent_item),
+                                 on_done = self._fetchJobDone.emit)
+        job.data = parent_item
+        parent_item.fetch_job = job
+        self._fetching_items.add(parent_item)
+
+
+    def _removeLoadingPlaceholder(self, parent, parent_item):
+        """ Cancels the fetch job of the parent_item and removes the 'loading' placeholder.
+        """
+        parent_item.fetch_job.cancel()
+        parent_item.fetch_job = None
+        self._fetching_items.discard(parent_item)
+
+        self.beginRemoveRows(parent, 0, 0)
+        parent_item.remove_children(0, 1)
+        self.endRemoveRows()
+
+
+    @QtCore.Slot(object)
+    def _onFetchJobDone(self, job):
+        """ Adds the fetched children to the tree when a fetch job is done.
+            Results of cancelled jobs or of items that have been removed are discarded.
+        """
+        parent_item = job.data
+        if job.cancelled or parent_item.fetch_job is not job:
+            return
+
+        parent = self.itemIndex(parent_item)
+        if parent is None:
+            logger.debug("Discarding children of removed item: {}".format(parent_item))
+            parent_item.fetch_job = None
+            self._fetching_items.discard(parent_item)
+            return
+
+        self._removeLoadingPlaceholder(parent, parent_item)
+        if job.exception is not None:
+            logger.warning("Unable to fetch children of {}: {}"
+                           .format(parent_item.obj_path, job.exception))
+            children_data = (parent_item.obj, 0, None, 0, iter([]))
+        else:
+            children_data = job.result
+
+        self._addFetchedChildren(parent, parent_item, children_data)
+        if parent_item.has_pending_children():
+            self._fetchNextPage(parent, parent_item)
+
+
+    def isFetching(self, index):
+        """ Returns True if the children of the item at the index are being fetched.
+        """
+        return self.treeItem(index).fetch_job is not None
+
+
+    def cancelFetch(self, index):
+        """ Cancels fetching the children of the item at the index. 
+            The children will be fetched again when the item is expanded the next time.
+            Returns True if a fetch was cancelled.
+        """
+        tree_item = self.treeItem(index)
+        if tree_item.fetch_job is None:
+            return False
+
+        logger.debug("Cancel fetching children of: {}".format(tree_item.obj_path))
+        self._removeLoadingPlaceholder(index, tree_item)
+        return True
+
+
+    def cancelAllFetches(self):
+        """ Cancels all pending fetches. Returns the number of cancelled fetches.
+        """
+        n_cancelled = 0
+        for tree_item in list(self._fetching_items):
+            index = self.itemIndex(tree_item)
+            if index is None:
+                tree_item.fetch_job.cancel()
+                tree_item.fetch_job = None
+                self._fetching_items.discard(tree_item)
+            elif self.cancelFetch(index):
+                n_cancelled += 1
+        return n_cancelled
+
+
+    def _fetchNextPage(self, parent, parent_item):
+        """ Adds the next page of pending children to the parent_item.
+            Updates the trailing placeholder row.
+
+            The rows of the pending virtual children are added first. Their tree items are only
+            created when their data is requested.
+        """
+        page_size = self._fetch_page_size
+        n_virtual_pending = parent_item.pending_virtual_child_count()
+        if n_virtual_pending > 0:
+            n_rows = n_virtual_pending if page_size is None else min(page_size, n_virtual_pending)
+            first = parent_item.n_virtual_children
+            self.beginInsertRows(parent, first, first + n_rows - 1)
+            parent_item.n_virtual_children = first + n_rows
+            self.endInsertRows()
+            if page_size is not None:
+                page_size -= n_rows
+
+        tree_items = []
+        if parent_item.pending_children is not None and page_size != 0:
+            tree_items = list(islice(parent_item.pending_children, page_size))
+            parent_item.n_pending_children -= len(tree_items)
+            if parent_item.n_pending_children <= 0 or not tree_items:
+                parent_item.pending_children = None
+                parent_item.n_pending_children = 0
+
+        if tree_items:
+            first = parent_item.fetched_child_count()
+            offset = parent_item.n_virtual_children
+            self.beginInsertRows(parent, offset + first, offset + first + len(tree_items) - 1)
+            parent_item.insert_children(first, tree_items)
+            self.endInsertRows()
+
+        self._updatePlaceholder(parent, parent_item)
+        self._evaluatePendingItems([item for item in tree_items if item.obj is PENDING_VALUE])
+
+
+    def _evaluatePendingItems(self, tree_items):
+        """ Starts evaluating the attributes of the tree items.
+            The attributes are evaluated one at a time in a worker thread, each with the time
+            budget. The rows are updated when the values arrive.
+        """
+        attributes = [(item, item.parent_item.obj, item.obj_name) for item in tree_items]
+        if not attributes:
+            return
+
+        self._evaluation_jobs = [job for job in self._evaluation_jobs if not job.wait(0)]
+        job = _FETCH_POOL.submit(self._evaluateAttributes, (attributes, ), pass_job=True)
+        self._evaluation_jobs.append(job)
+
+
+    def _evaluateAttributes(self, job, attributes):
+        """ Evaluates a list of (tree_item, owner_obj, attr_name) tuples in a worker thread.
+            Each result is reported with the _attributeEvaluated signal.
+        """
+        for tree_item, owner_obj, attr_name in attributes:
+            if job.cancelled:
+                return
+            attr_value = evaluate_attribute(owner_obj, attr_name, self._attr_time_budget)
+            if not job.cancelled:
+                self._attributeEvaluated.emit(tree_item, attr_value)
+
+
+    def _scheduleLazyEvaluation(self, tree_item):
+        """ Evaluates the attribute of a displayed item soon. The items that are displayed
+            during one paint event are evaluated together.
+        """
+        self._lazy_items.append(tree_item)
+        if not self._lazy_eval_timer.isActive():
+            self._lazy_eval_timer.start()
+
+
+    def _evaluateLazyItems(self):
+        """ Starts evaluating the attributes of the displayed items that are not evaluated.
+            Their rows show the 'evaluating' placeholder until the values arrive.
+        """
+        tree_items = []
+        for tree_item in self._lazy_items:
+            if not is_not_evaluated(tree_item.obj): # Already started or refreshed.
+                continue
+            index = self.itemIndex(tree_item)
+            if index is None:
+                continue
+            self._setItemObject(tree_item, PENDING_VALUE)
+            self._emitRowChanged(index)
+            tree_items.append(tree_item)
+        self._lazy_items = []
+        self._evaluatePendingItems(tree_items)
+
+
+    @QtCore.Slot(object, object)
+    def _onAttributeEvaluated(self, tree_item, attr_value):
+        """ Updates the value of a tree item when its attribute has been evaluated.
+            The item is removed if the attribute raised an AttributeError, since such attributes
+            are skipped when the attributes are evaluated right away (see get_members).
+        """
+        if isinstance(attr_value, AttributeError):
+            self._removeAttributeItem(tree_item)
+            return
+        self._setItemObject(tree_item, attr_value)
+        index = self.itemIndex(tree_item)
+        if index is not None:
+            self._emitRowChanged(index)
+
+
+    def _removeAttributeItem(self, tree_item):
+        """ Removes the row of an attribute item. Does nothing if it's no longer in the tree.
+        """
+        index = self.itemIndex(tree_item)
+        if index is None:
+            return
+        logger.debug("Removing attribute that raised an AttributeError: {}"
+                     .format(tree_item.obj_path))
+        pos = tree_item.child_row
+        self.beginRemoveRows(index.parent(), index.row(), index.row())
+        self._discardCachedCells([tree_item])
+        tree_item.parent_item.remove_children(pos, pos + 1)
+        self.endRemoveRows()
+
+
+    def _emitRowChanged(self, index):
+        """ Emits the dataChanged signal for all columns of the row of the index.
+        """
+        if index.isValid():
+            top_left = index.sibling(index.row(), 0)
+            bottom_right = index.sibling(index.row(), self.columnCount() - 1)
+            self.dataChanged.emit(top_left, bottom_right)
+
+
+    def _emitRowsChanged(self, parent, rows):
+        """ Emits the dataChanged signal for the rows of the parent index.
+            A signal is emitted per range of consecutive rows.
+        """
+        last_col = self.columnCount() - 1
+        rows = sorted(rows)
+        start = 0
+        for pos in range(1, len(rows) + 1):
+            if pos == len(rows) or rows[pos] != rows[pos - 1] + 1:
+                self.dataChanged.emit(self.index(rows[start], 0, parent),
+                                      self.index(rows[pos - 1], last_col, parent))
+                start = pos
+
+
+    def evaluateItem(self, index):
+        """ Evaluates the attribute of the item at the index again, without time budget.
+            E.g. to retry an attribute that timed out. If asynchronous fetching is enabled, the
+            attribute is evaluated in a worker thread. The row is removed if the attribute raises
+            an AttributeError.
+        """
+        tree_item = self.treeItem(index)
+        if not tree_item.is_attribute or tree_item.parent_item is None:
+            return
+
+        owner_obj = tree_item.parent_item.obj
+        if self._async_fetch:
+            self._setItemObject(tree_item, PENDING_VALUE)
+            job = submit_evaluation(owner_obj, tree_item.obj_name, on_done = lambda job: 
+                                    self._attributeEvaluated.emit(tree_item, job.result))
+            self._evaluation_jobs.append(job)
+        else:
+            attr_value = evaluate_attribute(owner_obj, tree_item.obj_name)
+            if isinstance(attr_value, AttributeError):
+                self._removeAttributeItem(tree_item)
+                return
+            self._setItemObject(tree_item, attr_value)
+        self._emitRowChanged(index)
+
+
+    def cancelEvaluations(self):
+        """ Cancels evaluating attributes in the background.
+        """
+        for job in self._evaluation_jobs:
+            job.cancel()
+        self._evaluation_jobs = []
+
+
+    def _updatePlaceholder(self, parent, parent_item):
+        """ Adds, updates or removes the '... N more' placeholder row of a parent item.
+        """
+        placeholder = parent_item.placeholder_child()
+        n_pending = parent_item.n_pending_children if parent_item.pending_children is not None else 0
+        n_pending += parent_item.pending_virtual_child_count()
+        idx = parent_item.fetched_child_count()
+        row = parent_item.n_virtual_children + idx
+
+        if n_pending > 0:
+            text = "\u2026 {} more".format(n_pending)
+            if placeholder is None:
+                self.beginInsertRows(parent, row, row)
+                parent_item.append_child(PlaceholderTreeItem(text))
+                self.endInsertRows()
+            else:
+                placeholder.name = text
+                placeholder_index = self.index(row, 0, parent)
+                self.dataChanged.emit(placeholder_index, placeholder_index)
+        elif placeholder is not None:
+            self.beginRemoveRows(parent, row, row)
+            parent_item.remove_children(idx, idx + 1)
+            self.endRemoveRows()
+
+
+    def _virtualChildren(self, obj):
+        """ Returns the number of virtual children of obj and the function that creates them.
+            Returns (0, None) if obj doesn't have virtual children.
+        """
+        if child_provider(type(obj)) is not None:
+            return 0, None
+
+        if is_ndarray(obj):
+            n_blocks = array_block_count(obj)
+            if n_blocks:
+                return n_blocks, self._createArrayBlockItem
+            else:
+                return array_length(obj) or 0, self._createSequenceItem
+
+        n_elements = self._sequenceLength(obj)
+        if n_elements is None:
+            return 0, None
+        else:
+            return n_elements, self._createSequenceItem
+
+
+    def _sequenceLength(self, obj):
+        """ Returns the length of obj if its elements can be accessed by index.
+            These elements are added as virtual children, which are only created on demand.
+            Returns None for other objects, including strings and mappings.
+        """
+        if isinstance(obj, string_types + (bytes, bytearray, type)) or hasattr(obj, 'items'):
+            return None
+
+        if not (isinstance(obj, (Sequence, array.array, deque, memoryview)) or
+                (hasattr(obj, '__len__') and hasattr(obj, '__getitem__'))):
+            return None
+        try:
+            return len(obj)
+        except Exception as ex:
+            logger.debug("Unable to determine sequence length: {}".format(ex))
+            return None
+
+
+    def _createSequenceItem(self, parent_item, row):
+        """ Creates the TreeItem for element number 'row' of the parent_item's sequence.
+        """
+        try:
+            child_obj = parent_item.obj[row]
+        except Exception as ex:
+            logger.debug("Unable to get element {}: {}".format(row, ex))
+            child_obj = ex
+        return self._createItem(child_obj, row, PATH_INDEX, False)
+
+
+    def _createArrayBlockItem(self, parent_item, block_nr):
+        """ Creates the TreeItem for a block of rows of a large NumPy array.
+            The block is a slice of the array, so no data is copied.
+        """
+        start, stop = array_block_bounds(parent_item.obj, block_nr)
+        name = '[{}:{}]'.format(start, stop)
+        return self._createItem(parent_item.obj[start:stop], name, PATH_SLICE, False)
+
+
+    def _fetchObjectChildren(self, obj):
         """ Fetches the children of a Python object. 
-            Returns: list of TreeItems
+        
+            The TreeItems are created lazily so that only the fetched pages of a large container
+            are materialized.
+
+            The elements of sequences are not included. These are added as virtual children.
+
+            Returns: (number of children, iterator over TreeItems)
+        """
+        obj_children, path_format, n_items, attributes = \
+            self._memoizedListing(obj, self._children_memo)
+
+        def iter_tree_items():
+            " Creates the TreeItems one by one"
+            for name, child_obj in obj_children:
+                yield self._createItem(child_obj, name, path_format, False)
+            for name, child_obj in attributes:
+                yield self._createItem(child_obj, name, PATH_ATTRIBUTE, True)
+
+        return n_items + len(attributes), iter_tree_items()
+
+
+    def _memoizedListing(self, obj, memo):
+        """ Returns _listObjectChildren(obj). Uses (and fills) the memo dictionary if not None.
+        """
+        if memo is None:
+            return self._listObjectChildren(obj)
+
+        memo_key = ('children', id(obj), self._attr_time_budget, self._async_fetch,
+                    self._show_callables, self._show_dunder_attributes,
+                    self._instance_state_only, self._lazy_properties)
+        entry = memo.get(memo_key)
+        if entry is None or entry[0] is not obj:
+            # The object is stored as well so that its id can't be reused during the refresh.
+            entry = (obj, self._listObjectChildren(obj))
+            memo[memo_key] = entry
+        return entry[1]
+
+
+    def _memoizedFingerprint(self, obj, memo):
+        """ Returns the fingerprint of obj. Uses (and fills) the memo dictionary if not None.
+        """
+        if memo is None:
+            return self._fingerprint(obj)
+
+        memo_key = ('fingerprint', id(obj))
+        entry = memo.get(memo_key)
+        if entry is None or entry[0] is not obj:
+            entry = (obj, self._fingerprint(obj))
+            memo[memo_key] = entry
+        return entry[1]
+
+
+    def _listObjectChildren(self, obj):
+        """ Lists the (name, child_obj) tuples of the items and attributes of obj.
+
+            The items are listed by the child provider of the object's type, if it has one (see
+            child_providers.py). The items may be an iterable that creates them lazily.
+
+            Returns: (items, path format of the items, number of items, attributes)
         """
         obj_children = []
-        path_strings = []
-        
-        if isinstance(obj, (list, tuple)):
-            obj_children = sorted(enumerate(obj))
-            path_strings = ['{}[{}]'.format(obj_path, item[0]) if obj_path else item[0] 
-                            for item in obj_children]
-        elif isinstance(obj, (set, frozenset)):
-            obj_children = [('pop()', elem) for elem in sorted(obj)]
-            path_strings = ['{0}.pop()'.format(obj_path, item[0]) if obj_path else item[0] 
-                            for item in obj_children]
-        elif hasattr(obj, 'items'): # dictionaries and the likes. 
-            try: 
-                obj_children = list(obj.items())
-            except Exception as ex:
-                # Can happen if the items method expects an argument, for instance the  
-                # types.DictType.items method expects a dictionary.
-                logger.warn("No items expanded. Objects items() call failed: {}".format(ex))
-                obj_children = []
-
-            # Sort keys, except when the object is an OrderedDict.
-            if not isinstance(obj, OrderedDict):
-                try:
-                    obj_children = sorted(obj.items())
-                except Exception as ex:
-                    logger.debug("Unable to sort dictionary keys: {}".format(ex))
-                    
-            path_strings = ['{}[{!r}]'.format(obj_path, item[0]) if obj_path else item[0] 
-                            for item in obj_children]
-        
-        assert len(obj_children) == len(path_strings), "sanity check"    
-        is_attr_list = [False] * len(obj_children)
-        
-        # Object attributes
-        for attr_name, attr_value in sorted(inspect.getmembers(obj)):
-            obj_children.append( (attr_name, attr_value) )
-            path_strings.append('{}.{}'.format(obj_path, attr_name) if obj_path else attr_name)
-            is_attr_list.append(True)
+        path_format = PATH_ITEM
 
-        assert len(obj_children) == len(path_strings), "sanity check"
-        tree_items = []
-        for item, path_str, is_attr in zip(obj_children, path_strings, is_attr_list):
-            name, child_obj = item
-            tree_items.append(TreeItem(child_obj, name, path_str, is_attr))
-            
-        return tree_items
+        if is_collected(obj):
+            # The children of garbage collected objects are removed by the refresh.
+            return obj_children, path_format, 0, []
+
+        provider = child_provider(type(obj))
+        if provider is not None:
+            listing = provider(obj)
+            obj_children, path_format, n_items = \
+                listing.items, listing.path_format, listing.n_items
+            if not listing.list_attributes:
+                return obj_children, path_format, n_items, []
+        elif is_ndarray(obj):
+            # The rows are virtual children. The fields of structured arrays are added here.
+            obj_children = [(name, obj[name]) for name in structured_field_names(obj)]
+            n_items = len(obj_children)
+        elif self._sequenceLength(obj) is not None:
+            # The sequence elements are virtual children, see _createSequenceItem
+            n_items = 0
+        elif hasattr(obj, 'items'): # Mappings that aren't registered.
+            obj_children = mapping_items(obj)
+            n_items = len(obj_children)
+        else:
+            n_items = 0
+
+        # Object attributes
+        if self._instance_state_only:
+            attributes = get_instance_state(obj, include_dunder=self._show_dunder_attributes,
+                                            include_callables=self._show_callables)
+        else:
+            attributes = get_members(obj, self._attr_time_budget,
+                                     defer_computed=self._async_fetch,
+                                     include_dunder=self._show_dunder_attributes,
+                                     include_callables=self._show_callables,
+                                     lazy_computed=self._lazy_properties)
+        return obj_children, path_format, n_items, attributes
 
    
     def populateTree(self, obj, obj_name='', inspected_node_is_visible=None):
@@ -321,13 +1091,13 @@ class TreeModel(QtCore.QAbstractItemModel):
         self._inspected_node_is_visible = inspected_node_is_visible
         
         if self._inspected_node_is_visible:
-            self._root_item = TreeItem(None, '<invisible_root>', '<invisible_root>', None) 
+            self._root_item = TreeItem(None, '<invisible_root>', None, None) 
             self._root_item.children_fetched = True
-            self._inspected_item = TreeItem(obj, obj_name, obj_name, is_attribute = None)
+            self._inspected_item = TreeItem(obj, obj_name, None, is_attribute = None)
             self._root_item.append_child(self._inspected_item)
         else:
             # The root itself will be invisible
-            self._root_item = TreeItem(obj, obj_name, obj_name, is_attribute = None)
+            self._root_item = TreeItem(obj, obj_name, None, is_attribute = None)
             self._inspected_item = self._root_item
             
             # Fetch all items of the root so we can select the first row in the constructor.
@@ -336,95 +1106,265 @@ class TreeModel(QtCore.QAbstractItemModel):
             
                 
                 
-    def _auxRefreshTree(self, tree_index):
-        """ Auxiliary function for refreshTree that recursively refreshes the tree nodes.
+    def _auxRefreshTree(self, tree_index, is_expanded=None):
+        """ Auxiliary function for refreshTree that refreshes a node and its descendants.
+
+            The children of collapsed nodes are not refreshed, see refreshTree.
+        """
+        tree_items = [self.treeItem(tree_index)]
+        while tree_items:
+            tree_items.extend(self._refreshNode(tree_items.pop(), is_expanded))
+
+
+    def _refreshNode(self, tree_item, is_expanded=None):
+        """ Refreshes the children of a single tree node.
             
             If the underlying Python object has been changed, we don't want to delete the old
             tree model and create a new one from scratch because this loses all information about
-            which nodes are fetched and expanded. Instead the old tree model is updated. Using the
-            difflib from the standard library it is determined for a parent node which child nodes
+            which nodes are fetched and expanded. Instead the old tree model is updated. Using a
+            keyed diff (see the keydiff module) it is determined for a parent node which child nodes
             should be added or removed. This is done based on the node names only, not on the node 
             contents (the underlying Python objects). Testing the underlying nodes for equality
-            is potentially slow. It is faster to let the refreshNode function emit the dataChanged
-            signal for all cells.
+            is potentially slow. Instead the fingerprints of the objects are compared, and the 
+            dataChanged signal is only emitted for the rendered rows with a changed fingerprint.
+
+            Returns the child items that must be refreshed next: the children that were kept 
+            and of which the children have been fetched.
         """
-        tree_item = self.treeItem(tree_index)
-        logger.debug("_auxRefreshTree({}): {}{}".format(tree_index, tree_item.obj_path, 
+        tree_index = self.itemIndex(tree_item)
+        if tree_index is None:
+            return [] # Removed from the tree since it was scheduled for refreshing.
+
+        logger.debug("_refreshNode({}): {}{}".format(tree_index, tree_item.obj_path, 
                                            "*" if tree_item.children_fetched else ""))
+        if not tree_item.children_fetched:
+            return []
+
+        if is_expanded is not None and tree_index.isValid() and not is_expanded(tree_index):
+            tree_item.children_stale = True
+            return []
+        tree_item.children_stale = False
+
+        kept_items = self._refreshVirtualChildren(tree_index, tree_item)
+
+        # If the node was only partially fetched, only the fetched part is compared. The
+        # remaining new children become pending children of the node.
+        old_items = tree_item.child_items_fetched()
+        n_new, new_iter = self._fetchObjectChildren(tree_item.obj)
+        if tree_item.pending_children is None:
+            new_items = list(new_iter)
+        else:
+            new_items = list(islice(new_iter, len(old_items)))
         
-        if tree_item.children_fetched:
-            
-            old_items = tree_item.child_items
-            new_items = self._fetchObjectChildren(tree_item.obj, tree_item.obj_path)
-            
-            old_item_names = [(item.obj_name, item.is_attribute) for item in old_items]
-            new_item_names = [(item.obj_name, item.is_attribute) for item in new_items]
-            seqMatcher = SequenceMatcher(isjunk=None, a=old_item_names, b=new_item_names, 
-                                         autojunk=False)
-            opcodes = seqMatcher.get_opcodes()
-            
-            logger.debug("(reversed) opcodes: {}".format(list(reversed(opcodes))))
+        old_item_names = [(item.obj_name, item.is_attribute) for item in old_items]
+        new_item_names = [(item.obj_name, item.is_attribute) for item in new_items]
+        opcodes = diff_keys(old_item_names, new_item_names)
+        
+        logger.debug("opcodes: {}".format(opcodes))
+
+        pending_items = [] # Items with attributes that must be evaluated
+        changed_items = [] # Items of which the rendered rows must be updated
+        child_items = []   # The new list of non-virtual children
+        n_ranges = 0       # Number of ranges of rows that are inserted or removed
+
+        for tag, i1, i2, j1, j2 in opcodes:
             
-            for tag, i1, i2, j1, j2 in reversed(opcodes):
-                
-                if 1 or tag != 'equal':
-                    logger.debug("  {:7s}, a[{}:{}] ({}), b[{}:{}] ({})"
-                                 .format(tag, i1, i2, old_item_names[i1:i2], j1, j2, new_item_names[j1:j2]))
-                
-                if tag == 'equal':
-                    # Only when node names are equal is _auxRefreshTree called recursively.
-                    assert i2-i1 == j2-j1, "equal sanity check failed {} != {}".format(i2-i1, j2-j1)
-                    for old_row, new_row in zip(range(i1, i2), range(j1, j2)):
-                        old_items[old_row].obj = new_items[new_row].obj
-                        child_index = self.index(old_row, 0, parent=tree_index)
-                        self._auxRefreshTree(child_index) 
-
-                elif tag == 'replace':
-                    # Explicitly remove the old item and insert the new. The old item may have
-                    # child nodes which indices must be removed by Qt, otherwise it crashes.
-                    assert i2-i1 == j2-j1, "replace sanity check failed {} != {}".format(i2-i1, j2-j1)
-                    
-                    first = i1          # row number of first that will be removed
-                    last  = i1 + i2 - 1 # row number of last element after insertion
-                    logger.debug("     calling beginRemoveRows({}, {}, {})".format(tree_index, first, last)) 
-                    self.beginRemoveRows(tree_index, first, last)
-                    del tree_item.child_items[i1:i2] 
-                    self.endRemoveRows()                    
-
-                    first = i1               # row number of first element after insertion 
-                    last  = i1 + j2 - j1 - 1 # row number of last element after insertion
-                    logger.debug("     calling beginInsertRows({}, {}, {})".format(tree_index, first, last)) 
-                    self.beginInsertRows(tree_index, first, last)
-                    tree_item.insert_children(i1, new_items[j1:j2])
-                    self.endInsertRows()
-                    
-                elif tag == 'delete':
-                    assert j1 == j2, "delete sanity check failed. {} != {}".format(j1, j2)
-                    first = i1          # row number of first that will be removed
-                    last  = i1 + i2 - 1 # row number of last element after insertion
-                    logger.debug("     calling beginRemoveRows({}, {}, {})".format(tree_index, first, last)) 
-                    self.beginRemoveRows(tree_index, first, last)
-                    del tree_item.child_items[i1:i2] 
-                    self.endRemoveRows()
-                                            
-                elif tag == 'insert':
-                    assert i1 == i2, "insert sanity check failed. {} != {}".format(i1, i2)
-                    first = i1               # row number of first element after insertion 
-                    last  = i1 + j2 - j1 - 1 # row number of last element after insertion
-                    logger.debug("     calling beginInsertRows({}, {}, {})".format(tree_index, first, last)) 
-                    self.beginInsertRows(tree_index, first, last)
-                    tree_item.insert_children(i1, new_items[j1:j2])
-                    self.endInsertRows()
-
-                else:
-                    raise ValueError("Invalid tag: {}".format(tag))
+            if tag != 'equal':
+                logger.debug("  {:7s}, a[{}:{}] ({}), b[{}:{}] ({})"
+                             .format(tag, i1, i2, old_item_names[i1:i2], j1, j2, new_item_names[j1:j2]))
             
+            if tag == 'equal':
+                # Only the children of items with equal names are refreshed.
+                assert i2-i1 == j2-j1, "equal sanity check failed {} != {}".format(i2-i1, j2-j1)
+                for old_row, new_row in zip(range(i1, i2), range(j1, j2)):
+                    old_item = old_items[old_row]
+                    new_obj = new_items[new_row].obj
+                    if new_obj is PENDING_VALUE:
+                        # Keep the old value until the attribute has been evaluated again.
+                        pending_items.append(old_item)
+                    elif is_not_evaluated(new_obj):
+                        # Evaluate again if the attribute has been evaluated since it was
+                        # displayed. Otherwise it is evaluated when it is displayed.
+                        if not is_unevaluated(old_item.obj):
+                            pending_items.append(old_item)
+                        elif (old_item.obj is not PENDING_VALUE and
+                                  self._refreshItemObject(old_item, new_obj)):
+                            changed_items.append(old_item)
+                    elif self._refreshItemObject(old_item, new_obj):
+                        changed_items.append(old_item)
+                    if old_item.children_fetched:
+                        kept_items.append(old_item)
+                    new_items[new_row].release() # Only the object of the new item is used.
+                child_items.extend(old_items[i1:i2])
+
+            elif tag == 'delete':
+                assert j1 == j2, "delete sanity check failed. {} != {}".format(j1, j2)
+                n_ranges += 1
+
+            elif tag == 'insert':
+                assert i1 == i2, "insert sanity check failed. {} != {}".format(i1, i2)
+                n_ranges += 1
+                child_items.extend(new_items[j1:j2])
+                pending_items.extend(item for item in new_items[j1:j2] 
+                                     if item.obj is PENDING_VALUE)
+
+            else:
+                raise ValueError("Invalid tag: {}".format(tag))
+
+        if n_ranges > MAX_REFRESH_ROW_RANGES:
+            self._replaceChildren(tree_item, old_items, child_items)
+        elif n_ranges > 0:
+            self._insertAndRemoveChildren(tree_index, tree_item, old_items, new_items, opcodes)
+
+        self._emitRowsChanged(tree_index, [item.row() for item in changed_items])
+        tree_item.n_pending_children = n_new - len(new_items)
+        tree_item.pending_children = new_iter if tree_item.n_pending_children > 0 else None
+        self._updatePlaceholder(tree_index, tree_item)
+        self._evaluatePendingItems(pending_items)
+        return kept_items
+
+
+    def _insertAndRemoveChildren(self, tree_index, tree_item, old_items, new_items, opcodes):
+        """ Applies the inserts and deletes of the keyed diff of the non-virtual children of a 
+            node, one range of rows at a time.
+        """
+        # The non-virtual children come after the virtual children in the model rows.
+        offset = tree_item.n_virtual_children
+        for tag, i1, i2, j1, j2 in reversed(opcodes):
+            if tag == 'delete':
+                first = offset + i1     # row number of first that will be removed
+                last  = offset + i2 - 1 # row number of last that will be removed
+                logger.debug("     calling beginRemoveRows({}, {}, {})".format(tree_index, first, last)) 
+                self.beginRemoveRows(tree_index, first, last)
+                self._discardCachedCells(old_items[i1:i2])
+                tree_item.remove_children(i1, i2)
+                self.endRemoveRows()
+                                        
+            elif tag == 'insert':
+                first = offset + i1               # row number of first element after insertion 
+                last  = offset + i1 + j2 - j1 - 1 # row number of last element after insertion
+                logger.debug("     calling beginInsertRows({}, {}, {})".format(tree_index, first, last)) 
+                self.beginInsertRows(tree_index, first, last)
+                tree_item.insert_children(i1, new_items[j1:j2])
+                self.endInsertRows()
+
+
+    def _replaceChildren(self, tree_item, old_items, child_items):
+        """ Replaces the fetched non-virtual children of a node with a single layout change.
+
+            Inserting and removing many ranges of rows one at a time takes quadratic time, as the
+            proxy model and the view update all rows after each range. The persistent indexes
+            (e.g. of the expanded nodes and the selection) are moved to the new rows of their
+            items, or invalidated if their items have been removed.
+        """
+        logger.debug("     replacing {} children by {} with a layout change"
+                     .format(len(old_items), len(child_items)))
+        self.layoutAboutToBeChanged.emit()
+        persistent_indexes = self.persistentIndexList()
+        kept_items = set(map(id, child_items))
+        removed_items = [item for item in old_items if id(item) not in kept_items]
+        tree_item.replace_children(0, len(old_items), child_items)
+        self.changePersistentIndexList(
+            persistent_indexes, [self._movedIndex(index) for index in persistent_indexes])
+        self._discardCachedCells(removed_items)
+        self.layoutChanged.emit()
+
+
+    def _movedIndex(self, index):
+        """ Returns the index of the item of an index after the rows have been changed.
+            Returns an invalid index if the item is no longer part of the tree.
+        """
+        pointer = index.internalPointer()
+        if type(pointer) is VirtualChildren:
+            parent_item = pointer.parent_item
+            if parent_item.virtual_children is not pointer or self.itemIndex(parent_item) is None:
+                return QtCore.QModelIndex()
+            return index
+        else:
+            item_index = self.itemIndex(pointer)
+            if item_index is None:
+                return QtCore.QModelIndex()
+            return self.createIndex(item_index.row(), index.column(), pointer)
+
+
+    def _refreshVirtualChildren(self, tree_index, tree_item):
+        """ Refreshes the virtual children (the sequence elements) of a tree item.
+
+            Rows are inserted or removed at the end if the length of the sequence has changed.
+            If not all rows had been added, no rows are inserted; the new elements are pending.
+            Otherwise at most a page of rows is inserted. Only the children that have been
+            created are updated. Returns the updated children of which the children have been
+            fetched, so that these can be refreshed next.
+        """
+        n_old = tree_item.n_virtual_children
+        n_new, child_fn = self._virtualChildren(tree_item.obj)
+        if tree_item.pending_virtual_child_count() > 0:
+            n_rows = min(n_new, n_old)
+        elif self._fetch_page_size is None:
+            n_rows = n_new
+        else:
+            n_rows = min(n_new, n_old + self._fetch_page_size)
+
+        if n_old > 0 and child_fn != tree_item.virtual_children.child_fn:
+            # E.g. an array that has become large enough to be split in blocks.
+            first = 0
+        else:
+            first = n_new
+
+        if first < n_old:
+            logger.debug("     calling beginRemoveRows({}, {}, {})".format(tree_index, first, n_old - 1))
+            self.beginRemoveRows(tree_index, first, n_old - 1)
+            self._discardCachedCells(item for row, item in tree_item.created_virtual_children()
+                                     if row >= first)
+            tree_item.remove_virtual_children(first)
+            self.endRemoveRows()
+            n_old = first
+
+        if tree_item.virtual_children is not None:
+            tree_item.virtual_children.cache.clear()
+
+        kept_items = []
+        changed_rows = []
+        for row, child_item in tree_item.created_virtual_children():
+            new_item = child_fn(tree_item, row)
+            if new_item.name != child_item.name:
+                self._setItemObject(child_item, new_item.obj)
+                child_item.set_name(new_item.name, new_item.path_format)
+                changed_rows.append(row)
+            elif self._refreshItemObject(child_item, new_item.obj):
+                changed_rows.append(row)
+            if child_item.children_fetched:
+                kept_items.append(child_item)
+            new_item.release() # Only the object of the new item is used.
+        self._emitRowsChanged(tree_index, changed_rows)
+
+        if n_new > 0 or tree_item.virtual_children is not None:
+            tree_item.set_virtual_children(n_new, child_fn, self._discardCachedCells)
+        if n_rows > n_old:
+            logger.debug("     calling beginInsertRows({}, {}, {})".format(tree_index, n_old, n_rows - 1))
+            self.beginInsertRows(tree_index, n_old, n_rows - 1)
+            tree_item.n_virtual_children = n_rows
+            self.endInsertRows()
+        return kept_items
+
         
-    def refreshTree(self):
+    def refreshTree(self, is_expanded=None, children_memo=None):
         """ Refreshes the tree model from the underlying root object (which may have been changed).
+
+            A background refresh that is still in progress is cancelled.
+
+            :param is_expanded: function that returns True if the node at a model index is
+                expanded in the view. The children of collapsed nodes are not refreshed, but
+                marked as stale. Call refreshStaleSubtree when such a node is expanded again.
+                If None, all nodes of which the children have been fetched are refreshed.
+            :param children_memo: dictionary in which the listed members and the fingerprints
+                of the objects are stored during the refresh. Models that browse the same
+                objects can pass the same dictionary when they are refreshed right after each
+                other, so that the members are only listed once.
         """
         logger.info("")
         logger.info("refreshTree: {}".format(self.rootItem))
+        self.cancelRefresh()
         
         root_item = self.treeItem(self.rootIndex())
         logger.info("  root_item:      {} (idx={})".format(root_item, self.rootIndex()))
@@ -433,21 +1373,358 @@ class TreeModel(QtCore.QAbstractItemModel):
         
         assert (root_item is inspected_item) != self.inspectedNodeIsVisible, "sanity check"
         
-        self._auxRefreshTree(self.inspectedIndex())
+        self._children_memo = children_memo
+        try:
+            self._refreshInspectedItem()
+            self._auxRefreshTree(self.inspectedIndex(), is_expanded)
+        finally:
+            self._children_memo = None
         
-        root_obj = self.rootItem.obj
-        logger.debug("After _auxRefreshTree, root_obj: {}".format(cut_off_str(root_obj, 80)))
-        self.rootItem.pretty_print()
-        
-        # Emit the dataChanged signal for all cells. This is faster than checking which nodes
-        # have changed, which may be slow for some underlying Python objects.
-        n_rows = self.rowCount()
-        n_cols = self.columnCount()
-        top_left = self.index(0, 0)
-        bottom_right = self.index(n_rows-1, n_cols-1)
-        
-        logger.debug("bottom_right: ({}, {})".format(bottom_right.row(), bottom_right.column()))
-        self.dataChanged.emit(top_left, bottom_right)
+        if logger.isEnabledFor(logging.DEBUG):
+            root_obj = self.rootItem.obj
+            logger.debug("After _auxRefreshTree, root_obj: {}".format(cut_off_str(root_obj, 80)))
+            self.rootItem.pretty_print()
+
+
+    def _refreshInspectedItem(self):
+        """ Repaints the inspected item if its object has been changed in place.
+        """
+        inspected_item = self.inspectedItem
+        if self._refreshItemObject(inspected_item, inspected_item.obj):
+            if self.inspectedNodeIsVisible:
+                self._emitRowsChanged(self.rootIndex(), [0])
+
+
+    def startRefresh(self, is_expanded=None, children_memo=None):
+        """ Refreshes the tree model in the background, in two phases.
+
+            First the members and fingerprints of the objects of the expanded nodes are listed
+            in a worker thread. Then the tree is updated in the GUI thread, a slice of nodes at
+            a time, so that the event loop is never blocked for more than REFRESH_SLICE_DURATION
+            seconds (unless refreshing a single node takes longer).
+
+            The parameters are the same as those of refreshTree. Returns False (and does nothing) 
+            if the previous background refresh is still in progress. The refreshFinished signal
+            is emitted when the refresh is done.
+        """
+        job = self.prepareRefresh(is_expanded=is_expanded, children_memo=children_memo)
+        if job is None:
+            return False
+        _FETCH_POOL.submit(job.run)
+        return True
+
+
+    def prepareRefresh(self, is_expanded=None, children_memo=None):
+        """ Prepares a background refresh but leaves starting it to the caller, see startRefresh.
+
+            Returns the Job of the first phase, which must be executed by calling its run method
+            in a worker thread. This way the first phases of several models that share the
+            children_memo can be executed one after another by a single worker, so that the
+            objects are listed only once. Returns None if the previous background refresh is
+            still in progress.
+        """
+        if self.isRefreshing():
+            logger.debug("Skipping refresh. The previous refresh is still in progress.")
+            return None
+
+        children_memo = {} if children_memo is None else children_memo
+        # Determine in the GUI thread which nodes will be refreshed, so that the worker
+        # thread doesn't have to access the tree items.
+        start_time = time.time()
+        snapshot = self._refreshSnapshot(self.inspectedIndex(), is_expanded)
+        self._refresh_state = (is_expanded, children_memo)
+        self._refresh_duration = time.time() - start_time
+        self._refresh_job = Job(self._timedPrefetchRefresh,
+                                (self.inspectedItem.obj, snapshot, children_memo),
+                                on_done=self._refreshPrefetched.emit, pass_job=True)
+        return self._refresh_job
+
+
+    def isRefreshing(self):
+        """ Returns True if a background refresh is in progress.
+        """
+        return self._refresh_job is not None or bool(self._refresh_queue)
+
+
+    def cancelRefresh(self):
+        """ Cancels the background refresh. The nodes that are not yet updated stay unchanged.
+        """
+        was_refreshing = self.isRefreshing()
+        if self._refresh_job is not None:
+            self._refresh_job.cancel()
+            self._refresh_job = None
+        self._refresh_slice_timer.stop()
+        self._refresh_queue = []
+        self._finishRefresh(was_refreshing)
+
+
+    def _finishRefresh(self, emit_finished=True):
+        """ Clears the state of the background refresh and emits refreshFinished.
+        """
+        self._refresh_state = None
+        if emit_finished:
+            self.refreshFinished.emit(self._refresh_duration)
+
+
+    def _refreshSnapshot(self, tree_index, is_expanded):
+        """ Returns which descendants of a node are visited when the node is refreshed.
+
+            Returns None if the children of the node won't be refreshed. Otherwise returns a 
+            (virtual_children, children, n_fetched) tuple. The first two are dictionaries that
+            map the rows or keys of the children to a (has_fingerprint, snapshot of the child)
+            tuple. The n_fetched element is the number of non-virtual children that have been
+            fetched.
+        """
+        tree_item = self.treeItem(tree_index)
+        if not tree_item.children_fetched:
+            return None
+        if is_expanded is not None and tree_index.isValid() and not is_expanded(tree_index):
+            return None
+
+        virtual_children = {}
+        for row, child_item in tree_item.created_virtual_children():
+            virtual_children[row] = (child_item.fingerprint is not None, self._refreshSnapshot(
+                self.index(row, 0, parent=tree_index), is_expanded))
+
+        children = {}
+        offset = tree_item.n_virtual_children
+        fetched_items = tree_item.child_items_fetched()
+        for idx, child_item in enumerate(fetched_items):
+            if child_item.fingerprint is not None or child_item.children_fetched:
+                key = (child_item.obj_name, child_item.is_attribute)
+                children[key] = (child_item.fingerprint is not None, self._refreshSnapshot(
+                    self.index(offset + idx, 0, parent=tree_index), is_expanded))
+
+        return virtual_children, children, len(fetched_items)
+
+
+    def _prefetchRefresh(self, job, obj, has_fingerprint, snapshot, children_memo):
+        """ Stores the fingerprint of obj and the listings of the objects that will be refreshed
+            in the children_memo. Is executed in a worker thread.
+
+            :param snapshot: the nodes that will be refreshed, see _refreshSnapshot.
+        """
+        if job.cancelled:
+            return
+        if has_fingerprint:
+            self._memoizedFingerprint(obj, children_memo)
+        if snapshot is None:
+            return
+
+        virtual_children, children, n_fetched = snapshot
+        if virtual_children:
+            n_new, child_fn = self._virtualChildren(obj)
+            parent_item = TreeItem(obj, None, None, False) # Not part of the tree.
+            for row, (child_has_fingerprint, child_snapshot) in virtual_children.items():
+                if row < n_new:
+                    child_item = child_fn(parent_item, row)
+                    try:
+                        self._prefetchRefresh(job, child_item.obj, child_has_fingerprint,
+                                              child_snapshot, children_memo)
+                    finally:
+                        child_item.release() # Not part of the tree.
+
+        obj_children, _path_format, _n_items, attributes = \
+            self._memoizedListing(obj, children_memo)
+        if not children:
+            return
+
+        def iter_children():
+            " Yields the (name, child_obj, is_attribute) tuples of the items and attributes"
+            for name, child_obj in obj_children:
+                yield name, child_obj, False
+            for name, child_obj in attributes:
+                yield name, child_obj, True
+
+        # Like _refreshNode, only the rows that have been fetched are visited. This way a lazy
+        # listing (see child_providers.lazy_items) is only iterated as far as it is displayed.
+        for name, child_obj, is_attribute in islice(iter_children(), n_fetched):
+            child = children.get((str(name), is_attribute))
+            if child is not None and not is_unevaluated(child_obj):
+                self._prefetchRefresh(job, child_obj, child[0], child[1], children_memo)
+
+
+    def _timedPrefetchRefresh(self, job, obj, snapshot, children_memo):
+        """ Executes the first phase of a background refresh in a worker thread. Stores its
+            duration in job.data.
+        """
+        start_time = time.time()
+        try:
+            self._prefetchRefresh(job, obj, True, snapshot, children_memo)
+        finally:
+            job.data = time.time() - start_time
+
+
+    @QtCore.Slot(object)
+    def _onRefreshPrefetched(self, job):
+        """ Starts updating the tree when the first phase of a background refresh is done.
+        """
+        if job is not self._refresh_job or job.cancelled:
+            return
+        self._refresh_job = None
+        self._refresh_duration += job.data or 0.0
+        if job.exception is not None:
+            logger.warning("Background refresh failed: {}".format(job.exception))
+            self._finishRefresh()
+            return
+
+        start_time = time.time()
+        self._children_memo = self._refresh_state[1]
+        try:
+            self._refreshInspectedItem()
+        finally:
+            self._children_memo = None
+        self._refresh_duration += time.time() - start_time
+        self._refresh_queue = [self.inspectedItem]
+        self._applyRefreshSlice()
+
+
+    def _applyRefreshSlice(self):
+        """ Refreshes the nodes in the queue of the background refresh until the time of a slice
+            is used up. Schedules the next slice if nodes remain.
+        """
+        is_expanded, children_memo = self._refresh_state
+        start_time = time.time()
+        deadline = start_time + REFRESH_SLICE_DURATION
+        self._children_memo = children_memo
+        try:
+            while self._refresh_queue and time.time() < deadline:
+                tree_item = self._refresh_queue.pop()
+                self._refresh_queue.extend(self._refreshNode(tree_item, is_expanded))
+        finally:
+            self._children_memo = None
+            self._refresh_duration += time.time() - start_time
+
+        if self._refresh_queue:
+            self._refresh_slice_timer.start()
+        else:
+            logger.debug("Background refresh done in {:.3f} sec"
+                         .format(self._refresh_duration))
+            self._finishRefresh()
+
+
+    def setAttributeFilter(self, show_callables, show_dunder_attributes, is_expanded=None):
+        """ Sets which attributes are fetched. Attributes that are not shown are not evaluated
+            and no tree items are created for them.
+
+            Attributes that become hidden are removed by the next refresh. Until then they should
+            be hidden by the TreeProxyModel. If attributes become visible, the tree is refreshed
+            to add them. The nodes that are collapsed are updated when they are expanded, see
+            refreshTree for the is_expanded parameter.
+        """
+        shows_more = ((show_callables and not self._show_callables) or
+                      (show_dunder_attributes and not self._show_dunder_attributes))
+        self._show_callables = show_callables
+        self._show_dunder_attributes = show_dunder_attributes
+        if shows_more:
+            self.refreshTree(is_expanded=is_expanded)
+
+
+    def getInstanceStateOnly(self):
+        """ Returns True if only the attributes stored in the objects themselves are listed.
+        """
+        return self._instance_state_only
+
+
+    def setInstanceStateOnly(self, instance_state_only, is_expanded=None):
+        """ Sets whether only the attributes that are stored in the objects themselves are
+            listed, or all members. The tree is refreshed to add or remove the other attributes.
+            See refreshTree for the is_expanded parameter.
+        """
+        if instance_state_only == self._instance_state_only:
+            return
+        self._instance_state_only = instance_state_only
+        self.refreshTree(is_expanded=is_expanded)
+
+
+    def itemCollapsed(self, index):
+        """ Should be called when the node at the index is collapsed in the view.
+
+            The descendants of the node are counted towards the collapsed_node_budget. If the
+            budget is exceeded, the children of the least recently collapsed nodes are removed.
+        """
+        if self._collapsed_node_budget is None:
+            return
+        tree_item = self.treeItem(index)
+        if not tree_item.children_fetched:
+            return
+
+        # Collapsed nodes within the subtree are now counted as part of it.
+        n_descendants = 0
+        stack = [tree_item]
+        while stack:
+            item = stack.pop()
+            if item is not tree_item and item in self._collapsed_items:
+                self._n_collapsed_nodes -= self._collapsed_items.pop(item)
+            children = [child for _row, child in item.created_virtual_children()]
+            children.extend(item.child_items)
+            n_descendants += len(children)
+            stack.extend(children)
+
+        self._n_collapsed_nodes -= self._collapsed_items.pop(tree_item, 0)
+        self._collapsed_items[tree_item] = n_descendants
+        self._n_collapsed_nodes += n_descendants
+        self._evictCollapsedItems()
+
+
+    def itemExpanded(self, index):
+        """ Should be called when the node at the index is expanded in the view.
+            Its descendants no longer count towards the collapsed_node_budget.
+        """
+        tree_item = self.treeItem(index)
+        if tree_item in self._collapsed_items:
+            self._n_collapsed_nodes -= self._collapsed_items.pop(tree_item)
+
+
+    def _evictCollapsedItems(self):
+        """ Removes the children of the least recently collapsed nodes until the number of
+            nodes in collapsed subtrees is within the budget.
+        """
+        while self._n_collapsed_nodes > self._collapsed_node_budget and self._collapsed_items:
+            tree_item, n_descendants = self._collapsed_items.popitem(last=False)
+            self._n_collapsed_nodes -= n_descendants
+            index = self.itemIndex(tree_item)
+            if index is not None:
+                logger.debug("Evicting {} nodes of collapsed subtree: {}"
+                             .format(n_descendants, tree_item.obj_path))
+                self._removeChildren(index, tree_item)
+
+
+    def _removeChildren(self, index, tree_item):
+        """ Removes all children of a node. They are fetched again when it is expanded.
+        """
+        if tree_item.fetch_job is not None:
+            self._removeLoadingPlaceholder(index, tree_item)
+
+        n_children = tree_item.child_count()
+        if n_children > 0:
+            self.beginRemoveRows(index, 0, n_children - 1)
+            children = [child for _row, child in tree_item.created_virtual_children()]
+            children.extend(tree_item.child_items)
+            self._discardCachedCells(children)
+            tree_item.remove_children(0, len(tree_item.child_items))
+            if tree_item.virtual_children is not None:
+                tree_item.remove_virtual_children(0)
+            tree_item.virtual_children = None
+            self.endRemoveRows()
+
+        tree_item.pending_children = None
+        tree_item.n_pending_children = 0
+        tree_item.children_fetched = False
+        tree_item.children_stale = False
+
+
+    def refreshStaleSubtree(self, index, is_expanded=None):
+        """ Refreshes the children of a node if they were skipped by the last refresh because
+            the node was collapsed. Should be called when the node is expanded.
+
+            :param is_expanded: function that returns True if the node at a model index is
+                expanded in the view (see refreshTree).
+        """
+        tree_item = self.treeItem(index)
+        if tree_item.children_stale:
+            logger.debug("Refreshing stale subtree: {}".format(tree_item.obj_path))
+            self._auxRefreshTree(index, is_expanded)
         
 
 
@@ -484,6 +1761,7 @@ class TreeProxyModel(QtCore.QSortFilterProxyModel):
 
         self._show_callables = show_callable_attributes
         self._show_dunder_attributes = show_dunder_attributes
+        self._hidden_attribute_flags = self._hiddenAttributeFlags()
 
 
     def treeItem(self, proxy_index):
@@ -506,14 +1784,24 @@ class TreeProxyModel(QtCore.QSortFilterProxyModel):
         """ Returns true if the item in the row indicated by the given source_row and 
             source_parent should be included in the model.
         """
+        hidden_attribute_flags = self._hidden_attribute_flags
+        if not hidden_attribute_flags:
+            return True
+
         parent_item = self.sourceModel().treeItem(sourceParentIndex)
-        tree_item = parent_item.child(sourceRow)
-        
-        accept = ((self._show_dunder_attributes or not tree_item.is_dunder_attribute) and
-                  (self._show_callables or not tree_item.is_callable_attribute))
+        n_virtual_children = parent_item.n_virtual_children
+        if sourceRow < n_virtual_children:
+            return True # Sequence elements are never attributes. Don't create the tree item.
+
+        bits = parent_item.child_items[sourceRow - n_virtual_children]._bits
+        return not (bits & ITEM_ATTRIBUTE and bits & hidden_attribute_flags)
 
-        #logger.debug("filterAcceptsRow = {}: {}".format(accept, tree_item))
-        return accept
+
+    def _hiddenAttributeFlags(self):
+        """ Returns the bit mask of the TreeItem flags of the attributes that are hidden.
+        """
+        return ((0 if self._show_dunder_attributes else ITEM_DUNDER) |
+                (0 if self._show_callables else ITEM_CALLABLE))
     
     
     def getShowCallables(self):
@@ -526,7 +1814,11 @@ class TreeProxyModel(QtCore.QSortFilterProxyModel):
         """
         logger.debug("setShowCallables: {}".format(show_callables))
         self._show_callables = show_callables
-        self.invalidateFilter()
+        self._hidden_attribute_flags = self._hiddenAttributeFlags()
+        # Use invalidate, which rebuilds the mapping in linear time. The expanded nodes and the
+        # selection are kept because they are persistent indexes. invalidateFilter removes the 
+        # rows that became hidden one range at a time, which takes quadratic time.
+        self.invalidate()
 
 
     def getShowDunderAttributes(self):
@@ -539,5 +1831,6 @@ class TreeProxyModel(QtCore.QSortFilterProxyModel):
         """
         logger.debug("setShowDunderAttributes: {}".format(show_dunder_attributes))
         self._show_dunder_attributes = show_dunder_attributes
-        self.invalidateFilter()
+        self._hidden_attribute_flags = self._hiddenAttributeFlags()
+        self.invalidate() # See setShowCallables
         
@@ -0,0 +1,179 @@
+""" Module for executing functions in background threads.
+
+    Inspecting a Python object can take long, e.g. when a property has to wait for a lock or
+    loads data lazily. Such calls are executed in a worker thread so that the GUI stays responsive.
+    The result is passed back via a callback that is called in the worker thread. Typically this
+    callback emits a Qt signal, which delivers the result in the GUI thread.
+
+    The worker threads are daemon threads. A function that never returns therefore doesn't prevent
+    the application from exiting.
+"""
+from __future__ import absolute_import
+
+import logging, threading
+
+from six.moves import queue
+
+logger = logging.getLogger(__name__)
+
+
+class Job(object):
+    """ A function call that is executed by a WorkerPool.
+
+        A job can be cancelled. This doesn't interrupt the function if it is already running,
+        but its result will not be reported. Long running functions may check the cancelled
+        attribute and return early.
+    """
+    def __init__(self, fn, args, on_done, pass_job=False):
+        """ Constructor
+
+            :param fn: function that is executed in a worker thread
+            :param args: tuple with the function arguments
+            :param on_done: function(job) that is called in the worker thread when the job has
+                finished and was not cancelled.
+            :param pass_job: if True, the job is passed as the first argument of fn. This way
+                the function can check if the job has been cancelled.
+        """
+        self.fn = fn
+        self.args = (self, ) + tuple(args) if pass_job else args
+        self.on_done = on_done
+        self.cancelled = False
+        self.result = None
+        self.exception = None
+        self.data = None  # Can be used by the submitter to store the job context.
+        self.started = False  # Set by the WorkerPool when a worker thread picks up the job.
+        self.abandoned = False  # The thread of the job is no longer part of its pool.
+        self._finished = threading.Event()
+
+    def __repr__(self):
+        return "<Job: {} (cancelled={})>".format(getattr(self.fn, '__name__', self.fn),
+                                                 self.cancelled)
+
+    def cancel(self):
+        """ Cancels the job. Its result will not be reported.
+        """
+        self.cancelled = True
+
+    def wait(self, timeout=None):
+        """ Waits until the job has finished or until timeout seconds have passed.
+            Returns True if the job has finished.
+        """
+        return self._finished.wait(timeout)
+
+    def run(self):
+        """ Executes the job. Called in the worker thread.
+        """
+        if self.cancelled:
+            self._finished.set()
+            return
+        try:
+            self.result = self.fn(*self.args)
+        except Exception as ex:
+            logger.debug("Job {} failed: {}".format(self, ex))
+            self.exception = ex
+        finally:
+            self._finished.set()
+
+        if not self.cancelled:
+            try:
+                self.on_done(self)
+            except (RuntimeError, AttributeError) as ex:
+                # Can happen if the QObject that receives the result has been deleted. Emitting
+                # a signal of a deleted object raises an AttributeError ('does not have a signal')
+                # instead of a RuntimeError in some Qt bindings, e.g. when the application exits.
+                logger.debug("Unable to report result of {}: {}".format(self, ex))
+
+
+
+class WorkerPool(object):
+    """ Pool of daemon threads that execute jobs in the order in which they are submitted.
+
+        Threads are started on demand, up to max_threads.
+    """
+    def __init__(self, max_threads=4, name='worker'):
+        """ Constructor
+
+            :param max_threads: maximum number of worker threads
+            :param name: name prefix of the worker threads
+        """
+        assert max_threads > 0, "max_threads must be > 0. Got: {}".format(max_threads)
+        self._max_threads = max_threads
+        self._name = name
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._n_threads = 0
+        self._n_idle = 0
+
+
+    def submit(self, fn, args=(), on_done=None, pass_job=False):
+        """ Schedules the fn(*args) function call and returns a Job.
+
+            :param on_done: function(job) that is called in the worker thread when the job is
+                finished (and not cancelled).
+            :param pass_job: if True, the function is called as fn(job, *args)
+        """
+        job = Job(fn, args, on_done if on_done is not None else lambda _job: None,
+                  pass_job=pass_job)
+        with self._lock:
+            self._queue.put(job)
+            self._startThreadIfNeeded()
+        return job
+
+
+    def abandon(self, job):
+        """ Stops counting the thread that executes the job against max_threads, so that a job
+            that hangs doesn't occupy the pool forever. The thread exits when the job is done.
+            Does nothing if the job hasn't started yet or has already finished.
+        """
+        with self._lock:
+            if not job.started or job.wait(0) or job.abandoned:
+                return
+            job.abandoned = True
+            self._n_threads -= 1
+            logger.debug("Abandoned the thread of {}".format(job))
+            self._startThreadIfNeeded()
+
+
+    def _startThreadIfNeeded(self):
+        """ Starts a worker thread if there are more queued jobs than idle threads, and the
+            maximum number of threads is not reached. Must be called with the lock held.
+        """
+        if self._n_idle < self._queue.qsize() and self._n_threads < self._max_threads:
+            self._n_threads += 1
+            thread = threading.Thread(target=self._work,
+                                      name="{}-{}".format(self._name, self._n_threads))
+            thread.daemon = True
+            thread.start()
+
+
+    def _work(self):
+        """ Worker thread main loop.
+        """
+        while True:
+            with self._lock:
+                self._n_idle += 1
+            job = self._queue.get()
+            with self._lock:
+                self._n_idle -= 1
+                job.started = True
+            job.run()
+            with self._lock:
+                if job.abandoned:
+                    return
+
+
+
+def run_in_thread(fn, args=(), on_done=None, name='job'):
+    """ Executes the fn(*args) function call in a new daemon thread and returns its Job.
+
+        For calls that may never return, which would otherwise occupy a thread of a WorkerPool.
+
+        :param on_done: function(job) that is called in the thread when the job is finished
+            (and not cancelled).
+    """
+    job = Job(fn, args, on_done if on_done is not None else lambda _job: None)
+    job.started = True
+    thread = threading.Thread(target=job.run, name=name)
+    thread.daemon = True
+    thread.start()
+    return job